@@ -0,0 +1,120 @@
+import threading
+
+import pandas as pd
+
+
+# Dimensiones del cubo de agregados
+DIMENSIONES = ('Departamento', 'Nivel', 'Institución')
+
+# Medidas: suma de estudiantes y número de registros (instituciones/programas)
+MEDIDAS = ('Estudiantes', 'Registros')
+
+
+# Agregar filas del CSV al nivel más fino del cubo
+def agregar_filas(df):
+    return df.groupby(list(DIMENSIONES), observed=True).agg(
+        Estudiantes=('Estudiantes', 'sum'),
+        Registros=('Estudiantes', 'size'),
+    ).astype('int64')
+
+
+# Cubo Departamento × Nivel × Institución precalculado al cargar los datos.
+# Cada combinación de dimensiones consultada se materializa una sola vez
+# (ordenada por su índice), así que las consultas posteriores solo cuestan
+# lo que ocupa su resultado.
+class CuboAgregados:
+    def __init__(self, df):
+        self._lock = threading.Lock()
+        self._cubo = agregar_filas(df).sort_index()
+        self._rollups = {}
+        self._tops = {}
+
+    # Construir el cubo sumando bloque a bloque: la memoria depende del tamaño
+    # del cubo y de un bloque, no del total de filas
+    @classmethod
+    def desde_bloques(cls, bloques):
+        cubo = None
+        for bloque in bloques:
+            if cubo is None:
+                cubo = cls(bloque)
+            else:
+                cubo._cubo = cubo._cubo.add(agregar_filas(bloque), fill_value=0).astype('int64')
+        cubo._cubo = cubo._cubo.sort_index()
+        return cubo
+
+    # Cubo nuevo con las filas `delta` sumadas, p. ej. las anexadas al CSV: solo
+    # se agregan las filas nuevas. El cubo actual no cambia (puede estar publicado
+    # en una instantánea) y las tablas memoizadas del nuevo se calculan de nuevo.
+    def con_filas(self, delta):
+        cubo = type(self)(delta)
+        cubo._cubo = self._cubo.add(cubo._cubo, fill_value=0).astype('int64').sort_index()
+        return cubo
+
+    # Tabla agregada por las dimensiones dadas (memoizada)
+    def rollup(self, dimensiones):
+        dimensiones = tuple(dimensiones)
+        tabla = self._rollups.get(dimensiones)
+        if tabla is None:
+            if dimensiones:
+                tabla = self._cubo.groupby(level=list(dimensiones), observed=True).sum().sort_index()
+            else:
+                tabla = self._cubo.sum().to_frame().T
+            with self._lock:
+                self._rollups[dimensiones] = tabla
+        return tabla
+
+    # Agregados por `dimensiones` filtrando por igualdad en otras dimensiones,
+    # p. ej. consultar(['Nivel'], Departamento='Antioquia')
+    def consultar(self, dimensiones, **filtros):
+        dimensiones = list(dimensiones)
+        filtros_ordenados = [d for d in DIMENSIONES if d in filtros]
+        tabla = self.rollup(filtros_ordenados + [d for d in dimensiones if d not in filtros])
+        if filtros_ordenados:
+            clave = tuple(filtros[d] for d in filtros_ordenados)
+            try:
+                tabla = tabla.loc[clave if len(clave) > 1 else clave[0]]
+            except KeyError:
+                return pd.DataFrame(columns=dimensiones + list(MEDIDAS))
+            if not isinstance(tabla, pd.DataFrame):
+                tabla = tabla.to_frame().T
+        return tabla.reset_index()
+
+    # Las n categorías de una dimensión con más estudiantes (memoizado)
+    def top(self, dimension, n=10):
+        clave = (dimension, n)
+        tabla = self._tops.get(clave)
+        if tabla is None:
+            tabla = (
+                self.rollup([dimension])['Estudiantes']
+                .sort_values(ascending=False).head(n).reset_index()
+            )
+            with self._lock:
+                self._tops[clave] = tabla
+        return tabla
+
+    # Valores distintos de una dimensión, ordenados
+    def valores(self, dimension):
+        return self.rollup([dimension]).index.tolist()
+
+
+# Un cubo por periodo, construido la primera vez que se consulta ese periodo a
+# partir de sus bloques (solo se lee la partición de ese periodo) y memoizado
+class CubosPorPeriodo:
+    def __init__(self, periodos, cargar_bloques):
+        self.periodos = list(periodos)
+        self._cargar_bloques = cargar_bloques
+        self._lock = threading.Lock()
+        self._cubos = {}
+
+    def __contains__(self, periodo):
+        return periodo in self.periodos
+
+    def __getitem__(self, periodo):
+        cubo = self._cubos.get(periodo)
+        if cubo is None:
+            if periodo not in self.periodos:
+                raise KeyError(periodo)
+            cubo = CuboAgregados.desde_bloques(self._cargar_bloques(periodo))
+            with self._lock:
+                cubo = self._cubos.setdefault(periodo, cubo)
+        return cubo
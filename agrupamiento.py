@@ -0,0 +1,236 @@
+import math
+
+import numpy as np
+
+
+# Zoom a partir del cual se envían los puntos individuales en vez de grupos
+ZOOM_PUNTOS_INDIVIDUALES = 9
+
+# Tamaño aproximado de una celda de agrupamiento en píxeles de pantalla
+PIXELES_CELDA = 60
+
+
+# Grupos de instituciones por celda de rejilla, precalculados para cada zoom entero
+class IndiceClusters:
+    def __init__(self, lat, lon, estudiantes, zoom_max=ZOOM_PUNTOS_INDIVIDUALES):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        # Las filas sin coordenadas no caen en ninguna celda
+        validos = np.isfinite(lat) & np.isfinite(lon)
+        self.lat = lat[validos]
+        self.lon = lon[validos]
+        self.estudiantes = np.asarray(estudiantes, dtype=np.int64)[validos]
+        self.zoom_max = zoom_max
+        self.niveles = {zoom: self._agrupar(zoom) for zoom in range(zoom_max)}
+
+    # Agrupar los puntos en celdas de ~PIXELES_CELDA píxeles para un zoom dado
+    def _agrupar(self, zoom):
+        tamano = 360.0 / 2 ** zoom * PIXELES_CELDA / 256
+        columnas = math.ceil(360.0 / tamano) + 1
+        ix = np.floor((self.lon + 180.0) / tamano).astype(np.int64)
+        iy = np.floor((self.lat + 90.0) / tamano).astype(np.int64)
+
+        _, inverso = np.unique(iy * columnas + ix, return_inverse=True)
+        conteo = np.bincount(inverso)
+        return {
+            # Centroide de los puntos de cada celda
+            'lat': (np.bincount(inverso, weights=self.lat) / conteo).astype(np.float32),
+            'lon': (np.bincount(inverso, weights=self.lon) / conteo).astype(np.float32),
+            'conteo': conteo.astype(np.int32),
+            'estudiantes': np.bincount(inverso, weights=self.estudiantes).astype(np.int64),
+        }
+
+    # Grupos visibles para un zoom y unos límites (lon_min, lon_max, lat_min, lat_max).
+    # Pasado el umbral de zoom devuelve None: se deben usar los puntos individuales.
+    def consultar(self, zoom, limites=None):
+        zoom = max(int(math.floor(zoom)), 0)
+        if zoom >= self.zoom_max:
+            return None
+        grupos = self.niveles[zoom]
+        if limites is None:
+            return grupos
+        mascara = dentro_de_limites(grupos['lat'], grupos['lon'], limites)
+        return {clave: valores[mascara] for clave, valores in grupos.items()}
+
+
+# Zooms a partir de los cuales se usa cada resolución de la rejilla hexagonal
+ZOOMS_HEXAGONOS = (5, 7, 9, 11)
+
+# Radio aproximado de un hexágono en píxeles de pantalla
+PIXELES_HEXAGONO = 12
+
+# Hexágonos que se envían como mucho en una vista
+MAX_HEXAGONOS = 5000
+
+RAIZ_3 = math.sqrt(3.0)
+
+
+# Densidad de instituciones y estudiantes en rejillas hexagonales (hexágonos con
+# vértice arriba, coordenadas axiales), precalculada al cargar para varias
+# resoluciones. Longitud y latitud se usan como coordenadas planas: cerca del
+# ecuador la deformación es pequeña. Las consultas solo recorren los hexágonos
+# ocupados, así que su costo no depende del número de filas.
+class RejillaHexagonal:
+    def __init__(self, lat, lon, estudiantes, zooms=ZOOMS_HEXAGONOS):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        estudiantes = np.asarray(estudiantes, dtype=np.float64)
+        validos = np.isfinite(lat) & np.isfinite(lon)
+        self.niveles = {zoom: self._agrupar(lat[validos], lon[validos], estudiantes[validos], zoom) for zoom in zooms}
+
+    # Radio de los hexágonos (centro a vértice, en grados) para un zoom dado
+    @staticmethod
+    def radio(zoom):
+        return 360.0 / 2 ** zoom * PIXELES_HEXAGONO / 256
+
+    def _agrupar(self, lat, lon, estudiantes, zoom):
+        radio = self.radio(zoom)
+        q, r = hexagono_de_punto(lat, lon, radio)
+        # Clave única por hexágono (q y r caben de sobra en 32 bits cada uno)
+        _, primero, inverso = np.unique((q << 32) + r, return_index=True, return_inverse=True)
+        q, r = q[primero], r[primero]
+        return {
+            'lat': radio * 1.5 * r,
+            'lon': radio * RAIZ_3 * (q + r / 2.0),
+            'conteo': np.bincount(inverso).astype(np.int64),
+            'estudiantes': np.bincount(inverso, weights=estudiantes).astype(np.int64),
+            'radio': radio,
+        }
+
+    # Hexágonos de la resolución que corresponde a un zoom, dentro de los límites
+    # (lon_min, lon_max, lat_min, lat_max) ampliados en un radio. Si pasan de
+    # `maximo` se usa la resolución anterior, más gruesa.
+    def consultar(self, zoom, limites=None, maximo=MAX_HEXAGONOS):
+        niveles = sorted(self.niveles)
+        candidatos = [nivel for nivel in niveles if nivel <= zoom] or niveles[:1]
+        for nivel in reversed(candidatos):
+            hexagonos = self._en_vista(self.niveles[nivel], limites)
+            if maximo is None or len(hexagonos['conteo']) <= maximo:
+                break
+        return hexagonos
+
+    @staticmethod
+    def _en_vista(hexagonos, limites):
+        if limites is None:
+            return hexagonos
+        radio = hexagonos['radio']
+        lon_min, lon_max, lat_min, lat_max = limites
+        mascara = dentro_de_limites(hexagonos['lat'], hexagonos['lon'],
+                                    (lon_min - radio, lon_max + radio, lat_min - radio, lat_max + radio))
+        return {clave: valores if clave == 'radio' else valores[mascara] for clave, valores in hexagonos.items()}
+
+
+# Coordenadas axiales (q, r) del hexágono de radio `radio` que contiene cada punto
+def hexagono_de_punto(lat, lon, radio):
+    qf = (RAIZ_3 / 3.0 * lon - lat / 3.0) / radio
+    rf = (2.0 / 3.0 * lat) / radio
+    sf = -qf - rf
+    q, r, s = np.rint(qf), np.rint(rf), np.rint(sf)
+    # Redondeo cúbico: se corrige la coordenada que más se alejó al redondear
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    corregir_q = (dq > dr) & (dq > ds)
+    corregir_r = ~corregir_q & (dr > ds)
+    q = np.where(corregir_q, -r - s, q)
+    r = np.where(corregir_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+# GeoJSON con un polígono por hexágono (id = posición), con los seis vértices
+# calculados de una vez para todos los centros. Cada anillo es una vista del
+# arreglo: el codificador JSON lo serializa sin recorrer una lista por vértice.
+def poligonos_hexagonos(lat, lon, radio, decimales=5):
+    angulos = np.radians(30.0 + 60.0 * np.arange(7))
+    vertices = np.stack([
+        np.asarray(lon)[:, None] + radio * np.cos(angulos),
+        np.asarray(lat)[:, None] + radio * np.sin(angulos),
+    ], axis=-1).round(decimales)
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {'type': 'Feature', 'id': i, 'geometry': {'type': 'Polygon', 'coordinates': [anillo]}}
+            for i, anillo in enumerate(vertices)
+        ],
+    }
+
+
+# Lado de una celda del índice espacial, en grados
+GRADOS_CELDA = 0.1
+
+
+# Índice de rejilla sobre los puntos individuales: los puntos se ordenan por celda,
+# así que los de una fila de celdas contigua de la vista son un tramo del orden
+# y una consulta solo recorre los puntos de las celdas que toca. Con más de
+# `maximo` puntos en la vista se devuelve una muestra ponderada por `pesos`
+# (Efraimidis-Spirakis: los `maximo` de mayor prioridad log(u)/peso). La prioridad
+# de cada punto es fija, así que la muestra no cambia entre peticiones iguales y
+# un punto visible sigue visible al acercar el zoom.
+class IndiceEspacial:
+    def __init__(self, lat, lon, pesos, grados_celda=GRADOS_CELDA, semilla=0):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        # Las filas sin coordenadas no caen en ninguna celda; `originales` guarda
+        # la posición de cada punto indexado en las filas de entrada
+        validos = np.isfinite(lat) & np.isfinite(lon)
+        self.originales = np.flatnonzero(validos)
+        self.lat = lat[validos]
+        self.lon = lon[validos]
+        self.grados_celda = grados_celda
+        self.lon_min, self.lat_min, self.columnas, self.filas = 0.0, 0.0, 1, 1
+        if len(self.lat):
+            self.lon_min, self.lat_min = float(self.lon.min()), float(self.lat.min())
+            self.columnas = int((self.lon.max() - self.lon_min) // grados_celda) + 1
+            self.filas = int((self.lat.max() - self.lat_min) // grados_celda) + 1
+
+        celdas = self._fila(self.lat) * self.columnas + self._columna(self.lon)
+        self.orden = np.argsort(celdas, kind='stable')
+        self.celdas = celdas[self.orden]
+
+        pesos = np.maximum(np.asarray(pesos, dtype=np.float64)[validos], 1.0)
+        u = np.random.default_rng(semilla).random(len(pesos))
+        self.prioridad = np.log(np.maximum(u, np.finfo(np.float64).tiny)) / pesos
+
+    # La vista contiene todos los puntos (p. ej. el país entero a zoom bajo)
+    def _cubre_todo(self, limites):
+        lon_min, lon_max, lat_min, lat_max = limites
+        return (len(self.lat) > 0 and lon_min <= self.lon_min and lat_min <= self.lat_min
+                and lon_max >= self.lon.max() and lat_max >= self.lat.max())
+
+    def _columna(self, lon):
+        return np.clip(np.floor((lon - self.lon_min) / self.grados_celda), 0, self.columnas - 1).astype(np.int64)
+
+    def _fila(self, lat):
+        return np.clip(np.floor((lat - self.lat_min) / self.grados_celda), 0, self.filas - 1).astype(np.int64)
+
+    # Índices (posiciones en las filas de entrada, ordenadas) de los puntos dentro de los límites
+    # (lon_min, lon_max, lat_min, lat_max), como mucho `maximo`
+    def consultar(self, limites=None, maximo=None):
+        if limites is None or self._cubre_todo(limites):
+            indices = np.arange(len(self.lat))
+        else:
+            lon_min, lon_max, lat_min, lat_max = limites
+            c0, c1 = self._columna(np.array([lon_min, lon_max]))
+            f0, f1 = self._fila(np.array([lat_min, lat_max]))
+            inicios = np.arange(f0, f1 + 1) * self.columnas + c0
+            tramos = zip(np.searchsorted(self.celdas, inicios, side='left'),
+                         np.searchsorted(self.celdas, inicios + (c1 - c0), side='right'))
+            candidatos = np.concatenate([self.orden[a:b] for a, b in tramos] or [np.empty(0, dtype=np.int64)])
+            # Las celdas del borde cubren también puntos fuera de la vista
+            indices = candidatos[dentro_de_limites(self.lat[candidatos], self.lon[candidatos], limites)]
+        if maximo is not None and len(indices) > maximo:
+            indices = indices[np.argpartition(self.prioridad[indices], -maximo)[-maximo:]]
+        return self.originales[np.sort(indices)]
+
+
+def dentro_de_limites(lat, lon, limites):
+    lon_min, lon_max, lat_min, lat_max = limites
+    return (lon >= lon_min) & (lon <= lon_max) & (lat >= lat_min) & (lat <= lat_max)
+
+
+# Límites de la vista del mapa a partir de relayoutData ('mapbox._derived')
+def limites_vista(relayout):
+    coordenadas = (relayout or {}).get('mapbox._derived', {}).get('coordinates')
+    if not coordenadas:
+        return None
+    lons = [c[0] for c in coordenadas]
+    lats = [c[1] for c in coordenadas]
+    return min(lons), max(lons), min(lats), max(lats)
@@ -0,0 +1,309 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+import pandas as pd
+
+from geoprocesamiento import CSV_PATH, FILAS_POR_BLOQUE, archivo_atomico, bloqueo, escribir_atomico
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sin pyarrow se lee el CSV directamente
+    pa = None
+    feather = None
+
+
+# Copia columnar del CSV (Arrow IPC sin comprimir, apta para memory-map)
+RUTA_COLUMNAR = os.environ.get('RUTA_COLUMNAR', "educacion_superior.feather")
+
+# Columna opcional del CSV con el periodo de cada fila (año, semestre, ...). Si
+# existe, los datos se guardan además en una partición columnar por periodo.
+COLUMNA_PERIODO = os.environ.get('COLUMNA_PERIODO', 'Año')
+RUTA_PARTICIONES = os.environ.get('RUTA_PARTICIONES', "educacion_superior_periodos")
+MANIFIESTO_PARTICIONES = 'particiones.json'
+
+# Tipos compactos para cada columna del CSV
+TIPOS_COLUMNAS = {
+    'ID': 'int32',
+    'Departamento': 'category',
+    'Latitud': 'float32',
+    'Longitud': 'float32',
+    'Nivel': 'category',
+    'Estudiantes': 'int32',
+    'Institución': 'category',
+}
+
+
+# Huella barata del CSV de origen (tamaño y fecha de modificación)
+def huella_csv(csv_path):
+    estado = os.stat(csv_path)
+    return f'{estado.st_size}:{estado.st_mtime_ns}'
+
+
+# Firma del contenido del CSV (tamaño y sha256) para reconocer en una recarga si
+# solo se le anexaron filas al final
+def firma_csv(csv_path=CSV_PATH):
+    resumen = hashlib.sha256()
+    tamano = 0
+    with open(csv_path, 'rb') as f:
+        for parte in iter(lambda: f.read(1 << 20), b''):
+            resumen.update(parte)
+            tamano += len(parte)
+    return {'bytes': tamano, 'hash': resumen.hexdigest()}
+
+
+# Filas anexadas al CSV desde que se tomó `firma` (con las columnas del
+# encabezado), o None si el archivo cambió de otra forma o no creció
+def filas_anexadas(firma, csv_path=CSV_PATH):
+    if firma is None or os.path.getsize(csv_path) <= firma['bytes']:
+        return None
+    resumen = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        encabezado = f.readline()
+        resumen.update(encabezado)
+        restante = firma['bytes'] - len(encabezado)
+        ultimo = encabezado[-1:]
+        while restante > 0:
+            parte = f.read(min(1 << 20, restante))
+            if not parte:
+                return None
+            resumen.update(parte)
+            restante -= len(parte)
+            ultimo = parte[-1:]
+        if resumen.hexdigest() != firma['hash']:
+            return None
+        nuevas = f.read()
+    # La primera fila nueva tiene que empezar en una línea propia
+    if ultimo != b'\n' and not nuevas.startswith(b'\n'):
+        return None
+    return pd.read_csv(io.BytesIO(encabezado + nuevas))
+
+
+# Leer el CSV con los tipos compactos (las columnas enteras con nulos quedan como Int32)
+def leer_csv_tipado(csv_path, columnas=None):
+    tipos = {c: t for c, t in TIPOS_COLUMNAS.items() if columnas is None or c in columnas}
+    try:
+        return pd.read_csv(csv_path, usecols=columnas, dtype=tipos)
+    except (ValueError, TypeError):
+        tipos = {c: ('Int32' if t == 'int32' else t) for c, t in tipos.items()}
+        return pd.read_csv(csv_path, usecols=columnas, dtype=tipos)
+
+
+def columnar_vigente(csv_path, ruta=RUTA_COLUMNAR):
+    if not os.path.exists(ruta):
+        return False
+    try:
+        metadatos = feather.read_table(ruta, columns=[], memory_map=True).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return False
+    return metadatos.get(b'huella_csv', b'').decode() == huella_csv(csv_path)
+
+
+# Tipo de una columna sin tipo fijo que admite los valores de todos los bloques:
+# pandas infiere cada bloque por separado (p. ej. int64 en uno y float64 en otro
+# con un nulo), así que se guarda un tipo anulable para el archivo completo
+def tipo_comun(anterior, valores):
+    if valores.empty:
+        return anterior
+    if pd.api.types.is_bool_dtype(valores):
+        actual = 'boolean'
+    elif pd.api.types.is_integer_dtype(valores):
+        actual = 'Int64'
+    elif pd.api.types.is_float_dtype(valores):
+        # Enteros con algún nulo en el bloque: pandas los lee como float64
+        enteros = (valores % 1 == 0).all() and valores.abs().max() < 2 ** 53
+        actual = 'Int64' if enteros else 'float64'
+    else:
+        actual = 'string'
+    if anterior is None or anterior == actual:
+        return actual
+    if {anterior, actual} == {'Int64', 'float64'}:
+        return 'float64'
+    return 'string'
+
+
+# Primera pasada por bloques: categorías de cada columna categórica, columnas
+# enteras con nulos y un tipo anulable común para las columnas sin tipo fijo. Con
+# ellos todos los bloques comparten el mismo esquema y el mismo diccionario, como
+# exige el formato de archivo Arrow.
+def esquema_por_bloques(csv_path, filas_por_bloque=FILAS_POR_BLOQUE):
+    categoricas = [c for c, t in TIPOS_COLUMNAS.items() if t == 'category']
+    categorias = {}
+    con_nulos = set()
+    otras = {}
+    with pd.read_csv(csv_path, chunksize=filas_por_bloque, dtype={c: 'category' for c in categoricas}) as lector:
+        for bloque in lector:
+            for columna in bloque.columns:
+                if columna in categoricas:
+                    categorias.setdefault(columna, set()).update(bloque[columna].cat.categories)
+                elif columna not in TIPOS_COLUMNAS:
+                    otras[columna] = tipo_comun(otras.get(columna), bloque[columna].dropna())
+                elif TIPOS_COLUMNAS[columna] == 'int32' and bloque[columna].isna().any():
+                    con_nulos.add(columna)
+    tipos = {}
+    for columna, tipo in TIPOS_COLUMNAS.items():
+        if columna in categorias:
+            tipos[columna] = pd.CategoricalDtype(sorted(categorias[columna]))
+        elif columna in con_nulos:
+            tipos[columna] = 'Int32'
+        else:
+            tipos[columna] = tipo
+    # Columnas sin ningún valor: float64, como las infiere pandas
+    tipos.update({columna: tipo or 'float64' for columna, tipo in otras.items()})
+    return tipos
+
+
+# Convertir el CSV al formato columnar por bloques: cada bloque se escribe como un
+# lote de registros y la memoria pico depende de `filas_por_bloque`, no del archivo.
+# Un CSV que cabe en un solo bloque queda en un único lote, que pandas lee sin copias.
+def convertir_a_columnar(csv_path=CSV_PATH, ruta=RUTA_COLUMNAR, filas_por_bloque=FILAS_POR_BLOQUE):
+    tipos = esquema_por_bloques(csv_path, filas_por_bloque)
+    metadatos = {b'huella_csv': huella_csv(csv_path).encode()}
+    filas = 0
+    escritor = None
+    with archivo_atomico(ruta) as salida:
+        with pd.read_csv(csv_path, chunksize=filas_por_bloque, dtype=tipos) as lector:
+            for bloque in lector:
+                tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+                if escritor is None:
+                    esquema = tabla.schema.with_metadata({**(tabla.schema.metadata or {}), **metadatos})
+                    escritor = pa.ipc.new_file(salida, esquema)
+                escritor.write_table(tabla.replace_schema_metadata(esquema.metadata))
+                filas += len(bloque)
+        if escritor is not None:
+            escritor.close()
+    print(f"CSV convertido a formato columnar: {ruta} ({filas:,} filas)")
+
+
+# Convertir el CSV si la copia columnar no existe o es de otra versión del CSV
+# (una sola vez entre workers)
+def asegurar_columnar(csv_path=CSV_PATH):
+    if not columnar_vigente(csv_path):
+        with bloqueo(RUTA_COLUMNAR):
+            if not columnar_vigente(csv_path):
+                convertir_a_columnar(csv_path)
+
+
+# Cargar los datos de educación superior. Usa la copia columnar (convirtiéndola
+# la primera vez) y la lee con memory-map, de modo que los workers comparten las
+# páginas de las columnas numéricas; `columnas` limita las columnas leídas.
+def cargar_datos(csv_path=CSV_PATH, columnas=None):
+    if feather is None:
+        return leer_csv_tipado(csv_path, columnas)
+
+    asegurar_columnar(csv_path)
+    tabla = feather.read_table(RUTA_COLUMNAR, columns=columnas, memory_map=True)
+    return tabla.to_pandas(split_blocks=True)
+
+
+# Recorrer la copia columnar lote a lote (cada lote es un DataFrame sin copias
+# del memory-map), p. ej. para agregar sin materializar todas las filas a la vez
+def bloques_datos(csv_path=CSV_PATH, columnas=None):
+    if feather is None:
+        with pd.read_csv(csv_path, usecols=columnas, chunksize=FILAS_POR_BLOQUE) as lector:
+            yield from lector
+        return
+
+    asegurar_columnar(csv_path)
+    lector = pa.ipc.open_file(pa.memory_map(RUTA_COLUMNAR))
+    for i in range(lector.num_record_batches):
+        lote = lector.get_batch(i)
+        if columnas is not None:
+            lote = lote.select(columnas)
+        yield lote.to_pandas(split_blocks=True)
+
+
+# Periodos del CSV: particiones por periodo
+# -----------------------------------------
+
+def tiene_periodos(csv_path=CSV_PATH, columna=COLUMNA_PERIODO):
+    return columna in pd.read_csv(csv_path, nrows=0).columns
+
+
+# Nombre de archivo de la partición de un periodo
+def archivo_particion(periodo):
+    return 'periodo=' + re.sub(r'[^0-9A-Za-z_.-]+', '_', periodo) + '.feather'
+
+
+def leer_manifiesto_particiones(directorio=RUTA_PARTICIONES):
+    try:
+        with open(os.path.join(directorio, MANIFIESTO_PARTICIONES)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def particiones_vigentes(csv_path, directorio=RUTA_PARTICIONES, columna=COLUMNA_PERIODO):
+    manifiesto = leer_manifiesto_particiones(directorio)
+    return (manifiesto.get('huella_csv') == huella_csv(csv_path) and manifiesto.get('columna') == columna
+            and all(os.path.exists(os.path.join(directorio, archivo)) for archivo in manifiesto['periodos'].values()))
+
+
+# Repartir el CSV en una partición columnar por periodo, en una sola pasada por
+# bloques: cada bloque se divide por periodo y cada parte se añade como lote al
+# archivo de su periodo. Todas las particiones comparten el esquema y los
+# diccionarios de las categorías; la columna del periodo no se guarda (va en el
+# nombre del archivo). El manifiesto se escribe al final, así que unas particiones
+# a medias nunca se dan por vigentes.
+def particionar_por_periodo(csv_path=CSV_PATH, directorio=RUTA_PARTICIONES, columna=COLUMNA_PERIODO,
+                            filas_por_bloque=FILAS_POR_BLOQUE):
+    tipos = esquema_por_bloques(csv_path, filas_por_bloque)
+    os.makedirs(directorio, exist_ok=True)
+    escritores = {}
+    filas = {}
+    with contextlib.ExitStack() as pila:
+        with pd.read_csv(csv_path, chunksize=filas_por_bloque, dtype={**tipos, columna: 'string'}) as lector:
+            for bloque in lector:
+                for periodo, parte in bloque.groupby(columna, sort=False):
+                    tabla = pa.Table.from_pandas(parte.drop(columns=columna), preserve_index=False)
+                    if periodo not in escritores:
+                        salida = pila.enter_context(archivo_atomico(os.path.join(directorio, archivo_particion(periodo))))
+                        escritores[periodo] = pila.enter_context(pa.ipc.new_file(salida, tabla.schema))
+                        filas[periodo] = 0
+                    escritores[periodo].write_table(tabla)
+                    filas[periodo] += len(parte)
+
+    periodos = sorted(escritores)
+    manifiesto = {
+        'huella_csv': huella_csv(csv_path),
+        'columna': columna,
+        'periodos': {periodo: archivo_particion(periodo) for periodo in periodos},
+        'filas': filas,
+    }
+    escribir_atomico(os.path.join(directorio, MANIFIESTO_PARTICIONES), json.dumps(manifiesto, indent=2).encode('utf-8'))
+    print(f"CSV repartido en {len(periodos)} particiones por {columna}: {directorio}/ "
+          f"({sum(filas.values()):,} filas)")
+    return manifiesto
+
+
+# Periodos disponibles, ordenados (lista vacía si el CSV no tiene la columna del
+# periodo o no hay pyarrow). Reparte el CSV la primera vez (una sola vez entre workers).
+def periodos_disponibles(csv_path=CSV_PATH, columna=COLUMNA_PERIODO):
+    if feather is None or not tiene_periodos(csv_path, columna):
+        return []
+    if not particiones_vigentes(csv_path, columna=columna):
+        os.makedirs(RUTA_PARTICIONES, exist_ok=True)
+        with bloqueo(os.path.join(RUTA_PARTICIONES, MANIFIESTO_PARTICIONES)):
+            if not particiones_vigentes(csv_path, columna=columna):
+                particionar_por_periodo(csv_path, columna=columna)
+    return sorted(leer_manifiesto_particiones()['periodos'])
+
+
+# Recorrer por lotes solo la partición de un periodo (memory-map, sin copias)
+def bloques_periodo(periodo, columnas=None, directorio=RUTA_PARTICIONES):
+    archivo = leer_manifiesto_particiones(directorio)['periodos'][periodo]
+    lector = pa.ipc.open_file(pa.memory_map(os.path.join(directorio, archivo)))
+    for i in range(lector.num_record_batches):
+        lote = lector.get_batch(i)
+        if columnas is not None:
+            lote = lote.select(columnas)
+        yield lote.to_pandas(split_blocks=True)
+
+
+if __name__ == '__main__':
+    convertir_a_columnar(sys.argv[1] if len(sys.argv) > 1 else CSV_PATH)
@@ -1,162 +1,747 @@
+# Medir el arranque desde la primera línea, incluida la importación de dependencias
+from tiempos import fases, medir_fase, registrar_fase, desde_inicio, resumen_fases
 import pandas as pd
 import numpy as np
 import dash
-from dash import dcc, html
+from dash import dcc, html, Patch
 import plotly.express as px
 import plotly.graph_objects as go
-from dash.dependencies import Input, Output
+import plotly.io as pio
+from plotly.colors import get_colorscale
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
+import hashlib
 import json
 import os
-import geopandas as gpd 
+import threading
+import flask
+from geoprocesamiento import (procesar_datos_geograficos, normalizar_departamento, CSV_PATH, SHAPEFILE_PATH,
+                               EXTENSIONES_SHAPEFILE)
+from cache_figuras import CacheLRU, figura_en_cache, figura_a_dict
+from exportaciones import (Exportador, ParametrosInvalidos, FORMATOS_IMAGEN, instalar_exportaciones,
+                           serializar_tabla)
+from respuestas import RecursoComprimido, instalar_recurso_versionado, memorizar_respuestas, comprimir_respuestas
+from agrupamiento import IndiceClusters, IndiceEspacial, RejillaHexagonal, limites_vista, poligonos_hexagonos
+from agregados import CuboAgregados, CubosPorPeriodo, DIMENSIONES, MEDIDAS
+from estadisticas import MotorEstadisticas, DIMENSIONES_ESTADISTICAS
+from almacen import (cargar_datos, bloques_datos, bloques_periodo, huella_csv, periodos_disponibles, firma_csv,
+                     filas_anexadas, COLUMNA_PERIODO)
+from metricas import registro, instrumentar_callbacks
+from perfilador import instalar_perfilador
+from recarga import Recargador, instalar_recarga, RECARGA_VIGILAR, TOKEN_RECARGA
 
+registrar_fase('Importación de dependencias', desde_inicio())
 
-#Función para procesar los datos geográficos
-def procesar_datos_geograficos():
-    # Rutas de entrada
-    # Cambiar la línea de definición de ruta
-    shapefile_path = os.path.join(os.path.dirname(__file__), 'COLOMBIA.shp')
-    csv_path = "educacion_superior.csv"
-    output_geojson_path = "colombia_educacion.geojson"
-    output_puntos_path = "colombia_educacion_puntos.geojson"
-    
-    # Comprobar si los GeoJSON ya existen para no volver a procesarlos
-    if os.path.exists(output_geojson_path) and os.path.exists(output_puntos_path):
-        print("Archivos GeoJSON encontrados. Cargando directamente...")
-        with open(output_geojson_path, 'r') as f:
-            geojson_data = json.load(f)
-        with open(output_puntos_path, 'r') as f:
-            geojson_puntos = json.load(f)
-            
-        # Intentar identificar la columna de departamentos
-        dept_cols = ['DEPARTAMEN', 'NOMBRE_DEP', 'DPTO', 'NAME_1', 'DEPARTAMENTO', 'NOM_DEPART']
-        dept_col = None
-        
-        for col in dept_cols:
-            if geojson_data['features'] and col in geojson_data['features'][0]['properties']:
-                dept_col = col
-                break
-        
+# Servir la geometría de los polígonos una sola vez desde un endpoint cacheable
+# y actualizar el mapa con parches parciales (solo z, escala de color y visibilidad)
+GEOJSON_ESTATICO = os.environ.get('GEOJSON_ESTATICO', '0') == '1'
+URL_POLIGONOS = '/geo/poligonos.geojson'
+ZOOM_INICIAL = 5
+
+# Agrupar las instituciones del mapa en celdas por zoom (modo para datasets grandes)
+AGRUPAR_INSTITUCIONES = os.environ.get('AGRUPAR_INSTITUCIONES', '0') == '1'
+
+# Enviar solo los puntos de instituciones de la vista actual del mapa (consultados
+# en un índice espacial con cada relayoutData), como mucho MAX_PUNTOS_VISTA y
+# muestreados por número de estudiantes: el tamaño de la respuesta no crece con el país
+PUNTOS_EN_VISTA = os.environ.get('PUNTOS_EN_VISTA', '0') == '1'
+MAX_PUNTOS_VISTA = int(os.environ.get('MAX_PUNTOS_VISTA', 5000))
+
+# Modos en los que la traza de instituciones depende del zoom y de la vista
+PUNTOS_POR_VISTA = AGRUPAR_INSTITUCIONES or PUNTOS_EN_VISTA
+
+# Resolver en el navegador el cambio de variable del mapa, la visibilidad de los
+# puntos y la gráfica por departamento (assets/callbacks_cliente.js), con los
+# agregados enviados una sola vez a un dcc.Store
+CALLBACKS_CLIENTE = os.environ.get('CALLBACKS_CLIENTE', '0') == '1'
+
+# La traza de puntos siempre está en la figura y se alterna con 'visible'
+PUNTOS_OCULTABLES = GEOJSON_ESTATICO or CALLBACKS_CLIENTE
+
+# Cargar los datos (tabulares y geográficos) en un hilo en segundo plano: el
+# servidor responde en cuanto existe el layout, los callbacks esperan a los datos
+# tabulares y la pestaña de Georreferenciación muestra el progreso
+CARGA_DIFERIDA = os.environ.get('CARGA_DIFERIDA', '0') == '1'
+# Los hilos no sobreviven al fork: con el preload de gunicorn la carga diferida no
+# arranca al importar sino en cada worker (gunicorn.conf.py activa esta variable)
+CARGA_EN_WORKERS = os.environ.get('CARGA_EN_WORKERS', '0') == '1'
+# Espera máxima de una petición a los datos tabulares antes de responder 503
+ESPERA_DATOS_S = float(os.environ.get('ESPERA_DATOS_S', 30))
+
+# Con la recarga activada (ver recarga.py) el navegador consulta cada
+# RECARGA_CONSULTA_S segundos si hay una versión de datos nueva
+RECARGA_ACTIVA = bool(RECARGA_VIGILAR or TOKEN_RECARGA)
+CONSULTA_VERSION_MS = int(float(os.environ.get('RECARGA_CONSULTA_S', 30)) * 1000)
+
+# Gráficas de la pestaña de visualizaciones que dependen solo de los datos
+GRAFICAS_ESTATICAS = ('grafica-nivel', 'grafica-departamentos', 'grafica-instituciones')
+
+# Tarjetas y gráficas que se filtran por departamento (filtro-estadisticas),
+# construidas desde los resúmenes del motor de estadísticas
+TARJETAS = ('total-estudiantes', 'total-instituciones', 'total-departamentos', 'promedio-estudiantes')
+GRAFICAS_RESUMEN = ('grafica-distribucion', 'grafica-boxplot')
+
+# Instantánea de datos publicada para los callbacks: DataFrame, cubo, gráficas y
+# datos geográficos de una misma versión. Nunca se modifica en sitio: la carga
+# diferida y las recargas construyen un dict nuevo y lo publican con una sola
+# asignación, así que un callback que la lee una vez al empezar ve un estado completo.
+instantanea = None
+
+# Estado de la primera carga geográfica ('cargando', 'listo' o 'error')
+estado_geografico = 'cargando'
+hilo_carga = None
+geo_terminado = threading.Event()
+tabulares_listos = threading.Event()
+
+# Campos geográficos de una instantánea sin datos geográficos
+SIN_GEOGRAFICOS = {'geo_data': None, 'dept_col': None, 'datos_mapa': None, 'asignacion_puntos': None,
+                   'recursos_poligonos': {}}
+
+# Caché de figuras del mapa, indexada por (versión de datos, variable, mostrar instituciones)
+cache_mapa = CacheLRU(int(os.environ.get('CACHE_FIGURAS_MB', 64)) * 1024 * 1024)
+
+# Respuestas de callbacks ya codificadas en JSON, por (versión de datos, cuerpo de
+# la petición), y su versión comprimida con gzip por hash del contenido
+CACHE_RESPUESTAS_BYTES = int(os.environ.get('CACHE_RESPUESTAS_MB', 64)) * 1024 * 1024
+cache_respuestas = CacheLRU(CACHE_RESPUESTAS_BYTES)
+cache_comprimidas = CacheLRU(CACHE_RESPUESTAS_BYTES)
+
+# Comprimir las respuestas de los callbacks (desactivar si ya lo hace un proxy)
+COMPRIMIR_RESPUESTAS = os.environ.get('COMPRIMIR_RESPUESTAS', '1') == '1'
+
+# Extraer una sola vez las ubicaciones y los valores de cada variable del mapa
+def preparar_datos_mapa(geo_data, dept_col):
+    ubicaciones = []
+    valores = {'Estudiantes': [], 'NumInstituciones': []}
+    for feature in geo_data['poligonos']['features']:
+        propiedades = feature['properties']
+        if dept_col in propiedades:
+            ubicaciones.append(propiedades[dept_col])
+            for variable in valores:
+                valores[variable].append(propiedades.get(variable, 0))
+    return {'ubicaciones': ubicaciones, 'valores': valores}
+
+# Polígono (posición en datos_mapa['ubicaciones']), periodo, estudiantes e
+# institución de cada punto según la asignación por coordenadas (modo
+# ASIGNACION_ESPACIAL). None sin asignación espacial o sin columna del periodo.
+def asignacion_puntos(geo_data, ubicaciones):
+    capa = geo_data['puntos']
+    departamento_geo = capa.columnas.get('DepartamentoGeo')
+    periodo = capa.columnas.get(COLUMNA_PERIODO)
+    if departamento_geo is None or periodo is None:
+        return None
+    posiciones = {}
+    for posicion, ubicacion in enumerate(ubicaciones):
+        posiciones.setdefault(ubicacion, posicion)
+    departamento_geo = pd.Categorical(departamento_geo)
+    por_categoria = np.array([posiciones.get(c, -1) for c in departamento_geo.categories] + [-1], dtype=np.int32)
+    # El periodo como texto, igual que en las particiones (que leen la columna como texto)
+    periodo = pd.Series(periodo)
+    if pd.api.types.is_float_dtype(periodo) and (periodo.dropna() % 1 == 0).all():
+        periodo = periodo.astype('Int64')
+    ids = capa.columnas.get('ID')
+    return {
+        'poligono': por_categoria[departamento_geo.codes],
+        'periodo': pd.Categorical(periodo.astype('string')),
+        'estudiantes': capa.columnas['Estudiantes'],
+        'instituciones': ~np.isnan(ids) if ids is not None and ids.dtype.kind == 'f' else np.ones(len(capa), dtype=bool),
+    }
+
+# Valores del mapa por periodo, ya alineados con las ubicaciones, por (periodo, versión)
+cache_valores_periodo = {}
+
+# Valores del mapa de un periodo en el orden de datos_mapa['ubicaciones'] (None =
+# todos los periodos: los que el procesamiento geográfico unió a los polígonos).
+# Con asignación espacial se suman los puntos del periodo por polígono asignado;
+# si no, salen del cubo del periodo con la misma normalización de nombres que la unión.
+def valores_mapa(datos, periodo=None):
+    if periodo is None:
+        return datos['datos_mapa']['valores']
+    clave = (periodo, datos['version'])
+    valores = cache_valores_periodo.get(clave)
+    if valores is None:
+        asignacion = datos['asignacion_puntos']
+        if asignacion is not None:
+            n = len(datos['datos_mapa']['ubicaciones'])
+            filas = np.asarray(asignacion['periodo'] == periodo) & (asignacion['poligono'] >= 0)
+            poligono = asignacion['poligono'][filas]
+            valores = {
+                'Estudiantes': np.bincount(poligono, weights=asignacion['estudiantes'][filas], minlength=n),
+                'NumInstituciones': np.bincount(poligono, weights=asignacion['instituciones'][filas], minlength=n),
+            }
+            valores = {variable: conteos.astype('int64').tolist() for variable, conteos in valores.items()}
+        else:
+            tabla = datos['cubos_periodo'][periodo].rollup(['Departamento'])
+            por_clave = tabla.groupby(normalizar_departamento(tabla.index.to_series()).to_numpy()).sum()
+            claves = normalizar_departamento(pd.Series(datos['datos_mapa']['ubicaciones'], dtype=object))
+            por_ubicacion = por_clave.reindex(claves.to_numpy()).fillna(0).astype('int64')
+            valores = {
+                'Estudiantes': por_ubicacion['Estudiantes'].tolist(),
+                'NumInstituciones': por_ubicacion['Registros'].tolist(),
+            }
+        cache_valores_periodo[clave] = valores
+    return valores
+
+# Periodo que corresponde a la posición del slider del mapa (None = todos)
+def periodo_seleccionado(datos, indice):
+    periodos = datos['cubos_periodo'].periodos
+    if isinstance(indice, (int, float)) and 0 <= indice < len(periodos):
+        return periodos[int(indice)]
+    return None
+
+# GeoJSON solo con la geometría y la clave de departamento, sin los datos
+def geometria_poligonos(geojson_data, dept_col):
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'id': feature.get('id'),
+                'properties': {dept_col: feature['properties'].get(dept_col)},
+                'geometry': feature['geometry'],
+            }
+            for feature in geojson_data['features']
+        ]
+    }
+
+# Nivel de simplificación que corresponde a un zoom del mapa (None = precisión completa)
+def nivel_para_zoom(datos, zoom):
+    niveles = sorted(datos['geo_data'].get('niveles', {})) if datos['geo_data'] else []
+    candidatos = [nivel for nivel in niveles if nivel <= zoom]
+    return candidatos[-1] if candidatos else None
+
+# GeoJSON de polígonos de un nivel: URL en modo estático, datos embebidos si no.
+# La versión va en la URL para que el navegador no reutilice la geometría de otra.
+def geojson_para_nivel(datos, nivel):
+    geo_data = datos['geo_data']
+    if GEOJSON_ESTATICO:
+        url = f"{app.get_relative_path(URL_POLIGONOS)}?v={geo_data.get('version')}"
+        return url if nivel is None else f'{url}&nivel={nivel}'
+    return geo_data.get('niveles', {}).get(nivel, geo_data['poligonos'])
+
+# Respuestas precomprimidas con la geometría de cada nivel (modo GEOJSON_ESTATICO)
+def preparar_recursos_poligonos(geo_data, dept_col):
+    recursos = {}
+    geojson_por_nivel = {None: geo_data['poligonos'], **geo_data.get('niveles', {})}
+    for nivel, geojson_nivel in geojson_por_nivel.items():
+        recursos[nivel] = RecursoComprimido(
+            json.dumps(geometria_poligonos(geojson_nivel, dept_col)).encode('utf-8'),
+            etag=f"{geo_data.get('version')}-{nivel}"
+        )
+    return recursos
+
+# Gráficas de la pestaña de visualizaciones que no dependen del filtro,
+# convertidas a dict una sola vez por instantánea (los callbacks solo las devuelven)
+def graficas_estadisticas(cubo):
+    estudiantes_por_nivel = cubo.consultar(['Nivel'])
+    estudiantes_por_departamento = cubo.top('Departamento', 10)
+    estudiantes_por_institucion = cubo.top('Institución', 10)
+
+    figuras = {
+        # Gráfica 1: Distribución de estudiantes por nivel
+        'grafica-nivel': px.pie(
+            estudiantes_por_nivel, 
+            values='Estudiantes', 
+            names='Nivel',
+            title='Distribución de Estudiantes por Nivel Educativo',
+            color_discrete_sequence=px.colors.qualitative.Pastel,
+            hole=0.3
+        ),
+        # Gráfica 2: Top 10 departamentos por número de estudiantes
+        'grafica-departamentos': px.bar(
+            estudiantes_por_departamento, 
+            x='Departamento', 
+            y='Estudiantes',
+            title='Top 10 Departamentos por Número de Estudiantes',
+            color='Estudiantes',
+            color_continuous_scale=px.colors.sequential.Blues
+        ),
+        # Gráfica 3: Top 10 instituciones por número de estudiantes
+        'grafica-instituciones': px.bar(
+            estudiantes_por_institucion, 
+            x='Estudiantes', 
+            y='Institución',
+            title='Top 10 Instituciones por Número de Estudiantes',
+            orientation='h',
+            color='Estudiantes',
+            color_continuous_scale=px.colors.sequential.Greens
+        ).update_layout(yaxis={'categoryorder':'total ascending'}),
+    }
+    return {
+        'figuras': {id_grafica: figura_a_dict(fig)[0] for id_grafica, fig in figuras.items()},
+        'opciones_departamento': [{'label': dep, 'value': dep} for dep in cubo.valores('Departamento')],
+    }
+
+# Tarjetas de estadísticas de todos los datos o de un departamento
+def tarjetas_estadisticas(datos, departamento=None):
+    cubo = datos['cubo']
+    resumen = datos['estadisticas'].resumen(departamento)
+    if departamento is None:
+        instituciones, departamentos = len(cubo.valores('Institución')), len(cubo.valores('Departamento'))
+    else:
+        instituciones, departamentos = len(cubo.consultar(['Institución'], Departamento=departamento)), 1
+    return [f"{resumen['suma']:,}", f"{instituciones}", f"{departamentos}", f"{resumen['promedio']:.0f}"]
+
+# Histograma y box plot desde los resúmenes precalculados: barras por casilla y
+# una caja por nivel con sus cuartiles (el navegador no recibe las filas)
+def graficas_resumen(datos, departamento=None):
+    resumen = datos['estadisticas'].resumen(departamento)
+    sufijo = f' en {departamento}' if departamento is not None else ''
+
+    # Gráfica 4: Distribución de estudiantes (histograma)
+    histograma = resumen['histograma']
+    ancho = histograma['ancho']
+    distribucion = go.Figure(go.Bar(
+        x=[inicio + ancho / 2 for inicio in histograma['inicios']],
+        y=histograma['conteos'],
+        customdata=[[inicio, inicio + ancho - 1] for inicio in histograma['inicios']],
+        marker_color='#636EFA',
+        hovertemplate='Estudiantes=%{customdata[0]}-%{customdata[1]}<br>count=%{y}<extra></extra>',
+    )).update_layout(
+        title='Distribución del Número de Estudiantes por Institución' + sufijo,
+        xaxis_title='Estudiantes', yaxis_title='count', bargap=0.1,
+    )
+
+    # Gráfica 5: Box plot de estudiantes por nivel
+    boxplot = go.Figure([
+        go.Box(
+            name=nivel, x=[nivel], q1=[cajas['q1']], median=[cajas['mediana']], q3=[cajas['q3']],
+            lowerfence=[cajas['bigote_inferior']], upperfence=[cajas['bigote_superior']],
+            mean=[cajas['promedio']], boxpoints=False,
+        )
+        for nivel, cajas in resumen['niveles'].items()
+    ]).update_layout(
+        title='Distribución de Estudiantes por Nivel (Box Plot)' + sufijo,
+        xaxis_title='Nivel', yaxis_title='Estudiantes', legend_title_text='Nivel',
+    )
+    return {'grafica-distribucion': figura_a_dict(distribucion)[0], 'grafica-boxplot': figura_a_dict(boxplot)[0]}
+
+# Datos tabulares de una instantánea: DataFrame, índices de clusters y de puntos,
+# cubo de agregados y gráficas estáticas. En una recarga (`anterior`) en la que
+# al CSV solo se le anexaron filas, el cubo se actualiza con esas filas.
+def construir_tabulares(anterior=None):
+    huella = huella_csv(CSV_PATH)
+    # Firma del CSV para reconocer las filas anexadas en la próxima recarga
+    firma = firma_csv(CSV_PATH) if RECARGA_ACTIVA else None
+    nuevas = filas_anexadas(anterior['firma_csv'], CSV_PATH) if anterior else None
+    # Copia columnar con tipos compactos, convertida en la primera carga
+    with medir_fase('Carga CSV'):
+        df = cargar_datos()
+
+    # Índice de grupos de instituciones por zoom
+    indice_clusters = None
+    if AGRUPAR_INSTITUCIONES:
+        with medir_fase('Índice de clusters'):
+            indice_clusters = IndiceClusters(df['Latitud'], df['Longitud'], df['Estudiantes'])
+
+    # Índice espacial de los puntos individuales para consultar la vista del mapa
+    indice_puntos = None
+    if PUNTOS_POR_VISTA:
+        with medir_fase('Índice espacial'):
+            indice_puntos = IndiceEspacial(df['Latitud'], df['Longitud'], df['Estudiantes'])
+
+    # Densidad de instituciones y estudiantes en hexágonos, para varias resoluciones
+    with medir_fase('Rejilla hexagonal'):
+        rejilla_hexagonal = RejillaHexagonal(df['Latitud'], df['Longitud'], df['Estudiantes'])
+
+    # Cubo de agregados Departamento × Nivel × Institución, agregado lote a lote
+    # sobre la copia columnar, sin una copia agrupada de todo df
+    with medir_fase('Cubo de agregados'):
+        if nuevas is not None:
+            cubo = anterior['cubo'].con_filas(nuevas)
+        else:
+            cubo = CuboAgregados.desde_bloques(bloques_datos(columnas=list(DIMENSIONES) + ['Estudiantes']))
+
+    # Un cubo por periodo si el CSV tiene la columna del periodo: cada uno se
+    # construye la primera vez que se pide, leyendo solo la partición de su periodo
+    with medir_fase('Particiones por periodo'):
+        periodos = periodos_disponibles()
+    cubos_periodo = CubosPorPeriodo(
+        periodos, lambda periodo: bloques_periodo(periodo, columnas=list(DIMENSIONES) + ['Estudiantes'])
+    )
+
+    # Conteos, sumas, bocetos de cuantiles e histogramas por Departamento × Nivel
+    # para las tarjetas, el histograma y el box plot
+    with medir_fase('Motor de estadísticas'):
+        estadisticas = MotorEstadisticas.desde_bloques(
+            bloques_datos(columnas=list(DIMENSIONES_ESTADISTICAS) + ['Estudiantes'])
+        )
+
+    with medir_fase('Gráficas estadísticas'):
+        graficas = graficas_estadisticas(cubo)
+
+    # Si el CSV cambió mientras tanto, la firma ya no describe lo cargado: la
+    # próxima recarga lo reconstruye todo
+    if huella_csv(CSV_PATH) != huella:
+        firma = None
+
+    return {'huella_csv': huella, 'firma_csv': firma, 'df': df, 'indice_clusters': indice_clusters,
+            'indice_puntos': indice_puntos, 'rejilla_hexagonal': rejilla_hexagonal, 'cubo': cubo,
+            'cubos_periodo': cubos_periodo, 'estadisticas': estadisticas, 'graficas': graficas}
+
+# Datos geográficos de una instantánea (None si no se pudieron procesar)
+def construir_geograficos():
+    with medir_fase('Datos geográficos'):
+        datos = procesar_datos_geograficos()
+        if not datos:
+            return None
+        columna = datos['dept_col']
+        datos_mapa = preparar_datos_mapa(datos, columna)
         return {
-            'poligonos': geojson_data,
-            'puntos': geojson_puntos,
-            'dept_col': dept_col
+            'geo_data': datos,
+            'dept_col': columna,
+            'datos_mapa': datos_mapa,
+            'asignacion_puntos': asignacion_puntos(datos, datos_mapa['ubicaciones']),
+            'recursos_poligonos': preparar_recursos_poligonos(datos, columna) if GEOJSON_ESTATICO else {},
         }
-    
-    # Si no existen, importamos geopandas y procesamos los archivos
+
+# Instantánea con su versión: cambia con el CSV y con los artefactos geográficos,
+# y es la misma en todos los workers que leen los mismos archivos
+def con_version(datos):
+    geo_version = datos['geo_data'].get('version') if datos['geo_data'] else ''
+    clave = f"{datos['huella_csv']}|{geo_version}"
+    return {**datos, 'version': hashlib.sha256(clave.encode()).hexdigest()[:12]}
+
+# Procesar datos geográficos y publicarlos para los callbacks. La instantánea se
+# reemplaza antes de cambiar el estado: quien vea 'listo' ya ve los datos.
+def cargar_datos_geograficos():
+    global instantanea, estado_geografico
     try:
-        # Cargar el shapefile
-        gdf_colombia = gpd.read_file(shapefile_path)
-        
-        # Cargar el CSV
-        df_educacion = pd.read_csv(csv_path)
-        
-        # Crear GeoDataFrame de puntos
-        gdf_puntos = gpd.GeoDataFrame(
-            df_educacion, 
-            geometry=gpd.points_from_xy(df_educacion.Longitud, df_educacion.Latitud),
-            crs="EPSG:4326"
-        )
-        
-        # Identificar columna de departamentos
-        dept_col = None
-        posibles_cols = ['DEPARTAMEN', 'NOMBRE_DEP', 'DPTO', 'NAME_1', 'DEPARTAMENTO', 'NOM_DEPART']
-        for col in posibles_cols:
-            if col in gdf_colombia.columns:
-                dept_col = col
-                break
-        
-        if dept_col is None:
-            # Usar la primera columna que parezca contener nombres
-            for col in gdf_colombia.columns:
-                if gdf_colombia[col].dtype == 'object' and gdf_colombia[col].nunique() > 20:
-                    dept_col = col
-                    break
-        
-        # Convertir a GeoJSON
-        gdf_colombia['id'] = gdf_colombia.index
-        geojson_data = json.loads(gdf_colombia.to_json())
-        geojson_puntos = json.loads(gdf_puntos.to_json())
-        
-        # Agregar datos por departamento
-        if 'Departamento' in df_educacion.columns:
-            # Agregar datos de estudiantes por departamento
-            estudiantes_por_depto = df_educacion.groupby('Departamento')['Estudiantes'].sum().reset_index()
-            instituciones_por_depto = df_educacion.groupby('Departamento')['ID'].count().reset_index()
-            instituciones_por_depto.rename(columns={'ID': 'NumInstituciones'}, inplace=True)
-            
-            # Unir los datos
-            datos_por_depto = pd.merge(estudiantes_por_depto, instituciones_por_depto, on='Departamento')
-            
-            # Unir datos a las geometrías
-            for feature in geojson_data['features']:
-                dept_name = feature['properties'][dept_col]
-                # Buscar el departamento en los datos agregados
-                match = datos_por_depto[datos_por_depto['Departamento'].str.upper() == dept_name.upper()]
-                if not match.empty:
-                    feature['properties']['Estudiantes'] = int(match['Estudiantes'].values[0])
-                    feature['properties']['NumInstituciones'] = int(match['NumInstituciones'].values[0])
-                else:
-                    feature['properties']['Estudiantes'] = 0
-                    feature['properties']['NumInstituciones'] = 0
-        
-        # Guardar GeoJSON
-        with open(output_geojson_path, 'w') as f:
-            json.dump(geojson_data, f)
-        
-        with open(output_puntos_path, 'w') as f:
-            json.dump(geojson_puntos, f)
-        
+        geograficos = construir_geograficos()
+    except Exception as e:
+        print(f"Error al inicializar datos geográficos: {str(e)}")
+        geograficos = None
+
+    if geograficos:
+        instantanea = con_version({**instantanea, **geograficos})
+    estado_geografico = 'listo' if geograficos else 'error'
+    geo_terminado.set()
+
+# Construir y publicar los datos tabulares, si no lo están ya (con el preload de
+# gunicorn se construyen en el maestro antes del fork)
+def cargar_tabulares():
+    global instantanea
+    if instantanea is None:
+        instantanea = con_version({**construir_tabulares(), **SIN_GEOGRAFICOS})
+    tabulares_listos.set()
+
+# Carga en segundo plano (modo CARGA_DIFERIDA): datos tabulares y después los
+# geográficos; al terminar se precalientan las figuras del mapa y se imprime el
+# desglose de tiempos
+def cargar_en_segundo_plano():
+    global estado_geografico
+    try:
+        cargar_tabulares()
+    except Exception as e:
+        print(f"Error al cargar los datos: {str(e)}")
+        estado_geografico = 'error'
+        geo_terminado.set()
+        return
+    cargar_datos_geograficos()
+    with medir_fase('Precalentar mapa'):
+        precalentar()
+    print(resumen_fases('Datos cargados'))
+
+def iniciar_carga_diferida():
+    global hilo_carga
+    if hilo_carga is None and not geo_terminado.is_set():
+        hilo_carga = threading.Thread(target=cargar_en_segundo_plano, name='carga-diferida', daemon=True)
+        hilo_carga.start()
+
+# Recarga: instantánea completa nueva, con las figuras del mapa precalentadas
+# antes de publicarla. Si los datos geográficos fallan se conserva la anterior.
+def reconstruir_instantanea():
+    geo_terminado.wait()
+    tabulares = construir_tabulares(instantanea)
+    geograficos = construir_geograficos()
+    if geograficos is None and instantanea['geo_data'] is not None:
+        raise RuntimeError('No se pudieron procesar los datos geográficos nuevos')
+    nueva = con_version({**tabulares, **(geograficos or SIN_GEOGRAFICOS)})
+    precalentar(nueva)
+    return nueva
+
+def publicar_instantanea(nueva):
+    global instantanea
+    instantanea = nueva
+    # Las figuras de otras versiones ya no se pueden volver a pedir
+    cache_mapa.descartar(lambda clave: clave[0] != nueva['version'])
+    cache_respuestas.descartar(lambda clave: clave[0][0] != nueva['version'])
+    # list() copia las claves de una vez: los hilos de las peticiones siguen insertando
+    for cache in (cache_pestanas, cache_valores_periodo):
+        for clave in [c for c in list(cache) if c[1] != nueva['version']]:
+            cache.pop(clave, None)
+    print(f"Versión de datos publicada: {nueva['version']}")
+
+recargador = Recargador(
+    reconstruir_instantanea, publicar_instantanea,
+    [CSV_PATH] + [os.path.splitext(SHAPEFILE_PATH)[0] + extension for extension in EXTENSIONES_SHAPEFILE]
+)
+
+if not CARGA_DIFERIDA:
+    cargar_tabulares()
+    cargar_datos_geograficos()
+
+# Propiedades de la traza de instituciones para un zoom y una vista: grupos con
+# conteo y estudiantes sumados, o puntos individuales de la vista pasado el umbral
+# (o siempre, sin agrupamiento), como mucho MAX_PUNTOS_VISTA
+def traza_instituciones(datos, zoom, limites=None):
+    indice_clusters = datos['indice_clusters']
+    grupos = indice_clusters.consultar(zoom, limites) if indice_clusters is not None else None
+    if grupos is None:
+        indices = datos['indice_puntos'].consultar(limites, MAX_PUNTOS_VISTA)
+        puntos = datos['df'].iloc[indices]
+        # Arreglos numéricos y listas planas de texto: el codificador JSON no
+        # recorre una tupla por punto
         return {
-            'poligonos': geojson_data,
-            'puntos': geojson_puntos,
-            'dept_col': dept_col
+            'lat': puntos['Latitud'].to_numpy(dtype=float).round(5),
+            'lon': puntos['Longitud'].to_numpy(dtype=float).round(5),
+            'text': puntos['Institución'].astype(str).tolist(),
+            'hovertext': puntos['Nivel'].astype(str).tolist(),
+            'customdata': puntos['Estudiantes'].to_numpy(),
+            'marker': {'size': 8, 'color': 'red', 'opacity': 0.7},
+            'hovertemplate': '<b>%{text}</b><br>Estudiantes: %{customdata}<br>'
+                             'Nivel: %{hovertext}<extra></extra>',
         }
-    
-    except Exception as e:
-        print(f"Error al procesar datos geográficos: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return None
+    conteo = grupos['conteo']
+    return {
+        'lat': np.round(grupos['lat'].astype(float), 5).tolist(),
+        'lon': np.round(grupos['lon'].astype(float), 5).tolist(),
+        'text': [f'{n} instituciones' for n in conteo.tolist()],
+        'customdata': list(zip(conteo.tolist(), grupos['estudiantes'].tolist())),
+        'marker': {'size': np.clip(8 + 4 * np.log2(conteo), 8, 40).tolist(), 'color': 'red', 'opacity': 0.7},
+        'hovertemplate': '<b>%{customdata[0]} instituciones</b><br>'
+                         'Estudiantes: %{customdata[1]}<extra></extra>',
+    }
 
-# Procesar datos geográficos
-try:
-    geo_data = procesar_datos_geograficos()
-    dept_col = geo_data['dept_col'] if geo_data else None
-except Exception as e:
-    print(f"Error al inicializar datos geográficos: {str(e)}")
-    geo_data = None
-    dept_col = None
-
-# Carga de datos
-df = pd.read_csv('educacion_superior.csv')
-
-# Preparar datos para las gráficas
-estudiantes_por_nivel = df.groupby('Nivel')['Estudiantes'].sum().reset_index()
-estudiantes_por_departamento = df.groupby('Departamento')['Estudiantes'].sum().sort_values(ascending=False).head(10).reset_index()
-estudiantes_por_institucion = df.groupby('Institución')['Estudiantes'].sum().sort_values(ascending=False).head(10).reset_index()
-
-# Calcular estadísticas básicas
-total_estudiantes = df['Estudiantes'].sum()
-total_instituciones = df['Institución'].nunique()
-total_departamentos = df['Departamento'].nunique()
-promedio_estudiantes = df['Estudiantes'].mean()
+# Propiedades de la traza de densidad (coroplético de hexágonos) para un zoom y
+# una vista: solo los hexágonos ocupados de la vista, con la geometría generada
+# al vuelo a partir de sus centros
+def traza_densidad(datos, variable, zoom, limites=None):
+    hexagonos = datos['rejilla_hexagonal'].consultar(zoom, limites)
+    return {
+        'geojson': poligonos_hexagonos(hexagonos['lat'], hexagonos['lon'], hexagonos['radio']),
+        'locations': np.arange(len(hexagonos['conteo'])),
+        'z': hexagonos['estudiantes'] if variable == 'Estudiantes' else hexagonos['conteo'],
+        # Ambas medidas para el hover y para cambiar de variable sin pedir la traza
+        'customdata': np.column_stack([hexagonos['conteo'], hexagonos['estudiantes']]),
+        'hovertemplate': '<b>%{customdata[0]} instituciones</b><br>'
+                         'Estudiantes: %{customdata[1]}<extra></extra>',
+    }
 
 # Inicializar la aplicación Dash
 app = dash.Dash(__name__, title='Análisis de Educación Superior')
 
+# Medir latencia, serialización y tamaño de respuesta de todos los callbacks
+instrumentar_callbacks(app)
+
+# Contenido de las pestañas que se construye la primera vez que se abren
+# (cargar_pestana): la página inicial no lleva sus componentes ni dispara sus
+# callbacks, y el mapa no se construye para quien no visita la pestaña
+def contenido_visualizaciones(datos):
+    return [
+        # Filtro por departamento de las tarjetas, el histograma y el box plot
+        html.Div([
+            dcc.Dropdown(
+                id='filtro-estadisticas',
+                placeholder='Todos los departamentos',
+                clearable=True
+            ),
+        ], style={'width': '40%', 'margin': '20px auto 0'}),
+
+        # Tarjetas de estadísticas (las llena actualizar_resumen)
+        html.Div([
+            html.Div([
+                html.H4('Total Estudiantes'),
+                html.H2(id='total-estudiantes'),
+            ], className='stat-card'),
+            html.Div([
+                html.H4('Instituciones'),
+                html.H2(id='total-instituciones'),
+            ], className='stat-card'),
+            html.Div([
+                html.H4('Departamentos'),
+                html.H2(id='total-departamentos'),
+            ], className='stat-card'),
+            html.Div([
+                html.H4('Promedio Estudiantes'),
+                html.H2(id='promedio-estudiantes'),
+            ], className='stat-card'),
+        ], style={'display': 'flex', 'justifyContent': 'space-around', 'margin': '20px 0'}),
+
+        # Gráfica 1: Distribución de estudiantes por nivel
+        html.Div([
+            html.H3('Distribución de Estudiantes por Nivel Educativo'),
+            dcc.Graph(id='grafica-nivel')
+        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
+
+        # Gráfica 2: Top 10 departamentos por número de estudiantes
+        html.Div([
+            html.H3('Top 10 Departamentos por Número de Estudiantes'),
+            dcc.Graph(id='grafica-departamentos')
+        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
+
+        # Gráfica 3: Top 10 instituciones por número de estudiantes
+        html.Div([
+            html.H3('Top 10 Instituciones por Número de Estudiantes'),
+            dcc.Graph(id='grafica-instituciones')
+        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
+
+        # Gráfica 4: Distribución de estudiantes (histograma)
+        html.Div([
+            html.H3('Distribución del Número de Estudiantes por Institución'),
+            dcc.Graph(id='grafica-distribucion')
+        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
+
+        # Gráfica 5: Box plot de estudiantes por nivel
+        html.Div([
+            html.H3('Distribución de Estudiantes por Nivel (Box Plot)'),
+            dcc.Graph(id='grafica-boxplot')
+        ], style={'width': '100%', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
+
+        # Selector para filtrar por Departamento
+        html.Div([
+            html.H3('Análisis por Departamento'),
+            dcc.Dropdown(
+                id='dropdown-departamento',
+                value=datos['df']['Departamento'].iloc[0],
+                clearable=False
+            ),
+            dcc.Graph(id='grafica-filtrada')
+        ], style={'width': '100%', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
+
+        # Pie de página interno tab visualizaciones
+        html.Div([
+            html.P('Análisis de datos de Educación Superior - Desarrollado con Dash y Plotly')
+        ], style={'textAlign': 'center', 'padding': '20px', 'backgroundColor': '#f2f2f2', 'marginTop': '20px'})
+    ]
+
+def contenido_georreferenciacion(datos):
+    periodos = datos['cubos_periodo'].periodos
+    return [
+        html.Div([
+            html.H2('Georreferenciación: Distribución Espacial de Instituciones de Educación Superior', 
+                   style={'textAlign': 'center', 'marginTop': '20px', 'color': '#2c3e50'}),
+
+            # Estado del procesamiento geográfico
+            html.Div(id='estado-geoprocesamiento', style={'textAlign': 'center', 'marginTop': '10px', 'color': '#e74c3c'}),
+            # Marca el montaje de la pestaña para que el mapa se envíe completo
+            dcc.Store(id='mapa-montado'),
+
+            # Selector para variable a visualizar en el mapa
+            html.Div([
+                html.Label('Seleccione variable a visualizar:'),
+                dcc.RadioItems(
+                    id='variable-mapa',
+                    options=[
+                        {'label': 'Estudiantes por Departamento', 'value': 'Estudiantes'},
+                        {'label': 'Número de Instituciones', 'value': 'NumInstituciones'}
+                    ],
+                    value='Estudiantes',
+                    labelStyle={'display': 'block', 'margin': '10px 0'}
+                )
+            ], style={'width': '300px', 'margin': '20px auto', 'padding': '15px', 'backgroundColor': 'white', 'borderRadius': '5px', 'boxShadow': '0px 0px 5px #ddd'}),
+
+            # Selector del modo del mapa: por departamento o densidad en hexágonos
+            html.Div([
+                html.Label('Agregar la variable:'),
+                dcc.RadioItems(
+                    id='modo-mapa',
+                    options=[
+                        {'label': 'Por departamento', 'value': 'departamentos'},
+                        {'label': 'Densidad en hexágonos', 'value': 'densidad'}
+                    ],
+                    value='departamentos',
+                    labelStyle={'display': 'block', 'margin': '10px 0'}
+                )
+            ], style={'width': '300px', 'margin': '20px auto', 'padding': '15px', 'backgroundColor': 'white', 'borderRadius': '5px', 'boxShadow': '0px 0px 5px #ddd'}),
+
+            # Selector para mostrar/ocultar puntos de instituciones
+            html.Div([
+                html.Label('Visualización de instituciones:'),
+                dcc.Checklist(
+                    id='mostrar-instituciones',
+                    options=[
+                        {'label': 'Mostrar puntos de instituciones', 'value': 'mostrar'}
+                    ],
+                    value=['mostrar'],
+                    labelStyle={'display': 'block', 'margin': '10px 0'}
+                )
+            ], style={'width': '300px', 'margin': '20px auto', 'padding': '15px', 'backgroundColor': 'white', 'borderRadius': '5px', 'boxShadow': '0px 0px 5px #ddd'}),
+
+            # Periodo del mapa y animación por periodos (solo si el CSV tiene periodos)
+            html.Div([
+                html.Label('Periodo:'),
+                dcc.Slider(
+                    id='periodo-mapa',
+                    min=0,
+                    max=len(periodos),
+                    step=1,
+                    value=len(periodos),
+                    marks={**{i: periodo for i, periodo in enumerate(periodos)}, len(periodos): 'Todos'}
+                ),
+                dcc.Checklist(
+                    id='animar-mapa',
+                    options=[
+                        {'label': 'Animar por periodo', 'value': 'animar'}
+                    ],
+                    value=[],
+                    labelStyle={'display': 'block', 'margin': '10px 0'}
+                )
+            ], style={'display': 'block' if periodos else 'none', 'width': '600px', 'margin': '20px auto', 'padding': '15px', 'backgroundColor': 'white', 'borderRadius': '5px', 'boxShadow': '0px 0px 5px #ddd'}),
+
+            # Mapa coroplético
+            html.Div([
+                dcc.Graph(id='mapa-colombia', style={'height': '700px'})
+            ], style={'width': '100%', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '20px 0', 'backgroundColor': 'white', 'borderRadius': '5px'}),
+
+            # Información adicional sobre la georreferenciación
+            html.Div([
+                html.H3('Análisis Geoespacial', style={'color': '#3498db', 'marginTop': '20px'}),
+                html.P('La visualización geoespacial permite identificar patrones de distribución territorial de las instituciones '
+                       'educativas y detectar disparidades regionales en la oferta educativa de nivel superior. Este análisis '
+                       'revela áreas con alta concentración de instituciones (principalmente en centros urbanos) y regiones con '
+                       'baja cobertura que podrían requerir intervenciones específicas.'),
+                html.P('La georreferenciación de instituciones educativas facilita:'),
+                html.Ul([
+                    html.Li('Identificación de áreas de oportunidad para nuevas instituciones o programas'),
+                    html.Li('Análisis de la equidad territorial en el acceso a educación superior'),
+                    html.Li('Evaluación de la distancia entre instituciones y centros poblados'),
+                    html.Li('Planificación de políticas educativas con enfoque regional')
+                ]),
+                html.P('Los datos visualizados en este mapa han sido integrados a partir del archivo shapefile de Colombia '
+                       'ubicado en /Users/elianafuentes/Documents/Docker/COLOMBIA/COLOMBIA.shp y la base de datos de educación superior.')
+            ], style={'padding': '20px', 'backgroundColor': 'white', 'boxShadow': '0px 0px 10px #ddd', 'margin': '20px', 'borderRadius': '5px'})
+        ], style={'padding': '20px'})
+    ]
+
+CONTENIDO_PESTANAS = {
+    'visualizaciones': contenido_visualizaciones,
+    'georreferenciacion': contenido_georreferenciacion,
+}
+
+# Contenido ya construido por (pestaña, versión de datos)
+cache_pestanas = {}
+
+def contenido_pestana(datos, pestana):
+    clave = (pestana, datos['version'])
+    contenido = cache_pestanas.get(clave)
+    if contenido is None:
+        contenido = cache_pestanas[clave] = CONTENIDO_PESTANAS[pestana](datos)
+    return contenido
+
 # Diseño de la aplicación
-app.layout = html.Div([
+inicio_layout = desde_inicio()
+layout_base = html.Div([
     # Título principal
     html.Div([
         html.H1('Análisis de Educación Superior en Colombia'),
         html.P('Exploración de datos sobre instituciones educativas de nivel superior. Eliana Fuentes')
     ], style={'textAlign': 'center', 'padding': '20px', 'backgroundColor': '#f2f2f2'}),
-    
+
     # Tabs para navegar entre contexto, visualizaciones, georreferenciación y conclusiones
-    dcc.Tabs([
-        # Tab de Contextualización
-        dcc.Tab(label='Contextualización', children=[
+    dcc.Tabs(id='pestanas', value='contextualizacion', children=[
+        # Tab de Contextualización (se envía con la página: es la pestaña inicial)
+        dcc.Tab(label='Contextualización', value='contextualizacion', children=[
             html.Div([
                 html.H2('Contextualización: Análisis de la Educación Superior en Colombia', 
                        style={'textAlign': 'center', 'marginTop': '20px', 'color': '#2c3e50'}),
@@ -264,186 +849,11 @@ app.layout = html.Div([
             ], style={'padding': '20px', 'backgroundColor': 'white', 'boxShadow': '0px 0px 10px #ddd', 'margin': '20px', 'borderRadius': '5px'})
         ]),
         
-        # Tab de Visualizaciones
-        dcc.Tab(label='Visualizaciones', children=[
-    
-            # Tarjetas de estadísticas
-            html.Div([
-                html.Div([
-                    html.H4('Total Estudiantes'),
-                    html.H2(f"{total_estudiantes:,}"),
-                ], className='stat-card'),
-                html.Div([
-                    html.H4('Instituciones'),
-                    html.H2(f"{total_instituciones}"),
-                ], className='stat-card'),
-                html.Div([
-                    html.H4('Departamentos'),
-                    html.H2(f"{total_departamentos}"),
-                ], className='stat-card'),
-                html.Div([
-                    html.H4('Promedio Estudiantes'),
-                    html.H2(f"{promedio_estudiantes:.0f}"),
-                ], className='stat-card'),
-            ], style={'display': 'flex', 'justifyContent': 'space-around', 'margin': '20px 0'}),
-            
-            # Gráfica 1: Distribución de estudiantes por nivel
-            html.Div([
-                html.H3('Distribución de Estudiantes por Nivel Educativo'),
-                dcc.Graph(
-                    id='grafica-nivel',
-                    figure=px.pie(
-                        estudiantes_por_nivel, 
-                        values='Estudiantes', 
-                        names='Nivel',
-                        title='Distribución de Estudiantes por Nivel Educativo',
-                        color_discrete_sequence=px.colors.qualitative.Pastel,
-                        hole=0.3
-                    )
-                )
-            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
-            
-            # Gráfica 2: Top 10 departamentos por número de estudiantes
-            html.Div([
-                html.H3('Top 10 Departamentos por Número de Estudiantes'),
-                dcc.Graph(
-                    id='grafica-departamentos',
-                    figure=px.bar(
-                        estudiantes_por_departamento, 
-                        x='Departamento', 
-                        y='Estudiantes',
-                        title='Top 10 Departamentos por Número de Estudiantes',
-                        color='Estudiantes',
-                        color_continuous_scale=px.colors.sequential.Blues
-                    )
-                )
-            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
-            
-            # Gráfica 3: Top 10 instituciones por número de estudiantes
-            html.Div([
-                html.H3('Top 10 Instituciones por Número de Estudiantes'),
-                dcc.Graph(
-                    id='grafica-instituciones',
-                    figure=px.bar(
-                        estudiantes_por_institucion, 
-                        x='Estudiantes', 
-                        y='Institución',
-                        title='Top 10 Instituciones por Número de Estudiantes',
-                        orientation='h',
-                        color='Estudiantes',
-                        color_continuous_scale=px.colors.sequential.Greens
-                    ).update_layout(yaxis={'categoryorder':'total ascending'})
-                )
-            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
-            
-            # Gráfica 4: Distribución de estudiantes (histograma)
-            html.Div([
-                html.H3('Distribución del Número de Estudiantes por Institución'),
-                dcc.Graph(
-                    id='grafica-distribucion',
-                    figure=px.histogram(
-                        df, 
-                        x='Estudiantes',
-                        nbins=30,
-                        title='Distribución del Número de Estudiantes por Institución',
-                        color_discrete_sequence=['#636EFA']
-                    ).update_layout(bargap=0.1)
-                )
-            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
-            
-            # Gráfica 5: Box plot de estudiantes por nivel
-            html.Div([
-                html.H3('Distribución de Estudiantes por Nivel (Box Plot)'),
-                dcc.Graph(
-                    id='grafica-boxplot',
-                    figure=px.box(
-                        df, 
-                        x='Nivel', 
-                        y='Estudiantes',
-                        title='Distribución de Estudiantes por Nivel (Box Plot)',
-                        color='Nivel'
-                    )
-                )
-            ], style={'width': '100%', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
-            
-            # Selector para filtrar por Departamento
-            html.Div([
-                html.H3('Análisis por Departamento'),
-                dcc.Dropdown(
-                    id='dropdown-departamento',
-                    options=[{'label': dep, 'value': dep} for dep in sorted(df['Departamento'].unique())],
-                    value=df['Departamento'].iloc[0],
-                    clearable=False
-                ),
-                dcc.Graph(id='grafica-filtrada')
-            ], style={'width': '100%', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '10px'}),
-            
-            # Pie de página interno tab visualizaciones
-            html.Div([
-                html.P('Análisis de datos de Educación Superior - Desarrollado con Dash y Plotly')
-            ], style={'textAlign': 'center', 'padding': '20px', 'backgroundColor': '#f2f2f2', 'marginTop': '20px'})
-        ]),
+        # Tab de Visualizaciones (contenido diferido)
+        dcc.Tab(label='Visualizaciones', value='visualizaciones', children=html.Div(id='pestana-visualizaciones')),
         
-        # Tab de Georreferenciación (NUEVO)
-        dcc.Tab(label='Georreferenciación', children=[
-            html.Div([
-                html.H2('Georreferenciación: Distribución Espacial de Instituciones de Educación Superior', 
-                       style={'textAlign': 'center', 'marginTop': '20px', 'color': '#2c3e50'}),
-                
-                # Estado del procesamiento geográfico
-                html.Div(id='estado-geoprocesamiento', style={'textAlign': 'center', 'marginTop': '10px', 'color': '#e74c3c'}),
-                
-                # Selector para variable a visualizar en el mapa
-                html.Div([
-                    html.Label('Seleccione variable a visualizar:'),
-                    dcc.RadioItems(
-                        id='variable-mapa',
-                        options=[
-                            {'label': 'Estudiantes por Departamento', 'value': 'Estudiantes'},
-                            {'label': 'Número de Instituciones', 'value': 'NumInstituciones'}
-                        ],
-                        value='Estudiantes',
-                        labelStyle={'display': 'block', 'margin': '10px 0'}
-                    )
-                ], style={'width': '300px', 'margin': '20px auto', 'padding': '15px', 'backgroundColor': 'white', 'borderRadius': '5px', 'boxShadow': '0px 0px 5px #ddd'}),
-                
-                # Selector para mostrar/ocultar puntos de instituciones
-                html.Div([
-                    html.Label('Visualización de instituciones:'),
-                    dcc.Checklist(
-                        id='mostrar-instituciones',
-                        options=[
-                            {'label': 'Mostrar puntos de instituciones', 'value': 'mostrar'}
-                        ],
-                        value=['mostrar'],
-                        labelStyle={'display': 'block', 'margin': '10px 0'}
-                    )
-                ], style={'width': '300px', 'margin': '20px auto', 'padding': '15px', 'backgroundColor': 'white', 'borderRadius': '5px', 'boxShadow': '0px 0px 5px #ddd'}),
-                
-                # Mapa coroplético
-                html.Div([
-                    dcc.Graph(id='mapa-colombia', style={'height': '700px'})
-                ], style={'width': '100%', 'padding': '10px', 'boxShadow': '0px 0px 10px #ccc', 'margin': '20px 0', 'backgroundColor': 'white', 'borderRadius': '5px'}),
-                
-                # Información adicional sobre la georreferenciación
-                html.Div([
-                    html.H3('Análisis Geoespacial', style={'color': '#3498db', 'marginTop': '20px'}),
-                    html.P('La visualización geoespacial permite identificar patrones de distribución territorial de las instituciones '
-                           'educativas y detectar disparidades regionales en la oferta educativa de nivel superior. Este análisis '
-                           'revela áreas con alta concentración de instituciones (principalmente en centros urbanos) y regiones con '
-                           'baja cobertura que podrían requerir intervenciones específicas.'),
-                    html.P('La georreferenciación de instituciones educativas facilita:'),
-                    html.Ul([
-                        html.Li('Identificación de áreas de oportunidad para nuevas instituciones o programas'),
-                        html.Li('Análisis de la equidad territorial en el acceso a educación superior'),
-                        html.Li('Evaluación de la distancia entre instituciones y centros poblados'),
-                        html.Li('Planificación de políticas educativas con enfoque regional')
-                    ]),
-                    html.P('Los datos visualizados en este mapa han sido integrados a partir del archivo shapefile de Colombia '
-                           'ubicado en /Users/elianafuentes/Documents/Docker/COLOMBIA/COLOMBIA.shp y la base de datos de educación superior.')
-                ], style={'padding': '20px', 'backgroundColor': 'white', 'boxShadow': '0px 0px 10px #ddd', 'margin': '20px', 'borderRadius': '5px'})
-            ], style={'padding': '20px'})
-        ])
+        # Tab de Georreferenciación (contenido diferido)
+        dcc.Tab(label='Georreferenciación', value='georreferenciacion', children=html.Div(id='pestana-georreferenciacion'))
     ], style={'marginBottom': '20px'}),
     
     # Pie de página general
@@ -451,16 +861,102 @@ app.layout = html.Div([
         html.P('© 2025 Análisis de Educación Superior en Colombia')
     ], style={'textAlign': 'center', 'padding': '20px', 'backgroundColor': '#f2f2f2', 'marginTop': '20px'})
 ], style={'maxWidth': '1200px', 'margin': '0 auto', 'fontFamily': 'Arial, sans-serif'})
+registrar_fase('Layout', desde_inicio() - inicio_layout)
+
+# Almacenes e intervalos con el estado de una página. Se crean en cada llamada:
+# layout_base se comparte entre los hilos y no se modifica.
+def componentes_estado(terminado, datos):
+    return [
+        # Versión de los datos que muestra la página y consulta periódica de versiones nuevas
+        dcc.Store(id='version-datos', data=datos['version'] if datos else None),
+        # Agregados compactos para los callbacks del navegador (modo CALLBACKS_CLIENTE)
+        dcc.Store(id='agregados-cliente'),
+        dcc.Interval(id='intervalo-datos', interval=CONSULTA_VERSION_MS, disabled=not RECARGA_ACTIVA),
+
+        # Consulta periódica del estado mientras los datos geográficos se cargan
+        dcc.Interval(id='intervalo-geo', interval=1000, disabled=terminado),
+        dcc.Store(id='geo-listo', data=terminado),
+        # Nivel de simplificación de los polígonos según el zoom actual
+        dcc.Store(id='nivel-mapa', data=nivel_para_zoom(datos, ZOOM_INICIAL) if datos else None),
+        # Pestañas cuyo contenido ya se construyó en esta página
+        dcc.Store(id='pestanas-abiertas', data=[]),
+    ]
+
+# El layout se sirve con el estado geográfico y la versión de datos del momento:
+# una página abierta después de la carga no consulta el estado ni vuelve a pedir el mapa
+def servir_layout():
+    # El estado se lee antes que la instantánea: si ya está 'listo', la instantánea lo refleja
+    terminado = estado_geografico != 'cargando'
+    datos = instantanea
+    # Los componentes de estado van después del título, en un Div nuevo por llamada
+    titulo, *resto = layout_base.children
+    return html.Div([titulo, *componentes_estado(terminado, datos), *resto], style=layout_base.style)
+
+app.layout = servir_layout
 
 # Callbacks
-# Callback para actualizar la gráfica filtrada
+# Callback para construir el contenido de una pestaña la primera vez que se abre.
+# Dash conserva los hijos de las pestañas ya abiertas, así que las siguientes
+# visitas no piden nada; el contenido se memoriza por versión de datos. Las
+# pestañas abiertas se llevan en un Store: usar los hijos como State subiría al
+# servidor todas las figuras de la pestaña en cada cambio.
 @app.callback(
-    Output('grafica-filtrada', 'figure'),
-    [Input('dropdown-departamento', 'value')]
+    [Output(f'pestana-{pestana}', 'children') for pestana in CONTENIDO_PESTANAS] +
+    [Output('pestanas-abiertas', 'data')],
+    [Input('pestanas', 'value')],
+    [State('pestanas-abiertas', 'data')]
 )
-def actualizar_grafica(departamento_seleccionado):
-    datos_filtrados = df[df['Departamento'] == departamento_seleccionado]
-    datos_agrupados = datos_filtrados.groupby('Nivel')['Estudiantes'].sum().reset_index()
+def cargar_pestana(pestana_activa, abiertas):
+    abiertas = abiertas or []
+    if pestana_activa not in CONTENIDO_PESTANAS or pestana_activa in abiertas:
+        raise PreventUpdate
+    return [
+        contenido_pestana(instantanea, pestana) if pestana == pestana_activa else dash.no_update
+        for pestana in CONTENIDO_PESTANAS
+    ] + [abiertas + [pestana_activa]]
+
+# Callback para las gráficas estáticas: se ejecuta al cargar la página y cada
+# vez que el navegador recibe una versión de datos nueva
+@app.callback(
+    [Output(id_grafica, 'figure') for id_grafica in GRAFICAS_ESTATICAS] +
+    [Output('dropdown-departamento', 'options'),
+     Output('filtro-estadisticas', 'options')],
+    [Input('version-datos', 'data')]
+)
+def actualizar_estadisticas(version):
+    graficas = instantanea['graficas']
+    return ([graficas['figuras'][id_grafica] for id_grafica in GRAFICAS_ESTATICAS] +
+            [graficas['opciones_departamento']] * 2)
+
+# Callback para las tarjetas, el histograma y el box plot del departamento
+# filtrado (todos si el filtro está vacío)
+@app.callback(
+    [Output(id_tarjeta, 'children') for id_tarjeta in TARJETAS] +
+    [Output(id_grafica, 'figure') for id_grafica in GRAFICAS_RESUMEN],
+    [Input('filtro-estadisticas', 'value'),
+     Input('version-datos', 'data')]
+)
+def actualizar_resumen(departamento, version):
+    datos = instantanea
+    graficas = graficas_resumen(datos, departamento or None)
+    return tarjetas_estadisticas(datos, departamento or None) + [graficas[id_grafica] for id_grafica in GRAFICAS_RESUMEN]
+
+# Callback para detectar una versión de datos nueva (solo con la recarga activada)
+@app.callback(
+    Output('version-datos', 'data'),
+    [Input('intervalo-datos', 'n_intervals')],
+    [State('version-datos', 'data')],
+    prevent_initial_call=True
+)
+def comprobar_version(n_intervals, version):
+    actual = instantanea['version']
+    if actual == version:
+        raise PreventUpdate
+    return actual
+
+# Callback para actualizar la gráfica filtrada
+def actualizar_grafica(departamento_seleccionado, version):
+    datos_agrupados = instantanea['cubo'].consultar(['Nivel'], Departamento=departamento_seleccionado)
     
     fig = px.bar(
         datos_agrupados, 
@@ -472,26 +968,323 @@ def actualizar_grafica(departamento_seleccionado):
     
     return fig
 
-# Callback para mostrar estado del procesamiento geográfico
+# Agregados para los callbacks del navegador: estudiantes por departamento y
+# nivel, valores y escalas del mapa y la plantilla de plotly de las figuras
+def agregados_cliente(datos):
+    cubo = datos['cubo']
+    niveles = cubo.valores('Nivel')
+    tabla = cubo.rollup(['Departamento', 'Nivel'])['Estudiantes'].unstack('Nivel').reindex(columns=niveles)
+    plantilla = pio.templates[pio.templates.default].to_plotly_json()
+    agregados = {
+        'niveles': niveles,
+        'departamentos': {
+            departamento: [None if pd.isna(valor) else int(valor) for valor in fila]
+            for departamento, fila in zip(tabla.index, tabla.to_numpy())
+        },
+        'colores': plantilla['layout']['colorway'],
+        'plantilla': plantilla,
+        'mapa': None,
+    }
+    if datos['geo_data'] is not None:
+        estilos = {}
+        for variable in ('Estudiantes', 'NumInstituciones'):
+            escala, titulo = estilo_mapa(variable)
+            estilos[variable] = {'escala': get_colorscale(escala), 'titulo': titulo,
+                                 'titulo_densidad': titulo_mapa(variable, densidad=True)}
+        periodos = datos['cubos_periodo'].periodos
+        agregados['mapa'] = {
+            'valores': datos['datos_mapa']['valores'],
+            'estilos': estilos,
+            # Valores de cada periodo, en el orden del slider y de los cuadros de la animación
+            'periodos': [valores_mapa(datos, periodo) for periodo in periodos],
+            'nombres_periodos': periodos,
+        }
+    return agregados
+
+if CALLBACKS_CLIENTE:
+    # Se reenvían solo cuando cambia la versión de los datos o terminan de cargarse los geográficos
+    @app.callback(
+        Output('agregados-cliente', 'data'),
+        [Input('version-datos', 'data'),
+         Input('geo-listo', 'data')]
+    )
+    def actualizar_agregados_cliente(version, listo):
+        return agregados_cliente(instantanea)
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='cliente', function_name='grafica_filtrada'),
+        Output('grafica-filtrada', 'figure'),
+        [Input('dropdown-departamento', 'value'),
+         Input('agregados-cliente', 'data')]
+    )
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='cliente', function_name='actualizar_mapa'),
+        Output('mapa-colombia', 'figure', allow_duplicate=True),
+        [Input('variable-mapa', 'value'),
+         Input('mostrar-instituciones', 'value'),
+         Input('periodo-mapa', 'value')],
+        [State('modo-mapa', 'value'),
+         State('mapa-colombia', 'figure'),
+         State('agregados-cliente', 'data')],
+        prevent_initial_call=True
+    )
+else:
+    app.callback(
+        Output('grafica-filtrada', 'figure'),
+        [Input('dropdown-departamento', 'value'),
+         Input('version-datos', 'data')]
+    )(actualizar_grafica)
+
+# Callback para el estado del procesamiento geográfico. Mientras la carga en
+# segundo plano no termina, el intervalo lo consulta; al terminar se desactiva y
+# 'geo-listo' avisa al mapa para que se construya con los datos. Sus salidas
+# están fuera de las pestañas para que funcione aunque el mapa no se haya abierto.
+@app.callback(
+    [Output('geo-listo', 'data'),
+     Output('intervalo-geo', 'disabled'),
+     Output('nivel-mapa', 'data', allow_duplicate=True)],
+    [Input('intervalo-geo', 'n_intervals')],
+    [State('geo-listo', 'data')],
+    prevent_initial_call='initial_duplicate'
+)
+def actualizar_estado(n_intervals, listo):
+    if estado_geografico == 'cargando':
+        return dash.no_update, False, dash.no_update
+
+    # Avisar al mapa solo una vez, cuando la carga termina con la página abierta
+    if listo:
+        return dash.no_update, True, dash.no_update
+    return True, True, nivel_para_zoom(instantanea, ZOOM_INICIAL)
+
+# Callback para el mensaje de estado de la pestaña del mapa
 @app.callback(
     Output('estado-geoprocesamiento', 'children'),
-    [Input('variable-mapa', 'value')]
+    [Input('intervalo-geo', 'n_intervals'),
+     Input('geo-listo', 'data')]
 )
-def actualizar_estado(variable):
-    if geo_data is None:
+def mensaje_estado(n_intervals, listo):
+    if estado_geografico == 'cargando':
+        return html.Div([
+            html.H4('Cargando datos geográficos...', style={'color': '#7f8c8d'}),
+            html.P(f'El mapa se mostrará en cuanto termine el procesamiento ({desde_inicio():.0f} s desde el arranque).',
+                   style={'color': '#7f8c8d', 'textAlign': 'center'})
+        ])
+    if instantanea['geo_data'] is None:
         return html.Div([
             html.H4('Error al procesar datos geográficos', style={'color': '#e74c3c'}),
             html.P('No se pudo procesar el archivo shapefile. Verifique la ruta: /Users/elianafuentes/Documents/Docker/COLOMBIA/COLOMBIA.shp')
         ])
     return ''
 
-# Callback para actualizar el mapa
+# Callback para cambiar el nivel de simplificación solo al cruzar un umbral de zoom
+@app.callback(
+    Output('nivel-mapa', 'data'),
+    [Input('mapa-colombia', 'relayoutData')],
+    [State('nivel-mapa', 'data')]
+)
+def actualizar_nivel_mapa(relayout, nivel_actual):
+    if not relayout or 'mapbox.zoom' not in relayout:
+        raise PreventUpdate
+    nivel = nivel_para_zoom(instantanea, relayout['mapbox.zoom'])
+    if nivel == nivel_actual:
+        raise PreventUpdate
+    return nivel
+
+# Callback para pedir lo que depende de la vista actual del mapa: los grupos o los
+# puntos de instituciones y, en modo densidad, los hexágonos con la resolución
+# que corresponde al zoom. Es un solo callback porque Dash identifica las salidas
+# duplicadas por sus entradas, y ambos dependen solo de relayoutData.
+@app.callback(
+    Output('mapa-colombia', 'figure', allow_duplicate=True),
+    [Input('mapa-colombia', 'relayoutData')],
+    [State('mostrar-instituciones', 'value'),
+     State('variable-mapa', 'value'),
+     State('modo-mapa', 'value'),
+     State('geo-listo', 'data')],
+    prevent_initial_call=True
+)
+def actualizar_vista(relayout, mostrar_instituciones, variable, modo, listo):
+    datos = instantanea
+    if datos['geo_data'] is None or not listo or not relayout or 'mapbox.zoom' not in relayout:
+        raise PreventUpdate
+    zoom, limites = relayout['mapbox.zoom'], limites_vista(relayout)
+    # Sin puntos ocultables la traza de puntos solo existe cuando está activada
+    puntos = datos['indice_puntos'] is not None and (PUNTOS_OCULTABLES or 'mostrar' in (mostrar_instituciones or []))
+    densidad = modo == 'densidad'
+    if not puntos and not densidad:
+        raise PreventUpdate
+
+    parche = Patch()
+    if puntos:
+        for propiedad, valor in traza_instituciones(datos, zoom, limites).items():
+            parche['data'][1][propiedad] = valor
+    if densidad:
+        for propiedad, valor in traza_densidad(datos, variable, zoom, limites).items():
+            parche['data'][0][propiedad] = valor
+    return parche
+
+# Callback para actualizar el mapa. En modo CALLBACKS_CLIENTE la variable, la
+# visibilidad de los puntos y el periodo se cambian en el navegador: aquí solo
+# son estado para construir la figura completa
 @app.callback(
     Output('mapa-colombia', 'figure'),
-    [Input('variable-mapa', 'value'),
-     Input('mostrar-instituciones', 'value')]
+    [(State if CALLBACKS_CLIENTE else Input)('variable-mapa', 'value'),
+     (State if CALLBACKS_CLIENTE else Input)('mostrar-instituciones', 'value'),
+     (State if CALLBACKS_CLIENTE else Input)('periodo-mapa', 'value'),
+     Input('animar-mapa', 'value'),
+     Input('modo-mapa', 'value'),
+     Input('nivel-mapa', 'data'),
+     Input('geo-listo', 'data'),
+     Input('version-datos', 'data'),
+     Input('mapa-montado', 'data')]
 )
-def actualizar_mapa(variable, mostrar_instituciones):
+def actualizar_mapa(variable, mostrar_instituciones, indice_periodo, animar, modo, nivel, listo, version, montado):
+    datos = instantanea
+    if datos['geo_data'] is None:
+        return construir_mapa(datos, variable, mostrar_instituciones)
+
+    mostrar = 'mostrar' in (mostrar_instituciones or [])
+    # La densidad no depende de los departamentos ni de los periodos
+    densidad = modo == 'densidad'
+    periodo = None if densidad else periodo_seleccionado(datos, indice_periodo)
+    animar = 'animar' in (animar or []) and bool(datos['cubos_periodo'].periodos) and not densidad
+    # El navegador todavía muestra la figura de carga, la de otra versión o la
+    # pestaña se acaba de abrir (todas sus entradas llegan como disparadores): enviar
+    # la figura completa. Cambiar de modo o activar o quitar la animación cambia
+    # las trazas o los cuadros de la figura.
+    disparadores = dash.callback_context.triggered_prop_ids.values()
+    if not listo or {'geo-listo', 'version-datos', 'mapa-montado', 'animar-mapa', 'modo-mapa'} & set(disparadores):
+        return figura_mapa(datos, variable, mostrar, nivel, periodo, animar, densidad)
+
+    disparador = dash.callback_context.triggered_id
+    # Al cambiar de nivel de zoom solo se reemplaza la geometría
+    if disparador == 'nivel-mapa':
+        if densidad:
+            raise PreventUpdate
+        parche = Patch()
+        parche['data'][0]['geojson'] = geojson_para_nivel(datos, nivel)
+        return parche
+    # Al cambiar de periodo solo se reemplazan los valores: la geometría no se reenvía
+    if disparador == 'periodo-mapa':
+        if densidad:
+            raise PreventUpdate
+        return parche_periodo(datos, variable, periodo)
+    # Tras la carga inicial, en modo estático solo se envían los cambios
+    if GEOJSON_ESTATICO and disparador is not None and not animar and not densidad:
+        return parche_mapa(datos, variable, mostrar, periodo)
+
+    return figura_mapa(datos, variable, mostrar, nivel, periodo, animar, densidad)
+
+# Figura completa del mapa, memoizada en la caché
+def figura_mapa(datos, variable, mostrar, nivel, periodo=None, animar=False, densidad=False):
+    clave = (datos['version'], PUNTOS_OCULTABLES, variable, mostrar, nivel, periodo, animar, densidad)
+    return figura_en_cache(
+        cache_mapa, clave,
+        lambda: construir_mapa(datos, variable, ['mostrar'] if mostrar else [], nivel, periodo, animar, densidad)
+    )
+
+# Construir de antemano las figuras de la vista inicial del mapa. Con preload en
+# gunicorn se ejecuta en el maestro y los workers heredan la caché ya llena.
+def precalentar(datos=None):
+    datos = datos or instantanea
+    if datos['geo_data'] is None:
+        return
+    nivel = nivel_para_zoom(datos, ZOOM_INICIAL)
+    for variable in ('Estudiantes', 'NumInstituciones'):
+        for mostrar in (True, False):
+            figura_mapa(datos, variable, mostrar, nivel)
+
+# Color y título del mapa según la variable seleccionada
+def estilo_mapa(variable):
+    if variable == 'Estudiantes':
+        return 'Blues', 'Estudiantes por Departamento'
+    # NumInstituciones
+    return 'Greens', 'Número de Instituciones por Departamento'
+
+# Título del mapa de una variable y un periodo
+def titulo_mapa(variable, periodo=None, densidad=False):
+    if densidad:
+        return 'Densidad de ' + ('Estudiantes' if variable == 'Estudiantes' else 'Instituciones') + ' en Colombia'
+    _, titulo = estilo_mapa(variable)
+    return f'Mapa de {titulo} en Colombia' + (f' ({periodo})' if periodo is not None else '')
+
+# Actualización parcial del mapa: valores, escala de color y visibilidad de los puntos
+def parche_mapa(datos, variable, mostrar, periodo=None):
+    color_scale, _ = estilo_mapa(variable)
+    parche = Patch()
+    parche['data'][0]['z'] = valores_mapa(datos, periodo).get(variable, [])
+    parche['data'][0]['colorscale'] = color_scale
+    parche['data'][0]['colorbar']['title']['text'] = variable
+    parche['data'][0]['hovertemplate'] = '<b>%{location}</b><br>' + f'{variable}: %{{z}}<extra></extra>'
+    parche['data'][1]['visible'] = mostrar
+    parche['layout']['title']['text'] = titulo_mapa(variable, periodo)
+    return parche
+
+# Cambio de periodo: solo los valores del coroplético y el título
+def parche_periodo(datos, variable, periodo):
+    parche = Patch()
+    parche['data'][0]['z'] = valores_mapa(datos, periodo).get(variable, [])
+    parche['layout']['title']['text'] = titulo_mapa(variable, periodo)
+    return parche
+
+# Cuadros de la animación por periodos, con controles de reproducción y un slider
+# propios de plotly. Cada cuadro lleva solo los valores de la traza coroplética:
+# la geometría está una sola vez en la figura y todos los cuadros la reutilizan.
+def animacion_periodos(datos, variable):
+    periodos = datos['cubos_periodo'].periodos
+    cuadros = [
+        {
+            'name': periodo,
+            'traces': [0],
+            'data': [{'type': 'choroplethmapbox', 'z': valores_mapa(datos, periodo).get(variable, [])}],
+            'layout': {'title': {'text': titulo_mapa(variable, periodo)}},
+        }
+        for periodo in periodos
+    ]
+    # Misma escala de color en todos los cuadros para que sean comparables
+    zmax = max((max(cuadro['data'][0]['z'], default=0) for cuadro in cuadros), default=0)
+    reproducir = {'frame': {'duration': 800, 'redraw': True}, 'transition': {'duration': 0}, 'fromcurrent': True}
+    controles = {
+        'updatemenus': [{
+            'type': 'buttons',
+            'showactive': False,
+            'x': 0.05, 'y': 0.05, 'xanchor': 'right', 'yanchor': 'top',
+            'buttons': [
+                {'label': '▶', 'method': 'animate', 'args': [None, reproducir]},
+                {'label': '❚❚', 'method': 'animate',
+                 'args': [[None], {'frame': {'duration': 0, 'redraw': False}, 'mode': 'immediate'}]},
+            ],
+        }],
+        'sliders': [{
+            'x': 0.05, 'y': 0.05, 'len': 0.9, 'xanchor': 'left', 'yanchor': 'top',
+            'currentvalue': {'prefix': 'Periodo: '},
+            'steps': [
+                {'label': periodo, 'method': 'animate',
+                 'args': [[periodo], {**reproducir, 'mode': 'immediate'}]}
+                for periodo in periodos
+            ],
+        }],
+    }
+    return cuadros, zmax, controles
+
+# Construcción del mapa (solo se ejecuta cuando la figura no está en caché)
+def construir_mapa(datos, variable, mostrar_instituciones, nivel=None, periodo=None, animar=False, densidad=False):
+    geo_data = datos['geo_data']
+    if geo_data is None and estado_geografico == 'cargando':
+        # Mapa vacío mientras los datos se cargan en segundo plano (no se guarda en caché)
+        fig = go.Figure()
+        fig.add_annotation(
+            text="Cargando datos geográficos...",
+            xref="paper", yref="paper",
+            x=0.5, y=0.5, showarrow=False,
+            font=dict(size=20, color="#7f8c8d")
+        )
+        fig.update_layout(
+            height=500,
+            title="Cargando datos geográficos"
+        )
+        return fig
     if geo_data is None:
         # Devolver un mapa vacío con mensaje de error
         fig = go.Figure()
@@ -510,71 +1303,89 @@ def actualizar_mapa(variable, mostrar_instituciones):
     # Iniciar figura
     fig = go.Figure()
     
-    # Añadir capa de departamentos (coroplético)
-    geojson_data = geo_data['poligonos']
+    # Añadir capa de departamentos (coroplético); en modo estático el navegador
+    # descarga la geometría una sola vez desde URL_POLIGONOS
+    geojson_data = geojson_para_nivel(datos, nivel)
     
     # Determinar color y título en base a la variable seleccionada
-    if variable == 'Estudiantes':
-        color_scale = 'Blues'
-        titulo = 'Estudiantes por Departamento'
-    else:  # NumInstituciones
-        color_scale = 'Greens'
-        titulo = 'Número de Instituciones por Departamento'
-    
-    # Extraer valores de la propiedad para la escala de color
-    values = []
-    locations = []
-    
-    for feature in geojson_data['features']:
-        if variable in feature['properties'] and dept_col in feature['properties']:
-            values.append(feature['properties'][variable])
-            locations.append(feature['properties'][dept_col])
+    color_scale, _ = estilo_mapa(variable)
     
     # Añadir capa coroplética
-    fig.add_choroplethmapbox(
-        geojson=geojson_data,
-        locations=locations,
-        z=values,
-        featureidkey=f'properties.{dept_col}',
-        colorscale=color_scale,
-        marker_opacity=0.7,
-        marker_line_width=0.5,
-        colorbar=dict(
-            title=variable,
-            ticksuffix=' ',
-            len=0.7
-        ),
-        hovertemplate='<b>%{location}</b><br>' +
-                      f'{variable}: %{{z}}<extra></extra>'
-    )
+    if densidad:
+        # Hexágonos de densidad de la vista inicial en lugar de los departamentos
+        fig.add_choroplethmapbox(
+            colorscale=color_scale,
+            marker_opacity=0.7,
+            marker_line_width=0,
+            colorbar=dict(
+                title=variable,
+                ticksuffix=' ',
+                len=0.7
+            ),
+            **traza_densidad(datos, variable, ZOOM_INICIAL)
+        )
+    else:
+        fig.add_choroplethmapbox(
+            geojson=geojson_data,
+            locations=datos['datos_mapa']['ubicaciones'],
+            z=valores_mapa(datos, periodo).get(variable, []),
+            featureidkey=f"properties.{datos['dept_col']}",
+            colorscale=color_scale,
+            marker_opacity=0.7,
+            marker_line_width=0.5,
+            colorbar=dict(
+                title=variable,
+                ticksuffix=' ',
+                len=0.7
+            ),
+            hovertemplate='<b>%{location}</b><br>' +
+                          f'{variable}: %{{z}}<extra></extra>'
+        )
     
-    # Añadir puntos de instituciones si se selecciona
-    if 'mostrar' in mostrar_instituciones:
+    # Añadir puntos de instituciones si se selecciona (en modo estático o de callbacks
+    # en el navegador siempre se incluyen y se alternan con 'visible' sin reenviarlos)
+    if PUNTOS_POR_VISTA and ('mostrar' in mostrar_instituciones or PUNTOS_OCULTABLES):
+        # Grupos o muestra de instituciones para la vista inicial
+        fig.add_scattermapbox(
+            visible='mostrar' in mostrar_instituciones,
+            mode='markers',
+            hoverinfo='text',
+            **traza_instituciones(datos, ZOOM_INICIAL)
+        )
+    elif 'mostrar' in mostrar_instituciones or PUNTOS_OCULTABLES:
         # Añadir puntos de instituciones
+        df = datos['df']
         fig.add_scattermapbox(
-            lat=df['Latitud'],
-            lon=df['Longitud'],
+            visible='mostrar' in mostrar_instituciones,
+            # Coordenadas float32 redondeadas para no serializar ruido de precisión
+            lat=df['Latitud'].astype(float).round(5),
+            lon=df['Longitud'].astype(float).round(5),
             mode='markers',
             marker=dict(
                 size=8,
                 color='red',
                 opacity=0.7
             ),
-            text=df['Institución'],
+            text=df['Institución'].astype(str),
+            hovertext=df['Nivel'].astype(str),
+            customdata=df['Estudiantes'],
             hoverinfo='text',
+            # Una sola plantilla para todos los puntos en vez de una cadena por fila
             hovertemplate='<b>%{text}</b><br>' +
-                          'Estudiantes: ' + df['Estudiantes'].astype(str) + '<br>' +
-                          'Nivel: ' + df['Nivel'] + '<extra></extra>'
+                          'Estudiantes: %{customdata}<br>' +
+                          'Nivel: %{hovertext}<extra></extra>'
         )
     
     # Actualizar layout
     fig.update_layout(
         mapbox_style="carto-positron",
-        mapbox_zoom=5,
+        mapbox_zoom=ZOOM_INICIAL,
         mapbox_center={"lat": 4.5709, "lon": -74.2973},
         margin={"r": 0, "t": 50, "l": 0, "b": 0},
         height=700,
-        title=f'Mapa de {titulo} en Colombia',
+        title=titulo_mapa(variable, periodo, densidad),
+        # Conservar el zoom y el centro del usuario entre actualizaciones
+        uirevision='mapa',
         legend=dict(
             yanchor="top",
             y=0.99,
@@ -582,6 +1393,13 @@ def actualizar_mapa(variable, mostrar_instituciones):
             x=0.01
         )
     )
+
+    # Animación por periodos sobre la misma figura
+    if animar:
+        cuadros, zmax, controles = animacion_periodos(datos, variable)
+        fig.data[0].update(zmin=0, zmax=zmax)
+        fig.update_layout(**controles)
+        fig.frames = cuadros
     
     return fig
 
@@ -671,6 +1489,191 @@ app.index_string = '''
 '''
 server = app.server 
 
+# Con la carga diferida, las rutas que leen la instantánea esperan a los datos
+# tabulares; el layout y la pestaña inicial no los necesitan
+RUTAS_CON_DATOS = (app.config.routes_pathname_prefix + '_dash-update-component', '/exportar', URL_POLIGONOS)
+
+@server.before_request
+def esperar_datos_tabulares():
+    if tabulares_listos.is_set() or not flask.request.path.startswith(RUTAS_CON_DATOS):
+        return None
+    if not tabulares_listos.wait(ESPERA_DATOS_S):
+        respuesta = flask.jsonify({'error': 'Los datos todavía se están cargando'})
+        respuesta.status_code = 503
+        respuesta.headers['Retry-After'] = '5'
+        return respuesta
+    return None
+
+# Geometría de los polígonos (modo GEOJSON_ESTATICO)
+@server.route(URL_POLIGONOS)
+def servir_poligonos():
+    nivel = flask.request.args.get('nivel', type=int)
+    recurso = instantanea['recursos_poligonos'].get(nivel)
+    if recurso is None:
+        flask.abort(404)
+    return recurso.respuesta(flask.request)
+
+# Exportaciones de agregados y figuras en un pool de hilos acotado (exportaciones.py)
+exportador = Exportador()
+
+# Tamaño en píxeles de las imágenes exportadas
+ANCHO_EXPORTACION = 1200
+ALTO_EXPORTACION = 700
+
+# Figura exportable por id con los mismos parámetros que los controles de la
+# página: (parámetros normalizados, función que construye la figura)
+def figura_exportable(datos, parametros):
+    id_figura = parametros.get('figura')
+    if id_figura in GRAFICAS_ESTATICAS:
+        return {'figura': id_figura}, lambda: datos['graficas']['figuras'][id_figura]
+
+    if id_figura in GRAFICAS_RESUMEN:
+        departamento = parametros.get('departamento') or None
+        if departamento is not None and departamento not in datos['cubo'].valores('Departamento'):
+            raise ParametrosInvalidos(f'Departamento desconocido: {departamento}')
+        return ({'figura': id_figura, 'departamento': departamento},
+                lambda: graficas_resumen(datos, departamento)[id_figura])
+
+    if id_figura == 'grafica-filtrada':
+        departamento = parametros.get('departamento')
+        if departamento not in datos['cubo'].valores('Departamento'):
+            raise ParametrosInvalidos(f'Departamento desconocido: {departamento}')
+        return {'figura': id_figura, 'departamento': departamento}, lambda: actualizar_grafica(departamento, None)
+
+    if id_figura == 'mapa-colombia':
+        if datos['geo_data'] is None:
+            raise ParametrosInvalidos('Los datos geográficos no están disponibles')
+        variable = parametros.get('variable', 'Estudiantes')
+        modo = parametros.get('modo', 'departamentos')
+        periodo = parametros.get('periodo') or None
+        mostrar = str(parametros.get('mostrar', '1')) == '1'
+        if variable not in ('Estudiantes', 'NumInstituciones') or modo not in ('departamentos', 'densidad'):
+            raise ParametrosInvalidos(f'Variable o modo desconocidos: {variable}, {modo}')
+        if periodo is not None and (modo == 'densidad' or periodo not in datos['cubos_periodo']):
+            raise ParametrosInvalidos(f'Periodo no disponible: {periodo}')
+
+        def construir():
+            fig = construir_mapa(datos, variable, ['mostrar'] if mostrar else [], None, periodo, False,
+                                 modo == 'densidad')
+            # En modo estático la figura apunta a la URL de la geometría: la imagen la necesita embebida
+            if isinstance(fig.data[0].geojson, str):
+                fig.data[0].geojson = geometria_poligonos(datos['geo_data']['poligonos'], datos['dept_col'])
+            return fig
+        return {'figura': id_figura, 'variable': variable, 'modo': modo, 'periodo': periodo, 'mostrar': mostrar}, construir
+
+    raise ParametrosInvalidos(f'Figura desconocida: {id_figura}')
+
+# Validar una petición de exportación y preparar su tarea, que lee la instantánea
+# de ese momento aunque se publique otra mientras espera en la cola
+def preparar_exportacion(tipo, formato, parametros):
+    datos = instantanea
+    if tipo == 'agregados' and formato in ('csv', 'parquet'):
+        dimensiones = [d for d in str(parametros.get('dimensiones', 'Departamento')).split(',') if d]
+        if not dimensiones or set(dimensiones) - set(DIMENSIONES):
+            raise ParametrosInvalidos(f"Dimensiones válidas: {', '.join(DIMENSIONES)}")
+        filtros = {d: str(parametros[d]) for d in DIMENSIONES if d in parametros}
+        periodo = parametros.get('periodo') or None
+        if periodo is not None and periodo not in datos['cubos_periodo']:
+            raise ParametrosInvalidos(f'Periodo no disponible: {periodo}')
+
+        def tarea():
+            cubo = datos['cubos_periodo'][periodo] if periodo is not None else datos['cubo']
+            tabla = cubo.consultar(dimensiones, **filtros)
+            # consultar quita las dimensiones filtradas: las pedidas vuelven como columnas constantes
+            tabla = tabla.assign(**{d: filtros[d] for d in dimensiones if d in filtros})
+            return serializar_tabla(tabla[dimensiones + list(MEDIDAS)], formato)
+        return {'version': datos['version'], 'dimensiones': dimensiones, 'filtros': filtros, 'periodo': periodo}, tarea
+
+    if tipo == 'puntos' and formato == 'geojson':
+        if datos['geo_data'] is None:
+            raise ParametrosInvalidos('Datos geográficos no disponibles')
+        capa = datos['geo_data']['puntos']
+        filtros = {d: str(parametros[d]) for d in DIMENSIONES if d in parametros and d in capa.columnas}
+
+        # El GeoJSON se escribe desde las columnas de la capa de puntos
+        def tarea():
+            posiciones = capa.filtrar(**filtros) if filtros else None
+            return b''.join(capa.a_geojson(posiciones))
+        return {'version': datos['version'], 'filtros': filtros}, tarea
+
+    if tipo == 'figura' and formato in FORMATOS_IMAGEN:
+        normalizados, construir = figura_exportable(datos, parametros)
+        return {'version': datos['version'], **normalizados}, lambda: pio.to_image(
+            construir(), format=formato, width=ANCHO_EXPORTACION, height=ALTO_EXPORTACION
+        )
+
+    raise ParametrosInvalidos(f'Exportación desconocida: {tipo}.{formato}')
+
+# Métricas de la caché de figuras, del arranque y del estado de los datos
+def tasa_aciertos_cache():
+    estadisticas = cache_mapa.estadisticas()
+    consultas = estadisticas['aciertos'] + estadisticas['fallos']
+    return estadisticas['aciertos'] / consultas if consultas else None
+
+registro.indicador('cache_figuras_aciertos_total', 'Figuras del mapa servidas desde la caché',
+                   lambda: cache_mapa.estadisticas()['aciertos'], tipo='counter')
+registro.indicador('cache_figuras_fallos_total', 'Figuras del mapa construidas por no estar en caché',
+                   lambda: cache_mapa.estadisticas()['fallos'], tipo='counter')
+registro.indicador('cache_figuras_tasa_aciertos', 'Proporción de aciertos de la caché de figuras', tasa_aciertos_cache)
+registro.indicador('cache_figuras_entradas', 'Figuras guardadas en la caché', lambda: cache_mapa.estadisticas()['entradas'])
+registro.indicador('cache_figuras_bytes', 'Tamaño aproximado de la caché de figuras', lambda: cache_mapa.estadisticas()['bytes'])
+registro.indicador('cache_respuestas_aciertos_total', 'Respuestas de callbacks servidas ya codificadas',
+                   lambda: cache_respuestas.estadisticas()['aciertos'], tipo='counter')
+registro.indicador('cache_respuestas_fallos_total', 'Respuestas de callbacks ejecutadas y codificadas',
+                   lambda: cache_respuestas.estadisticas()['fallos'], tipo='counter')
+registro.indicador('cache_respuestas_bytes', 'Tamaño de las respuestas codificadas y comprimidas en caché',
+                   lambda: cache_respuestas.estadisticas()['bytes'] + cache_comprimidas.estadisticas()['bytes'])
+registro.indicador('exportaciones_total', 'Exportaciones por resultado (ok, error, rechazado, en_cache)',
+                   lambda: {(resultado,): n for resultado, n in exportador.trabajos.items()}, ['resultado'], tipo='counter')
+registro.indicador('exportaciones_pendientes', 'Exportaciones en cola o en curso en este proceso',
+                   lambda: exportador.pendientes)
+registro.indicador('arranque_fase_segundos', 'Duración de cada fase del arranque',
+                   lambda: {(fase,): segundos for fase, segundos in fases.items()}, ['fase'])
+registro.indicador('datos_geograficos_listos', '1 si los datos geográficos están cargados',
+                   lambda: int(instantanea is not None and instantanea['geo_data'] is not None))
+registro.indicador('datos_recargas_total', 'Recargas de datos por resultado (ok, error)',
+                   lambda: {(resultado,): n for resultado, n in recargador.recargas.items()}, ['resultado'], tipo='counter')
+registro.indicador('datos_recarga_en_curso', '1 mientras se construye una instantánea nueva',
+                   lambda: int(recargador.en_curso))
+registro.indicador('datos_ultima_recarga_segundos', 'Duración de la última recarga de datos',
+                   lambda: (recargador.ultima or {}).get('duracion_s'))
+
+# Métricas en formato de texto de Prometheus
+@server.route('/metrics')
+def metricas():
+    return flask.Response(registro.exposicion(), mimetype='text/plain; version=0.0.4')
+
+# Perfilado por muestreo con la cabecera X-Perfilar (si PERFILADOR=1)
+instalar_perfilador(server)
+
+# Recarga de los datos: vigilancia de archivos (RECARGA_VIGILAR) y /admin/recargar (TOKEN_RECARGA)
+instalar_recarga(server, recargador)
+
+# Exportación de agregados (CSV/Parquet) y figuras (PNG/SVG): /exportar/<tipo>.<formato>
+instalar_exportaciones(server, exportador, preparar_exportacion)
+
+# El layout se codifica y comprime una vez por versión de datos y estado de la
+# carga geográfica, con ETag: una visita repetida recibe 304
+instalar_recurso_versionado(
+    server, app.config.routes_pathname_prefix + '_dash-layout',
+    lambda: (estado_geografico != 'cargando', instantanea and instantanea['version']), servir_layout
+)
+
+# Callbacks cuya respuesta solo depende de la petición, de la versión de los datos
+# y del estado de la carga geográfica (el mapa de carga no cambia de versión)
+memorizar_respuestas(
+    app,
+    {'cargar_pestana', 'actualizar_estadisticas', 'actualizar_resumen', 'actualizar_grafica', 'actualizar_mapa',
+     'actualizar_agregados_cliente'},
+    lambda: (instantanea['version'], estado_geografico), cache_respuestas
+)
+if COMPRIMIR_RESPUESTAS:
+    comprimir_respuestas(server, {app.config.routes_pathname_prefix + '_dash-update-component'}, cache_comprimidas)
+
+if CARGA_DIFERIDA and not CARGA_EN_WORKERS:
+    iniciar_carga_diferida()
+print(resumen_fases())
+
 
 # Correr la aplicación
 if __name__ == '__main__':
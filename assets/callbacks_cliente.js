@@ -0,0 +1,106 @@
+// Callbacks que se ejecutan en el navegador (modo CALLBACKS_CLIENTE de app.py).
+// Usan los agregados por departamento que el servidor envía una sola vez al
+// Store 'agregados-cliente' y no hacen ninguna petición.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    cliente: {
+        // Cambiar la variable del mapa, la visibilidad de los puntos o el periodo
+        // sobre la figura que ya tiene el navegador (la geometría no se toca)
+        actualizar_mapa: function(variable, mostrar, periodo, modo, figura, agregados) {
+            if (!figura || !figura.data || figura.data.length < 2 || !agregados || !agregados.mapa) {
+                return window.dash_clientside.no_update;
+            }
+            const mapa = agregados.mapa;
+            const estilo = mapa.estilos[variable];
+            // Posición del slider fuera de los periodos = todos los periodos
+            const nombre = mapa.nombres_periodos[periodo];
+            const valores = nombre === undefined ? mapa.valores : mapa.periodos[periodo];
+            const densidad = modo === 'densidad';
+            const titulo = function(nombre) {
+                if (densidad) {
+                    return estilo.titulo_densidad;
+                }
+                return 'Mapa de ' + estilo.titulo + ' en Colombia' + (nombre === undefined ? '' : ' (' + nombre + ')');
+            };
+            // En modo densidad cada hexágono lleva [instituciones, estudiantes] en customdata
+            const z = densidad ? (figura.data[0].customdata || []).map(function(medidas) {
+                return medidas[variable === 'Estudiantes' ? 1 : 0];
+            }) : valores[variable];
+            const coropletico = Object.assign({}, figura.data[0], {
+                z: z,
+                colorscale: estilo.escala,
+                colorbar: Object.assign({}, figura.data[0].colorbar, {title: {text: variable}})
+            });
+            if (!densidad) {
+                coropletico.hovertemplate = '<b>%{location}</b><br>' + variable + ': %{z}<extra></extra>';
+            }
+            const puntos = Object.assign({}, figura.data[1], {
+                visible: (mostrar || []).indexOf('mostrar') >= 0
+            });
+            const layout = Object.assign({}, figura.layout, {
+                title: Object.assign({}, figura.layout.title, {text: titulo(nombre)})
+            });
+            const actualizada = Object.assign({}, figura, {
+                data: [coropletico, puntos].concat(figura.data.slice(2)),
+                layout: layout
+            });
+            // Con la animación activa, los cuadros (uno por periodo, en el mismo
+            // orden) pasan a la variable nueva con la escala de color común
+            if (!densidad && figura.frames && figura.frames.length) {
+                coropletico.zmax = Math.max.apply(null, mapa.periodos.map(function(valores_periodo) {
+                    return Math.max.apply(null, valores_periodo[variable].concat([0]));
+                }));
+                actualizada.frames = figura.frames.map(function(cuadro, i) {
+                    return Object.assign({}, cuadro, {
+                        data: [Object.assign({}, cuadro.data[0], {z: mapa.periodos[i][variable]})],
+                        layout: {title: {text: titulo(mapa.nombres_periodos[i])}}
+                    });
+                });
+            }
+            return actualizada;
+        },
+
+        // Estudiantes por nivel de un departamento, con la misma forma que px.bar(color='Nivel')
+        grafica_filtrada: function(departamento, agregados) {
+            if (!agregados) {
+                return window.dash_clientside.no_update;
+            }
+            const fila = agregados.departamentos[departamento] || [];
+            const data = [];
+            const categorias = [];
+            agregados.niveles.forEach(function(nivel, i) {
+                if (fila[i] === null || fila[i] === undefined) {
+                    return;
+                }
+                categorias.push(nivel);
+                data.push({
+                    type: 'bar',
+                    name: nivel,
+                    legendgroup: nivel,
+                    offsetgroup: nivel,
+                    alignmentgroup: 'True',
+                    orientation: 'v',
+                    showlegend: true,
+                    textposition: 'auto',
+                    x: [nivel],
+                    y: [fila[i]],
+                    xaxis: 'x',
+                    yaxis: 'y',
+                    marker: {color: agregados.colores[data.length % agregados.colores.length], pattern: {shape: ''}},
+                    hovertemplate: 'Nivel=%{x}<br>Estudiantes=%{y}<extra></extra>'
+                });
+            });
+            return {
+                data: data,
+                layout: {
+                    template: agregados.plantilla,
+                    title: {text: 'Estudiantes por Nivel Educativo en ' + departamento},
+                    xaxis: {anchor: 'y', domain: [0, 1], title: {text: 'Nivel'},
+                            categoryorder: 'array', categoryarray: categorias},
+                    yaxis: {anchor: 'x', domain: [0, 1], title: {text: 'Estudiantes'}},
+                    legend: {title: {text: 'Nivel'}, tracegroupgap: 0},
+                    barmode: 'relative'
+                }
+            };
+        }
+    }
+});
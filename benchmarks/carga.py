@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+# Generador de carga contra el endpoint _dash-update-component de Dash, con el
+# cliente de pruebas de Flask (en proceso) o por HTTP contra un servidor local
+# (p. ej. gunicorn). Las peticiones se arman a partir de /_dash-dependencies, así
+# que los ids de salida con sufijo (allow_duplicate) se resuelven solos.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DERIVADO_VISTA = {'coordinates': [[-76.5, 7.5], [-72.5, 7.5], [-72.5, 3.5], [-76.5, 3.5]]}
+
+
+# Escenarios: nombre, valores de entradas y estados {(id, propiedad): valor} y
+# propiedades que cambian (vacío = llamada inicial, figura completa)
+def escenarios(departamentos):
+    return [
+        ('grafica_filtrada', lambda: {
+            ('dropdown-departamento', 'value'): random.choice(departamentos),
+            ('version-datos', 'data'): None,
+        }, ['dropdown-departamento.value']),
+        ('resumen_departamento', lambda: {
+            ('filtro-estadisticas', 'value'): random.choice(departamentos + [None]),
+            ('version-datos', 'data'): None,
+        }, ['filtro-estadisticas.value']),
+        ('mapa_completo', lambda: {
+            ('variable-mapa', 'value'): random.choice(['Estudiantes', 'NumInstituciones']),
+            ('mostrar-instituciones', 'value'): random.choice([['mostrar'], []]),
+            ('nivel-mapa', 'data'): 0,
+            ('geo-listo', 'data'): True,
+            ('version-datos', 'data'): None,
+            ('mapa-montado', 'data'): None,
+            ('periodo-mapa', 'value'): None,
+            ('animar-mapa', 'value'): [],
+            ('modo-mapa', 'value'): 'departamentos',
+        }, []),
+        ('mapa_variable', lambda: {
+            ('variable-mapa', 'value'): random.choice(['Estudiantes', 'NumInstituciones']),
+            ('mostrar-instituciones', 'value'): ['mostrar'],
+            ('nivel-mapa', 'data'): 0,
+            ('geo-listo', 'data'): True,
+            ('version-datos', 'data'): None,
+            ('mapa-montado', 'data'): None,
+            ('periodo-mapa', 'value'): None,
+            ('animar-mapa', 'value'): [],
+            ('modo-mapa', 'value'): 'departamentos',
+        }, ['variable-mapa.value']),
+        # Sin periodos en el CSV cualquier posición del slider equivale a todos
+        ('mapa_periodo', lambda: {
+            ('variable-mapa', 'value'): 'Estudiantes',
+            ('mostrar-instituciones', 'value'): ['mostrar'],
+            ('periodo-mapa', 'value'): random.randrange(4),
+            ('animar-mapa', 'value'): [],
+            ('modo-mapa', 'value'): 'departamentos',
+            ('nivel-mapa', 'data'): 0,
+            ('geo-listo', 'data'): True,
+            ('version-datos', 'data'): None,
+            ('mapa-montado', 'data'): None,
+        }, ['periodo-mapa.value']),
+        ('nivel_zoom', lambda: {
+            ('mapa-colombia', 'relayoutData'): {'mapbox.zoom': random.uniform(4, 11)},
+            ('nivel-mapa', 'data'): 0,
+        }, ['mapa-colombia.relayoutData']),
+        ('instituciones_vista', lambda: {
+            ('mapa-colombia', 'relayoutData'): {'mapbox.zoom': random.uniform(5, 10), 'mapbox._derived': DERIVADO_VISTA},
+            ('mostrar-instituciones', 'value'): ['mostrar'],
+            ('variable-mapa', 'value'): 'Estudiantes',
+            ('modo-mapa', 'value'): 'departamentos',
+            ('geo-listo', 'data'): True,
+        }, ['mapa-colombia.relayoutData']),
+        ('densidad_completa', lambda: {
+            ('variable-mapa', 'value'): random.choice(['Estudiantes', 'NumInstituciones']),
+            ('mostrar-instituciones', 'value'): [],
+            ('periodo-mapa', 'value'): None,
+            ('animar-mapa', 'value'): [],
+            ('modo-mapa', 'value'): 'densidad',
+            ('nivel-mapa', 'data'): 0,
+            ('geo-listo', 'data'): True,
+            ('version-datos', 'data'): None,
+            ('mapa-montado', 'data'): None,
+        }, ['modo-mapa.value']),
+        ('densidad_vista', lambda: {
+            ('mapa-colombia', 'relayoutData'): {'mapbox.zoom': random.uniform(5, 12), 'mapbox._derived': DERIVADO_VISTA},
+            ('mostrar-instituciones', 'value'): [],
+            ('variable-mapa', 'value'): 'Estudiantes',
+            ('modo-mapa', 'value'): 'densidad',
+            ('geo-listo', 'data'): True,
+        }, ['mapa-colombia.relayoutData']),
+        ('abrir_pestana', lambda: {
+            ('pestanas', 'value'): random.choice(['visualizaciones', 'georreferenciacion']),
+            ('pestanas-abiertas', 'data'): [],
+        }, ['pestanas.value']),
+        # Solo con CALLBACKS_CLIENTE (envío único de los agregados al navegador)
+        ('agregados_cliente', lambda: {
+            ('version-datos', 'data'): None,
+            ('geo-listo', 'data'): True,
+        }, ['version-datos.data']),
+    ]
+
+
+def _salidas(salida):
+    if salida.startswith('..'):
+        partes = salida[2:-2].split('...')
+    else:
+        partes = [salida]
+    specs = []
+    for parte in partes:
+        componente, propiedad = parte.rsplit('.', 1)
+        specs.append({'id': componente, 'property': propiedad.split('@')[0]})
+    return specs if salida.startswith('..') else specs[0]
+
+
+# Cuerpo de la petición para la dependencia cuyas entradas y estados coinciden
+# exactamente con las claves de `valores`
+def armar_peticion(dependencias, valores, cambios):
+    claves = set(valores)
+    for dep in dependencias:
+        entradas = [(e['id'], e['property']) for e in dep['inputs']]
+        estados = [(e['id'], e['property']) for e in dep['state']]
+        if set(entradas) | set(estados) != claves:
+            continue
+        return {
+            'output': dep['output'],
+            'outputs': _salidas(dep['output']),
+            'inputs': [{'id': i, 'property': p, 'value': valores[(i, p)]} for i, p in entradas],
+            'state': [{'id': i, 'property': p, 'value': valores[(i, p)]} for i, p in estados],
+            'changedPropIds': cambios,
+        }
+    return None
+
+
+# Adaptadores: devuelven (get_json(ruta, cuerpo=None) -> JSON de la respuesta (POST si
+# hay cuerpo), post(ruta, cuerpo) -> (estado, bytes))
+def cliente_flask(server):
+    cliente = server.test_client()
+
+    def get_json(ruta, cuerpo=None):
+        if cuerpo is not None:
+            return json.loads(cliente.post(ruta, json=cuerpo).data)
+        return json.loads(cliente.get(ruta).data)
+
+    def post(ruta, cuerpo):
+        respuesta = cliente.post(ruta, json=cuerpo)
+        return respuesta.status_code, len(respuesta.data)
+    return get_json, post
+
+
+def cliente_http(url_base):
+    url_base = url_base.rstrip('/')
+
+    def get_json(ruta, cuerpo=None):
+        peticion = urllib.request.Request(url_base + ruta)
+        if cuerpo is not None:
+            peticion = urllib.request.Request(url_base + ruta, data=json.dumps(cuerpo).encode(),
+                                              headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(peticion) as r:
+            return json.loads(r.read())
+
+    def post(ruta, cuerpo):
+        peticion = urllib.request.Request(
+            url_base + ruta, data=json.dumps(cuerpo).encode(),
+            # Como un navegador: los bytes medidos son los que viajan por la red
+            headers={'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+        )
+        try:
+            with urllib.request.urlopen(peticion) as r:
+                return r.status, len(r.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+    return get_json, post
+
+
+# Departamentos del filtro: la pestaña de visualizaciones se monta después del
+# layout inicial, así que las opciones se leen de la respuesta del callback que
+# las llena (actualizar_estadisticas), no del layout
+def departamentos_disponibles(get_json, dependencias, id_componente='dropdown-departamento'):
+    salida = f'{id_componente}.options'
+    for dep in dependencias:
+        if salida not in dep['output'].strip('.').split('...'):
+            continue
+        valores = {(e['id'], e['property']): None for e in dep['inputs'] + dep['state']}
+        respuesta = get_json('/_dash-update-component', armar_peticion([dep], valores, []))
+        opciones = respuesta['response'][id_componente]['options']
+        return [o['value'] if isinstance(o, dict) else o for o in opciones]
+    return []
+
+
+def resumir(latencias, tamanos, errores, duracion):
+    latencias = np.asarray(latencias) * 1000
+    if not len(latencias):
+        return {'peticiones': 0, 'errores': errores}
+    return {
+        'peticiones': int(len(latencias)),
+        'errores': errores,
+        'por_segundo': round(len(latencias) / duracion, 1) if duracion else None,
+        'media_ms': round(float(latencias.mean()), 2),
+        'p50_ms': round(float(np.percentile(latencias, 50)), 2),
+        'p90_ms': round(float(np.percentile(latencias, 90)), 2),
+        'p99_ms': round(float(np.percentile(latencias, 99)), 2),
+        'max_ms': round(float(latencias.max()), 2),
+        'bytes_medios': int(np.mean(tamanos)),
+    }
+
+
+# Ejecutar `peticiones` llamadas por escenario con `concurrencia` hilos.
+# Las respuestas 204 (PreventUpdate) cuentan como válidas.
+def ejecutar_carga(get_json, post, peticiones=100, concurrencia=4, semilla=0):
+    random.seed(semilla)
+    dependencias = get_json('/_dash-dependencies')
+    departamentos = departamentos_disponibles(get_json, dependencias) or ['Antioquia']
+
+    resultados = {}
+    for nombre, valores, cambios in escenarios(departamentos):
+        cuerpos = [armar_peticion(dependencias, valores(), cambios) for _ in range(peticiones)]
+        if cuerpos[0] is None:
+            resultados[nombre] = {'omitido': 'callback no registrado'}
+            continue
+
+        def enviar(cuerpo):
+            t0 = time.perf_counter()
+            estado, tamano = post('/_dash-update-component', cuerpo)
+            return time.perf_counter() - t0, estado, tamano
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(concurrencia) as pool:
+            respuestas = list(pool.map(enviar, cuerpos))
+        duracion = time.perf_counter() - inicio
+
+        validas = [r for r in respuestas if r[1] in (200, 204)]
+        resultados[nombre] = resumir([r[0] for r in validas], [r[2] for r in validas],
+                                     len(respuestas) - len(validas), duracion)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Carga sobre los callbacks de Dash.')
+    parser.add_argument('--url', help='Servidor local (p. ej. http://127.0.0.1:8050); sin él se importa app.py')
+    parser.add_argument('--peticiones', type=int, default=100, help='Peticiones por escenario')
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--salida', help='Archivo JSON de resultados')
+    args = parser.parse_args(argv)
+
+    if args.url:
+        get_json, post = cliente_http(args.url)
+    else:
+        sys.path.insert(0, RAIZ)
+        import app
+        get_json, post = cliente_flask(app.server)
+
+    resultados = ejecutar_carga(get_json, post, args.peticiones, args.concurrencia)
+    texto = json.dumps(resultados, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w') as f:
+            f.write(texto)
+    print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import math
+import os
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# Generador de datos sintéticos con la forma de educacion_superior.csv y de un
+# shapefile de departamentos. Los polígonos son celdas de una rejilla sobre
+# Colombia y cada institución cae dentro de la celda de su departamento, así que
+# la unión por nombre y la asignación espacial dan el mismo resultado.
+
+# Extensión aproximada de Colombia (lon_min, lon_max, lat_min, lat_max)
+LIMITES_COLOMBIA = (-79.0, -67.0, -4.2, 12.5)
+
+DEPARTAMENTOS = [
+    'Amazonas', 'Antioquia', 'Arauca', 'Atlántico', 'Bogotá D.C.', 'Bolívar', 'Boyacá', 'Caldas',
+    'Caquetá', 'Casanare', 'Cauca', 'Cesar', 'Chocó', 'Córdoba', 'Cundinamarca', 'Guainía',
+    'Guaviare', 'Huila', 'La Guajira', 'Magdalena', 'Meta', 'Nariño', 'Norte de Santander',
+    'Putumayo', 'Quindío', 'Risaralda', 'San Andrés', 'Santander', 'Sucre', 'Tolima',
+    'Valle del Cauca', 'Vaupés', 'Vichada',
+]
+
+NIVELES = ['Técnico', 'Tecnológico', 'Profesional', 'Posgrado']
+
+
+# Nombres de `n` departamentos: los reales primero y numerados después
+def nombres_departamentos(n):
+    return [DEPARTAMENTOS[i] if i < len(DEPARTAMENTOS) else f'Departamento {i + 1}' for i in range(n)]
+
+
+# Nombre como aparece en los shapefiles oficiales: mayúsculas y sin tildes
+def nombre_shapefile(nombre):
+    return unicodedata.normalize('NFKD', nombre).encode('ascii', 'ignore').decode('ascii').upper()
+
+
+# Celdas de la rejilla (lon_min, lon_max, lat_min, lat_max) de cada departamento
+def celdas_departamentos(n):
+    lon_min, lon_max, lat_min, lat_max = LIMITES_COLOMBIA
+    columnas = math.ceil(math.sqrt(n * (lon_max - lon_min) / (lat_max - lat_min)))
+    filas = math.ceil(n / columnas)
+    ancho = (lon_max - lon_min) / columnas
+    alto = (lat_max - lat_min) / filas
+    indices = np.arange(n)
+    x0 = lon_min + (indices % columnas) * ancho
+    y0 = lat_min + (indices // columnas) * alto
+    return np.column_stack([x0, x0 + ancho, y0, y0 + alto])
+
+
+# Con `periodos` > 0 se añade la columna Año (los últimos `periodos` años hasta PRIMER_ANO + periodos - 1)
+PRIMER_ANO = 2015
+
+
+def generar_dataframe(filas, departamentos=len(DEPARTAMENTOS), semilla=0, periodos=0):
+    rng = np.random.default_rng(semilla)
+    nombres = np.array(nombres_departamentos(departamentos), dtype=object)
+    celdas = celdas_departamentos(departamentos)
+
+    # Pocos departamentos concentran la mayoría de registros (distribución de Zipf)
+    pesos = 1.0 / np.arange(1, departamentos + 1)
+    depto = rng.choice(departamentos, size=filas, p=pesos / pesos.sum())
+    celda = celdas[depto]
+    # Margen para que ningún punto quede justo en la frontera entre celdas
+    margen = 0.02 * (celda[:, 1] - celda[:, 0])
+    longitud = rng.uniform(celda[:, 0] + margen, celda[:, 1] - margen)
+    latitud = rng.uniform(celda[:, 2] + margen, celda[:, 3] - margen)
+
+    instituciones = max(10, filas // 50)
+    pesos_inst = 1.0 / np.arange(1, instituciones + 1) ** 0.8
+    institucion = rng.choice(instituciones, size=filas, p=pesos_inst / pesos_inst.sum())
+
+    df = pd.DataFrame({
+        'ID': np.arange(1, filas + 1),
+        'Departamento': nombres[depto],
+        'Latitud': np.round(latitud, 4),
+        'Longitud': np.round(longitud, 4),
+        'Nivel': np.array(NIVELES, dtype=object)[rng.integers(0, len(NIVELES), filas)],
+        'Estudiantes': np.clip(rng.lognormal(7.5, 1.0, filas), 10, 200000).astype(np.int64),
+        'Institución': np.char.add('Universidad ', institucion.astype(str)).astype(object),
+    })
+    if periodos:
+        df['Año'] = PRIMER_ANO + rng.integers(0, periodos, filas)
+    return df
+
+
+def generar_csv(ruta, filas, departamentos=len(DEPARTAMENTOS), semilla=0, periodos=0):
+    generar_dataframe(filas, departamentos, semilla, periodos).to_csv(ruta, index=False)
+    return ruta
+
+
+# Shapefile con un polígono por departamento; `vertices` controla cuántos puntos
+# tiene cada borde (más vértices = más trabajo de simplificación y más bytes)
+def generar_shapefile(ruta, departamentos=len(DEPARTAMENTOS), vertices=50):
+    import geopandas as gpd
+    import shapely
+
+    celdas = celdas_departamentos(departamentos)
+    cajas = shapely.box(celdas[:, 0], celdas[:, 2], celdas[:, 1], celdas[:, 3])
+    lado = float(np.min(celdas[:, 1] - celdas[:, 0]))
+    if vertices > 1:
+        cajas = shapely.segmentize(cajas, lado / vertices)
+    gdf = gpd.GeoDataFrame(
+        {'DPTO': [nombre_shapefile(n) for n in nombres_departamentos(departamentos)]},
+        geometry=cajas,
+        crs='EPSG:4326',
+    )
+    gdf.to_file(ruta)
+    return ruta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Genera un CSV y un shapefile sintéticos.')
+    parser.add_argument('directorio', help='Directorio de salida')
+    parser.add_argument('--filas', type=float, default=1e4, help='Filas del CSV (admite 1e6)')
+    parser.add_argument('--departamentos', type=int, default=len(DEPARTAMENTOS))
+    parser.add_argument('--vertices', type=int, default=50, help='Vértices por borde de cada polígono')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--periodos', type=int, default=0, help='Años distintos en la columna Año (0 = sin columna)')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.directorio, exist_ok=True)
+    csv = generar_csv(os.path.join(args.directorio, 'educacion_superior.csv'), int(args.filas),
+                      args.departamentos, args.semilla, args.periodos)
+    shp = generar_shapefile(os.path.join(args.directorio, 'COLOMBIA.shp'), args.departamentos, args.vertices)
+    print(f"Generados {csv} ({int(args.filas):,} filas) y {shp} ({args.departamentos} polígonos)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from datos_sinteticos import generar_csv, generar_shapefile
+from carga import cliente_http, ejecutar_carga
+
+
+# Suite de benchmarks por escala de datos. Para cada número de filas genera (una
+# sola vez) un CSV y un shapefile sintéticos en benchmarks/datos/<filas>/ y mide,
+# cada modo en un proceso nuevo:
+#   geo        geoprocesamiento en frío y en caliente, con el desglose por fase
+#   agregados  conversión/lectura columnar, cubo de agregados y consultas
+#   app        arranque de app.py y latencias de los callbacks (cliente de Flask)
+#   gunicorn   (opcional) la misma carga por HTTP contra un gunicorn local
+# Los resultados se escriben en JSON para compararlos entre versiones:
+#
+#   python benchmarks/ejecutar.py --escalas 1e3,1e4,1e5
+#   python benchmarks/ejecutar.py --comparar resultados/base.json resultados/nuevo.json
+#
+# Las variables de entorno de la app (GEOJSON_ESTATICO, AGRUPAR_INSTITUCIONES, ...)
+# se heredan, así que se pueden comparar modos con los mismos datos.
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRECTORIO)
+
+VARIABLES_APP = ('GEOJSON_ESTATICO', 'AGRUPAR_INSTITUCIONES', 'ASIGNACION_ESPACIAL', 'EXPORTAR_TOPOJSON',
+                 'CARGA_DIFERIDA', 'CACHE_FIGURAS_MB', 'CALLBACKS_CLIENTE',
+                 'COMPRIMIR_RESPUESTAS', 'CACHE_RESPUESTAS_MB', 'PUNTOS_EN_VISTA', 'MAX_PUNTOS_VISTA')
+
+
+def preparar_datos(filas, departamentos, vertices):
+    directorio = os.path.join(DIRECTORIO, 'datos', f'{filas}_{departamentos}_{vertices}')
+    csv = os.path.join(directorio, 'educacion_superior.csv')
+    shp = os.path.join(directorio, 'COLOMBIA.shp')
+    generacion = None
+    if not (os.path.exists(csv) and os.path.exists(shp)):
+        os.makedirs(directorio, exist_ok=True)
+        t0 = time.perf_counter()
+        generar_csv(csv, filas, departamentos)
+        generar_shapefile(shp, departamentos, vertices)
+        generacion = round(time.perf_counter() - t0, 3)
+    return directorio, generacion
+
+
+def entorno_escala(directorio):
+    entorno = dict(os.environ)
+    entorno['SHAPEFILE_PATH'] = os.path.join(directorio, 'COLOMBIA.shp')
+    entorno['CSV_PATH'] = 'educacion_superior.csv'
+    entorno.pop('RUTA_COLUMNAR', None)
+    return entorno
+
+
+def medir(modo, directorio, peticiones, concurrencia):
+    proceso = subprocess.run(
+        [sys.executable, os.path.join(DIRECTORIO, 'escala.py'), modo,
+         '--peticiones', str(peticiones), '--concurrencia', str(concurrencia)],
+        cwd=directorio, env=entorno_escala(directorio), capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        return {'error': proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'sin salida'}
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Carga por HTTP contra un gunicorn lanzado con la configuración del repositorio
+def medir_gunicorn(directorio, peticiones, concurrencia, espera=300):
+    puerto = puerto_libre()
+    entorno = entorno_escala(directorio)
+    entorno['PORT'] = str(puerto)
+    servidor = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', os.path.join(RAIZ, 'gunicorn.conf.py'),
+         '--pythonpath', RAIZ, 'app:server'],
+        cwd=directorio, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{puerto}'
+    try:
+        t0 = time.perf_counter()
+        while True:
+            try:
+                urllib.request.urlopen(url + '/_dash-layout', timeout=5).read()
+                break
+            except OSError:
+                if servidor.poll() is not None or time.perf_counter() - t0 > espera:
+                    return {'error': 'gunicorn no respondió'}
+                time.sleep(0.2)
+        listo = round(time.perf_counter() - t0, 3)
+        get_json, post = cliente_http(url)
+        return {'primera_respuesta_s': listo, 'callbacks': ejecutar_carga(get_json, post, peticiones, concurrencia)}
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+def version_codigo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def ejecutar(args):
+    resultados = {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': version_codigo(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'entorno': {v: os.environ[v] for v in VARIABLES_APP if v in os.environ},
+        'parametros': {'departamentos': args.departamentos, 'vertices': args.vertices,
+                       'peticiones': args.peticiones, 'concurrencia': args.concurrencia},
+        'escalas': {},
+    }
+    for filas in (int(float(e)) for e in args.escalas.split(',')):
+        print(f"Escala {filas:,} filas...", file=sys.stderr)
+        directorio, generacion = preparar_datos(filas, args.departamentos, args.vertices)
+        escala = {'generacion_s': generacion}
+        for modo in ('geo', 'agregados', 'app'):
+            escala[modo] = medir(modo, directorio, args.peticiones, args.concurrencia)
+            print(f"  {modo}: {'error' if 'error' in escala[modo] else 'ok'}", file=sys.stderr)
+        if args.gunicorn:
+            escala['gunicorn'] = medir_gunicorn(directorio, args.peticiones, args.concurrencia)
+        resultados['escalas'][str(filas)] = escala
+
+    salida = args.salida or os.path.join(
+        DIRECTORIO, 'resultados', f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {salida}", file=sys.stderr)
+    return 0
+
+
+# Métricas numéricas aplanadas: {'100000/app/callbacks/mapa_completo/p50_ms': 12.3, ...}
+def aplanar(valor, prefijo=''):
+    if isinstance(valor, dict):
+        plano = {}
+        for clave, v in valor.items():
+            plano.update(aplanar(v, f'{prefijo}/{clave}' if prefijo else str(clave)))
+        return plano
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return {prefijo: valor}
+    return {}
+
+
+# Métricas en las que un valor mayor es peor (tiempos, memoria, bytes)
+def mayor_es_peor(metrica):
+    nombre = metrica.rsplit('/', 1)[-1]
+    return nombre.endswith(('_s', '_ms', '_mb')) or nombre.startswith('bytes')
+
+
+def comparar(ruta_base, ruta_nueva, tolerancia):
+    with open(ruta_base) as f:
+        base = aplanar(json.load(f)['escalas'])
+    with open(ruta_nueva) as f:
+        nueva = aplanar(json.load(f)['escalas'])
+
+    regresiones = 0
+    for metrica in sorted(set(base) & set(nueva)):
+        antes, despues = base[metrica], nueva[metrica]
+        if metrica.endswith(('/peticiones', '/errores', '/filas', '/poligonos', '/puntos')) or not antes:
+            continue
+        cambio = despues / antes - 1
+        if abs(cambio) < tolerancia:
+            continue
+        if mayor_es_peor(metrica):
+            peor = cambio > 0
+        elif metrica.endswith('por_segundo'):
+            peor = cambio < 0
+        else:
+            continue
+        regresiones += peor
+        print(f"{'REGRESIÓN' if peor else 'mejora   '} {metrica:<70} {antes:>12.4g} -> {despues:<12.4g} {cambio:+.1%}")
+    print(f"{regresiones} regresiones por encima de {tolerancia:.0%}")
+    return 1 if regresiones else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks por escala de datos.')
+    parser.add_argument('--escalas', default='1e3,1e4,1e5', help='Filas por escala, separadas por comas (hasta 1e7)')
+    parser.add_argument('--departamentos', type=int, default=33, help='Polígonos del shapefile sintético')
+    parser.add_argument('--vertices', type=int, default=50, help='Vértices por borde de cada polígono')
+    parser.add_argument('--peticiones', type=int, default=50, help='Peticiones por escenario de callback')
+    parser.add_argument('--concurrencia', type=int, default=4)
+    parser.add_argument('--gunicorn', action='store_true', help='Medir también contra un gunicorn local')
+    parser.add_argument('--salida', help='Archivo JSON (por defecto benchmarks/resultados/<fecha>.json)')
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NUEVO'), help='Comparar dos resultados')
+    parser.add_argument('--tolerancia', type=float, default=0.10, help='Cambio relativo que se informa')
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        return comparar(*args.comparar, args.tolerancia)
+    return ejecutar(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import time
+
+# Marca antes de cualquier importación pesada, para medir el arranque completo
+INICIO = time.perf_counter()
+
+import argparse
+import json
+import os
+import resource
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# Mediciones de una escala en un proceso nuevo. Se ejecuta con el directorio de
+# trabajo en la carpeta de datos de la escala (educacion_superior.csv y
+# COLOMBIA.shp) e imprime un JSON. Cada modo corre en su propio proceso para que
+# el pico de memoria (ru_maxrss) corresponda solo a ese modo.
+
+
+def memoria_pico_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB, macOS bytes
+    return round(pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024, 1)
+
+
+# Memoria residente actual del proceso (lo que ocupa un worker ya cargado);
+# None fuera de Linux
+def memoria_residente_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except OSError:
+        return None
+
+
+def cronometrar(func, repeticiones=1):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = func()
+        tiempos.append(time.perf_counter() - t0)
+    return resultado, round(min(tiempos), 6)
+
+
+# Geoprocesamiento en frío (artefactos reconstruidos) y en caliente (caché vigente)
+def medir_geo():
+    from geoprocesamiento import procesar_datos_geograficos
+    from tiempos import fases
+
+    resultado, frio = cronometrar(lambda: procesar_datos_geograficos(forzar=True))
+    if resultado is None:
+        raise RuntimeError('procesar_datos_geograficos() no devolvió datos')
+    fases_frio = {fase: round(segundos, 6) for fase, segundos in fases.items()}
+    _, caliente = cronometrar(procesar_datos_geograficos)
+    return {
+        'geoprocesamiento_frio_s': frio,
+        'geoprocesamiento_caliente_s': caliente,
+        'fases_s': fases_frio,
+        'poligonos': len(resultado['poligonos']['features']),
+        'puntos': len(resultado['puntos']),
+        'memoria_pico_mb': memoria_pico_mb(),
+        'memoria_residente_mb': memoria_residente_mb(),
+    }
+
+
+# Lectura columnar y cubo de agregados
+def medir_agregados():
+    import almacen
+    from agregados import CuboAgregados
+    from estadisticas import MotorEstadisticas, DIMENSIONES_ESTADISTICAS
+
+    _, conversion = cronometrar(almacen.convertir_a_columnar)
+    df, lectura = cronometrar(almacen.cargar_datos)
+    _, lectura_csv = cronometrar(lambda: almacen.leer_csv_tipado(almacen.CSV_PATH))
+    cubo, construccion = cronometrar(lambda: CuboAgregados(df))
+    departamentos = cubo.valores('Departamento')
+    # Primera consulta: materializa el rollup Departamento × Nivel
+    _, consulta_fria = cronometrar(lambda: cubo.consultar(['Nivel'], Departamento=departamentos[0]))
+    _, consultas = cronometrar(
+        lambda: [cubo.consultar(['Nivel'], Departamento=d) for d in departamentos], repeticiones=3
+    )
+    _, top = cronometrar(lambda: cubo.top('Institución', 10))
+    motor, estadisticas = cronometrar(lambda: MotorEstadisticas.desde_bloques(
+        almacen.bloques_datos(columnas=list(DIMENSIONES_ESTADISTICAS) + ['Estudiantes'])
+    ))
+    _, resumenes = cronometrar(lambda: [motor.resumen(d) for d in [None] + departamentos])
+    return {
+        'filas': len(df),
+        'conversion_columnar_s': conversion,
+        'lectura_columnar_s': lectura,
+        'lectura_csv_s': lectura_csv,
+        'cubo_construccion_s': construccion,
+        'consulta_primera_s': consulta_fria,
+        'consulta_memoizada_ms': round(consultas / len(departamentos) * 1000, 4),
+        'top_instituciones_s': top,
+        'estadisticas_construccion_s': estadisticas,
+        'estadisticas_resumenes_s': resumenes,
+        'memoria_pico_mb': memoria_pico_mb(),
+    }
+
+
+# Arranque de la app (caché geográfica vigente) y carga sobre los callbacks
+def medir_app(peticiones, concurrencia):
+    import app
+    from carga import cliente_flask, ejecutar_carga
+
+    arranque = time.perf_counter() - INICIO
+    precalentado = cronometrar(app.precalentar)[1]
+    get_json, post = cliente_flask(app.server)
+    callbacks = ejecutar_carga(get_json, post, peticiones, concurrencia)
+    return {
+        'arranque_s': round(arranque, 4),
+        'fases_arranque_s': {fase: round(s, 6) for fase, s in app.fases.items()},
+        'precalentar_s': precalentado,
+        'bytes_layout': len(app.server.test_client().get('/_dash-layout').data),
+        'callbacks': callbacks,
+        'memoria_pico_mb': memoria_pico_mb(),
+        'memoria_residente_mb': memoria_residente_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mide una escala (usar desde ejecutar.py).')
+    parser.add_argument('modo', choices=['geo', 'agregados', 'app'])
+    parser.add_argument('--peticiones', type=int, default=50)
+    parser.add_argument('--concurrencia', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    # Los mensajes de la app van a stderr; stdout queda solo para el JSON
+    salida = sys.stdout
+    sys.stdout = sys.stderr
+    if args.modo == 'geo':
+        resultado = medir_geo()
+    elif args.modo == 'agregados':
+        resultado = medir_agregados()
+    else:
+        resultado = medir_app(args.peticiones, args.concurrencia)
+    salida.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
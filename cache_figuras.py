@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Caché LRU limitada por tamaño en bytes (no por número de entradas)
+class CacheLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, clave, valor, tamano):
+        with self._lock:
+            if clave in self._entradas:
+                self._bytes -= self._entradas.pop(clave)[1]
+            if tamano > self.max_bytes:
+                return
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+            # Expulsar las entradas menos usadas hasta volver al límite
+            while self._bytes > self.max_bytes:
+                _, (_, tamano_expulsado) = self._entradas.popitem(last=False)
+                self._bytes -= tamano_expulsado
+
+    # Quitar solo las entradas cuya clave cumple `predicado` (p. ej. otra versión de datos)
+    def descartar(self, predicado):
+        with self._lock:
+            for clave in [c for c in self._entradas if predicado(c)]:
+                self._bytes -= self._entradas.pop(clave)[1]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+            }
+
+
+# Listas con al menos este número de elementos se guardan como arreglos numpy
+MIN_ELEMENTOS_ARREGLO = 256
+
+
+# Convertir las listas largas de una figura en arreglos numpy (numéricos o de texto
+# de ancho fijo). Los codificadores JSON leen los arreglos desde su buffer sin tocar
+# objetos Python uno a uno, así que una figura en caché creada antes del fork de
+# gunicorn no ensucia (por contadores de referencias) las páginas compartidas.
+def compactar(valor):
+    if isinstance(valor, dict):
+        return {clave: compactar(v) for clave, v in valor.items()}
+    if isinstance(valor, (list, tuple, np.ndarray)) and len(valor) >= MIN_ELEMENTOS_ARREGLO:
+        try:
+            arreglo = np.asarray(valor)
+        except ValueError:  # listas irregulares
+            arreglo = None
+        if arreglo is not None:
+            if arreglo.dtype.kind in 'biuf':
+                return np.ascontiguousarray(arreglo)
+            if arreglo.ndim == 1 and all(isinstance(v, str) for v in valor):
+                return arreglo.astype(str)
+    if isinstance(valor, (list, tuple)):
+        return [compactar(v) for v in valor]
+    return valor
+
+
+# Tamaño aproximado en memoria de una figura compactada
+def tamano_figura(valor):
+    if isinstance(valor, dict):
+        return sum(len(clave) + tamano_figura(v) for clave, v in valor.items())
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, (list, tuple)):
+        return sum(tamano_figura(v) for v in valor)
+    if isinstance(valor, str):
+        return len(valor)
+    return 8
+
+
+# Convertir una figura una sola vez: devuelve el dict listo para Dash y su tamaño en bytes
+def figura_a_dict(fig):
+    figura = compactar(fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig)
+    return figura, tamano_figura(figura)
+
+
+# Memoizar la construcción de una figura en la caché
+def figura_en_cache(cache, clave, construir):
+    figura = cache.obtener(clave)
+    if figura is None:
+        figura, tamano = figura_a_dict(construir())
+        cache.guardar(clave, figura, tamano)
+    return figura
@@ -0,0 +1,174 @@
+import itertools
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+# Dimensiones de los resúmenes: cada combinación Departamento × Nivel guarda sus
+# propios resúmenes y los de cualquier filtro se obtienen sumándolos
+DIMENSIONES_ESTADISTICAS = ('Departamento', 'Nivel')
+
+# Error relativo de los cuantiles: cada valor cae en una cubeta logarítmica
+# [γ^(k-1), γ^k) con γ = (1 + α) / (1 - α), así que el cuantil estimado está a
+# menos de α del verdadero. Las cubetas de dos resúmenes se suman tal cual.
+ERROR_CUANTILES = float(os.environ.get('ERROR_CUANTILES', 0.01))
+GAMMA = (1 + ERROR_CUANTILES) / (1 - ERROR_CUANTILES)
+# Cubeta de los valores <= 0 (el logaritmo no está definido)
+CUBETA_CERO = np.iinfo(np.int32).min
+
+# Histograma de ancho fijo: casillas de ANCHO_CASILLA estudiantes, que al dibujar
+# se juntan en como mucho CASILLAS_HISTOGRAMA barras de ancho legible
+ANCHO_CASILLA = int(os.environ.get('ANCHO_CASILLA_HISTOGRAMA', 50))
+CASILLAS_HISTOGRAMA = 30
+
+
+# Resúmenes de un bloque de filas por Departamento × Nivel: (conteo, suma,
+# mínimo y máximo), bocetos de cuantiles (conteo por cubeta) e histograma
+# (conteo por casilla). Las filas sin valor de la medida (nulos de una columna
+# Int32 o NaN) no cuentan en ninguno.
+def resumir_bloque(bloque, medida='Estudiantes'):
+    dimensiones = list(DIMENSIONES_ESTADISTICAS)
+    bloque = bloque[bloque[medida].notna()]
+    valores = bloque[medida].to_numpy(dtype=np.float64)
+    momentos = bloque.groupby(dimensiones, observed=True)[medida].agg(
+        conteo='size', suma='sum', minimo='min', maximo='max'
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cubetas = np.where(valores > 0, np.ceil(np.log(valores) / math.log(GAMMA)), CUBETA_CERO)
+    claves = [bloque[d] for d in dimensiones]
+    bocetos = pd.Series(1, index=bloque.index).groupby(claves + [cubetas.astype(np.int64)], observed=True).sum()
+    casillas = np.floor(valores / ANCHO_CASILLA).astype(np.int64)
+    histogramas = pd.Series(1, index=bloque.index).groupby(claves + [casillas], observed=True).sum()
+    bocetos.index.names = dimensiones + ['cubeta']
+    histogramas.index.names = dimensiones + ['casilla']
+    return momentos, bocetos, histogramas
+
+
+# Combinar momentos de dos resúmenes (sumas y extremos)
+def combinar_momentos(a, b):
+    combinado = a.add(b, fill_value=0)
+    extremos = pd.concat([a, b])
+    combinado['minimo'] = extremos.groupby(level=[0, 1], observed=True)['minimo'].min()
+    combinado['maximo'] = extremos.groupby(level=[0, 1], observed=True)['maximo'].max()
+    return combinado
+
+
+# Valor representativo de una cubeta: el punto medio relativo de [γ^(k-1), γ^k)
+def valor_cubeta(cubeta):
+    return 0.0 if cubeta == CUBETA_CERO else 2 * GAMMA ** cubeta / (GAMMA + 1)
+
+
+# Cuantiles `qs` de un boceto (Series de conteos indexada por cubeta), acotados a
+# los extremos exactos. Como np.quantile con interpolación lineal: el cuantil q
+# está en el rango q·(n-1) de los valores ordenados y, si cae entre dos, se
+# interpola entre los valores de sus cubetas.
+def cuantiles_boceto(boceto, qs, minimo, maximo):
+    boceto = boceto.groupby(level=0).sum().sort_index()
+    acumulado = boceto.to_numpy().cumsum()
+    total = acumulado[-1]
+    resultado = []
+    for q in qs:
+        rango = q * (total - 1)
+        inferior, superior = (
+            valor_cubeta(boceto.index[min(int(np.searchsorted(acumulado, r, side='right')), len(boceto) - 1)])
+            for r in (math.floor(rango), math.ceil(rango))
+        )
+        valor = inferior + (rango - math.floor(rango)) * (superior - inferior)
+        resultado.append(round(min(max(valor, minimo), maximo), 1))
+    return resultado
+
+
+# Motor de estadísticas precalculadas por Departamento × Nivel. Se construye en
+# una pasada por bloques (los resúmenes de dos bloques se combinan sumando) y las
+# tarjetas, el histograma y el box plot se calculan a partir de los resúmenes, no
+# de las filas. Los resúmenes de cada filtro consultado se memoizan.
+class MotorEstadisticas:
+    def __init__(self, momentos, bocetos, histogramas):
+        self._lock = threading.Lock()
+        self._momentos = momentos.sort_index()
+        self._bocetos = bocetos.sort_index()
+        self._histogramas = histogramas.sort_index()
+        self._resumenes = {}
+
+    @classmethod
+    def desde_bloques(cls, bloques, medida='Estudiantes'):
+        momentos = bocetos = histogramas = None
+        for bloque in bloques:
+            m, b, h = resumir_bloque(bloque, medida)
+            if momentos is None:
+                momentos, bocetos, histogramas = m, b, h
+            else:
+                momentos = combinar_momentos(momentos, m)
+                bocetos = bocetos.add(b, fill_value=0).astype('int64')
+                histogramas = histogramas.add(h, fill_value=0).astype('int64')
+        return cls(momentos, bocetos, histogramas)
+
+    # Filas de una tabla indexada por Departamento × Nivel (× otra) para un departamento
+    @staticmethod
+    def _filtrar(tabla, departamento):
+        if departamento is None:
+            return tabla
+        return tabla[tabla.index.get_level_values('Departamento') == departamento]
+
+    # Resumen de todas las filas o de un departamento (memoizado): totales,
+    # cuantiles por nivel para el box plot e histograma en casillas legibles
+    def resumen(self, departamento=None):
+        resumen = self._resumenes.get(departamento)
+        if resumen is None:
+            resumen = self._resumir(departamento)
+            with self._lock:
+                self._resumenes[departamento] = resumen
+        return resumen
+
+    def _resumir(self, departamento):
+        momentos = self._filtrar(self._momentos, departamento)
+        bocetos = self._filtrar(self._bocetos, departamento)
+        conteo = int(momentos['conteo'].sum())
+        suma = int(momentos['suma'].sum())
+
+        niveles = {}
+        if conteo:
+            por_nivel = momentos.groupby(level='Nivel', observed=True).agg(
+                conteo=('conteo', 'sum'), suma=('suma', 'sum'), minimo=('minimo', 'min'), maximo=('maximo', 'max')
+            )
+            for nivel, fila in por_nivel.iterrows():
+                boceto = bocetos[bocetos.index.get_level_values('Nivel') == nivel].droplevel(['Departamento', 'Nivel'])
+                q1, mediana, q3 = cuantiles_boceto(boceto, (0.25, 0.5, 0.75), fila['minimo'], fila['maximo'])
+                # Bigotes como en un box plot de filas: hasta 1.5 veces el rango
+                # intercuartílico, sin pasar de los extremos
+                rango = q3 - q1
+                niveles[nivel] = {
+                    'conteo': int(fila['conteo']),
+                    'promedio': fila['suma'] / fila['conteo'],
+                    'q1': q1, 'mediana': mediana, 'q3': q3,
+                    'minimo': float(fila['minimo']), 'maximo': float(fila['maximo']),
+                    'bigote_inferior': round(max(q1 - 1.5 * rango, float(fila['minimo'])), 1),
+                    'bigote_superior': round(min(q3 + 1.5 * rango, float(fila['maximo'])), 1),
+                }
+
+        return {
+            'conteo': conteo,
+            'suma': suma,
+            'promedio': suma / conteo if conteo else 0.0,
+            'niveles': niveles,
+            'histograma': self._histograma(departamento),
+        }
+
+    # Histograma (bordes izquierdos, ancho y conteos) con casillas de ancho fijo
+    # agrupadas en un ancho múltiplo de ANCHO_CASILLA (1, 2 o 5 × 10^k casillas)
+    def _histograma(self, departamento):
+        conteos = self._filtrar(self._histogramas, departamento).groupby(level='casilla').sum().sort_index()
+        if conteos.empty:
+            return {'inicios': [], 'ancho': ANCHO_CASILLA, 'conteos': []}
+        extension = int(conteos.index[-1] - conteos.index[0] + 1)
+        agrupar = 1
+        pasos = itertools.cycle((2, 2.5, 2))  # 1, 2, 5, 10, 20, 50, ...
+        while math.ceil(extension / agrupar) > CASILLAS_HISTOGRAMA:
+            agrupar = int(agrupar * next(pasos))
+        grupos = conteos.groupby(np.floor_divide(conteos.index.to_numpy(), agrupar)).sum()
+        ancho = agrupar * ANCHO_CASILLA
+        return {'inicios': (grupos.index.to_numpy() * ancho).tolist(), 'ancho': ancho,
+                'conteos': grupos.to_numpy().tolist()}
@@ -0,0 +1,236 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import flask
+
+from geoprocesamiento import escribir_atomico
+
+try:
+    import kaleido  # noqa: F401  (plotly lo usa para exportar PNG/SVG)
+except ImportError:  # sin kaleido solo se exportan datos
+    kaleido = None
+
+
+# Exportación de agregados (CSV/Parquet), de los puntos (GeoJSON) y de figuras
+# (PNG/SVG) fuera de los hilos que atienden los callbacks. Cada exportación es un
+# trabajo identificado por el hash de sus parámetros (incluida la versión de los
+# datos): pedir dos veces lo mismo devuelve el mismo trabajo, y un resultado ya
+# generado se sirve sin recalcularlo. Los trabajos corren en un pool de hilos
+# acotado y los resultados se guardan en disco, así que cualquier worker de
+# gunicorn puede servirlos.
+
+# Hilos del pool y trabajos que pueden esperar en cola (los demás reciben 503)
+EXPORTAR_HILOS = int(os.environ.get('EXPORTAR_HILOS', 2))
+MAX_TRABAJOS_PENDIENTES = int(os.environ.get('EXPORTAR_MAX_PENDIENTES', 16))
+
+# Directorio de los resultados y espacio máximo que ocupan (se borran los más antiguos)
+DIRECTORIO_EXPORTACIONES = os.environ.get('DIRECTORIO_EXPORTACIONES', 'exportaciones')
+MAX_EXPORTACIONES_BYTES = int(os.environ.get('EXPORTACIONES_MB', 256)) * 1024 * 1024
+
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'geojson': 'application/geo+json',
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+FORMATOS_IMAGEN = ('png', 'svg')
+
+# Forma de un id de trabajo: hash y formato (no admite rutas)
+PATRON_TRABAJO = re.compile(r'[0-9a-f]{20}\.(' + '|'.join(TIPOS_CONTENIDO) + r')')
+
+
+# Parámetros inválidos de una exportación (responde 400)
+class ParametrosInvalidos(ValueError):
+    pass
+
+
+# Bytes de una tabla de agregados en CSV o Parquet
+def serializar_tabla(tabla, formato):
+    if formato == 'csv':
+        return tabla.to_csv(index=False).encode('utf-8')
+    salida = io.BytesIO()
+    tabla.to_parquet(salida, index=False)
+    return salida.getvalue()
+
+
+# Identificador de un trabajo: hash de sus parámetros normalizados
+def id_trabajo(parametros):
+    return hashlib.sha1(json.dumps(parametros, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:20]
+
+
+def proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Exportador:
+    def __init__(self, directorio=DIRECTORIO_EXPORTACIONES, hilos=EXPORTAR_HILOS,
+                 max_pendientes=MAX_TRABAJOS_PENDIENTES, max_bytes=MAX_EXPORTACIONES_BYTES):
+        self.directorio = directorio
+        self.max_pendientes = max_pendientes
+        self.max_bytes = max_bytes
+        self.trabajos = {'ok': 0, 'error': 0, 'rechazado': 0, 'en_cache': 0}
+        # Los hilos del pool se crean con el primer trabajo, ya en el worker
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='exportacion')
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def ruta(self, trabajo):
+        return os.path.join(self.directorio, trabajo)
+
+    @property
+    def pendientes(self):
+        return len(self._en_curso)
+
+    # Estado de un trabajo: 'listo', 'error', 'en_curso' o None si no se conoce. Un
+    # trabajo en curso deja una marca con el pid que lo ejecuta, visible desde los
+    # demás workers; si ese proceso ya no existe, el trabajo se da por perdido.
+    def estado(self, trabajo):
+        ruta = self.ruta(trabajo)
+        if os.path.exists(ruta):
+            return {'estado': 'listo', 'bytes': os.path.getsize(ruta)}
+        try:
+            with open(ruta + '.error') as f:
+                return {'estado': 'error', 'error': f.read()}
+        except OSError:
+            pass
+        if trabajo in self._en_curso:
+            return {'estado': 'en_curso'}
+        try:
+            with open(ruta + '.en_curso') as f:
+                if proceso_vivo(int(f.read())):
+                    return {'estado': 'en_curso'}
+        except (OSError, ValueError):
+            pass
+        return None
+
+    # Encolar `tarea()` (devuelve los bytes del resultado) salvo que el trabajo ya
+    # exista. Devuelve el estado, o None si la cola está llena.
+    def enviar(self, trabajo, tarea):
+        estado = self.estado(trabajo)
+        if estado is not None and estado['estado'] != 'error':
+            if estado['estado'] == 'listo':
+                self.trabajos['en_cache'] += 1
+            return estado
+        with self._lock:
+            if trabajo in self._en_curso:
+                return {'estado': 'en_curso'}
+            if len(self._en_curso) >= self.max_pendientes:
+                self.trabajos['rechazado'] += 1
+                return None
+            os.makedirs(self.directorio, exist_ok=True)
+            # Un trabajo que falló se vuelve a intentar
+            if os.path.exists(self.ruta(trabajo) + '.error'):
+                os.remove(self.ruta(trabajo) + '.error')
+            escribir_atomico(self.ruta(trabajo) + '.en_curso', str(os.getpid()).encode())
+            self._en_curso[trabajo] = self._pool.submit(self._ejecutar, trabajo, tarea)
+        return {'estado': 'en_curso'}
+
+    def _ejecutar(self, trabajo, tarea):
+        ruta = self.ruta(trabajo)
+        t0 = time.perf_counter()
+        try:
+            escribir_atomico(ruta, tarea())
+            self.trabajos['ok'] += 1
+            print(f"Exportación {trabajo} lista en {time.perf_counter() - t0:.2f} s ({os.path.getsize(ruta):,} bytes)")
+        except Exception as e:
+            traceback.print_exc()
+            self.trabajos['error'] += 1
+            escribir_atomico(ruta + '.error', str(e).encode('utf-8'))
+        finally:
+            with self._lock:
+                self._en_curso.pop(trabajo, None)
+            try:
+                os.remove(ruta + '.en_curso')
+            except OSError:
+                pass
+            self.limpiar()
+
+    # Borrar los resultados más antiguos hasta volver al límite de espacio
+    def limpiar(self):
+        try:
+            entradas = [entrada for entrada in os.scandir(self.directorio) if entrada.is_file()]
+        except OSError:
+            return
+        archivos = sorted((entrada.stat().st_mtime, entrada.stat().st_size, entrada.path) for entrada in entradas)
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, ruta in archivos:
+            if total <= self.max_bytes:
+                break
+            if ruta.endswith('.en_curso'):
+                continue
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                pass
+
+
+# Registrar los endpoints de exportación:
+#   POST {ruta}/<tipo>.<formato>?parametros  crea el trabajo (202) o lo reutiliza (200 si ya está listo)
+#   GET  {ruta}/trabajos/<id>                estado del trabajo
+#   GET  {ruta}/trabajos/<id>/resultado      descarga del resultado
+# `preparar(tipo, formato, parametros)` valida los parámetros de la petición y
+# devuelve (parametros_normalizados, tarea); lanza ParametrosInvalidos si no son válidos.
+def instalar_exportaciones(server, exportador, preparar, ruta='/exportar'):
+    def respuesta_estado(trabajo, estado, codigo=200):
+        return flask.jsonify({
+            'trabajo': trabajo,
+            **estado,
+            'estado_url': f'{ruta}/trabajos/{trabajo}',
+            'resultado_url': f'{ruta}/trabajos/{trabajo}/resultado',
+        }), codigo
+
+    @server.route(f'{ruta}/<tipo>.<formato>', methods=['POST'])
+    def exportar(tipo, formato):
+        if formato not in TIPOS_CONTENIDO:
+            flask.abort(404)
+        if formato in FORMATOS_IMAGEN and kaleido is None:
+            return flask.jsonify({'error': 'La exportación de imágenes requiere kaleido'}), 501
+        parametros = {**flask.request.args.to_dict(), **(flask.request.get_json(silent=True) or {})}
+        try:
+            normalizados, tarea = preparar(tipo, formato, parametros)
+        except ParametrosInvalidos as e:
+            return flask.jsonify({'error': str(e)}), 400
+        trabajo = f"{id_trabajo({'tipo': tipo, 'formato': formato, **normalizados})}.{formato}"
+        estado = exportador.enviar(trabajo, tarea)
+        if estado is None:
+            respuesta = flask.jsonify({'error': 'Demasiadas exportaciones en curso, intente más tarde'})
+            respuesta.headers['Retry-After'] = '5'
+            return respuesta, 503
+        return respuesta_estado(trabajo, estado, 200 if estado['estado'] == 'listo' else 202)
+
+    def estado_conocido(trabajo):
+        estado = exportador.estado(trabajo) if PATRON_TRABAJO.fullmatch(trabajo) else None
+        if estado is None:
+            flask.abort(404)
+        return estado
+
+    @server.route(f'{ruta}/trabajos/<trabajo>')
+    def estado_exportacion(trabajo):
+        return respuesta_estado(trabajo, estado_conocido(trabajo))
+
+    @server.route(f'{ruta}/trabajos/<trabajo>/resultado')
+    def resultado_exportacion(trabajo):
+        estado = estado_conocido(trabajo)
+        formato = trabajo.rsplit('.', 1)[-1]
+        if estado['estado'] != 'listo':
+            return respuesta_estado(trabajo, estado, 409 if estado['estado'] == 'error' else 202)
+        respuesta = flask.send_file(os.path.abspath(exportador.ruta(trabajo)), mimetype=TIPOS_CONTENIDO[formato],
+                                    as_attachment=True, download_name=f'exportacion_{trabajo}', etag=True)
+        # El contenido de un trabajo no cambia: su id es el hash de los parámetros
+        respuesta.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+        return respuesta
@@ -0,0 +1,930 @@
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from tiempos import medir_fase
+
+# geopandas y shapely se importan solo en la ruta de reprocesamiento: cuando la
+# caché está vigente, cargar los artefactos no necesita ninguno de los dos
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+
+# Versión del procesamiento: incrementarla cuando cambie la forma de los artefactos
+VERSION_PROCESAMIENTO = 4
+
+# Rutas de entrada
+SHAPEFILE_PATH = os.environ.get(
+    'SHAPEFILE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'COLOMBIA.shp')
+)
+CSV_PATH = os.environ.get('CSV_PATH', "educacion_superior.csv")
+
+# Escalera de simplificación: (zoom mínimo del mapa, tolerancia en grados).
+# Cada nivel se usa desde su zoom hasta el zoom del siguiente nivel.
+NIVELES_ZOOM = [(0, 0.02), (6, 0.005), (8, 0.001), (10, 0.0)]
+DECIMALES_COORDENADAS = 5
+
+# Emitir también TopoJSON con arcos compartidos (requiere el paquete opcional `topojson`)
+EXPORTAR_TOPOJSON = os.environ.get('EXPORTAR_TOPOJSON', '0') == '1'
+
+# Asignar cada institución a su polígono por coordenadas en vez de por el texto de 'Departamento'
+ASIGNACION_ESPACIAL = os.environ.get('ASIGNACION_ESPACIAL', '0') == '1'
+# Distancia máxima (en grados) a la que una institución fuera de todo polígono se
+# asigna al más cercano; más lejos, o sin coordenadas, queda sin asignar
+DISTANCIA_MAXIMA_POLIGONO = float(os.environ.get('DISTANCIA_MAXIMA_POLIGONO', 1.0))
+
+# Rutas de salida (artefactos y manifiesto con las claves de la caché)
+OUTPUT_GEOJSON_PATH = "colombia_educacion.geojson"
+OUTPUT_PUNTOS_PATH = "colombia_educacion_puntos.geojson"
+MANIFIESTO_PATH = "colombia_educacion.cache.json"
+
+# Columnas candidatas para el nombre del departamento en el shapefile
+POSIBLES_COLS_DEPTO = ['DEPARTAMEN', 'NOMBRE_DEP', 'DPTO', 'NAME_1', 'DEPARTAMENTO', 'NOM_DEPART']
+
+# Variantes conocidas de nombres de departamento (ya normalizadas)
+ALIAS_DEPARTAMENTOS = {
+    'SANTAFEDEBOGOTA': 'BOGOTA',
+    'BOGOTADISTRITOCAPITAL': 'BOGOTA',
+    'ARCHIPIELAGODESANANDRESPROVIDENCIAYSANTACATALINA': 'SANANDRES',
+    'SANANDRESYPROVIDENCIA': 'SANANDRES',
+    'SANANDRESPROVIDENCIAYSANTACATALINA': 'SANANDRES',
+}
+
+# Filas del CSV que se procesan a la vez: la memoria pico depende de este número
+# y no del tamaño del archivo
+FILAS_POR_BLOQUE = int(os.environ.get('FILAS_POR_BLOQUE', 200000))
+
+# Columnas de coordenadas de los puntos (float32 en memoria: ~1 m de resolución)
+COLUMNAS_COORDENADAS = ('Latitud', 'Longitud')
+
+# Features del GeoJSON de puntos que se decodifican a la vez al cargarlo
+FEATURES_POR_BLOQUE = 5000
+
+# Archivos que forman parte de un shapefile
+EXTENSIONES_SHAPEFILE = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+# Hash SHA-256 del contenido de un archivo, leído por bloques
+def hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+# Hash del conjunto de archivos del shapefile (.shp, .shx, .dbf, ...)
+def hash_shapefile(shapefile_path):
+    base = os.path.splitext(shapefile_path)[0]
+    h = hashlib.sha256()
+    for ext in EXTENSIONES_SHAPEFILE:
+        ruta = base + ext
+        if os.path.exists(ruta):
+            h.update(ext.encode())
+            h.update(hash_archivo(ruta).encode())
+    return h.hexdigest()
+
+
+# Hash del CSV con el tamaño y la fecha de modificación que tenía al calcularlo.
+# Si el manifiesto ya lo registró para el mismo tamaño y fecha se reutiliza sin
+# releer el archivo (tras `anexar_filas` es el hash encadenado del anexo).
+def registro_csv(csv_path, manifiesto=None):
+    estado = os.stat(csv_path)
+    registrado = (manifiesto or {}).get('csv', {})
+    if registrado.get('bytes') == estado.st_size and registrado.get('mtime_ns') == estado.st_mtime_ns:
+        return registrado
+    return {'bytes': estado.st_size, 'mtime_ns': estado.st_mtime_ns, 'hash': hash_archivo(csv_path)}
+
+
+# Claves de caché de cada artefacto según sus entradas
+def claves_artefactos(csv_path=CSV_PATH, shapefile_path=SHAPEFILE_PATH, espacial=ASIGNACION_ESPACIAL,
+                      exportar_topojson=EXPORTAR_TOPOJSON, csv_hash=None):
+    csv_hash = csv_hash or hash_archivo(csv_path)
+    shp_hash = hash_shapefile(shapefile_path)
+    niveles = ','.join(f'{zoom}:{tolerancia}' for zoom, tolerancia in NIVELES_ZOOM)
+    opciones = f'niveles={niveles}:decimales={DECIMALES_COORDENADAS}:topojson={int(exportar_topojson)}'
+    if espacial:
+        # En modo espacial los puntos llevan el polígono asignado, así que dependen del shapefile
+        return {
+            'poligonos': f'v{VERSION_PROCESAMIENTO}:espacial={DISTANCIA_MAXIMA_POLIGONO}:{opciones}:csv={csv_hash}:shp={shp_hash}',
+            'puntos': f'v{VERSION_PROCESAMIENTO}:espacial={DISTANCIA_MAXIMA_POLIGONO}:csv={csv_hash}:shp={shp_hash}',
+        }
+    return {
+        'poligonos': f'v{VERSION_PROCESAMIENTO}:{opciones}:csv={csv_hash}:shp={shp_hash}',
+        'puntos': f'v{VERSION_PROCESAMIENTO}:csv={csv_hash}',
+    }
+
+
+# Escritura atómica por partes: se escribe en un temporal del mismo directorio
+# y solo al cerrar sin errores se renombra sobre `ruta`
+@contextlib.contextmanager
+def archivo_atomico(ruta):
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    fd, tmp = tempfile.mkstemp(dir=directorio, prefix='.' + os.path.basename(ruta) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, ruta)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+# Escritura atómica: archivo temporal en el mismo directorio + rename
+def escribir_atomico(ruta, contenido):
+    with archivo_atomico(ruta) as f:
+        f.write(contenido)
+
+
+# Bloqueo exclusivo entre procesos (varios workers de gunicorn arrancando a la vez)
+@contextlib.contextmanager
+def bloqueo(ruta):
+    if fcntl is None:
+        yield
+        return
+    with open(ruta + '.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def leer_manifiesto():
+    try:
+        with open(MANIFIESTO_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def escribir_manifiesto(manifiesto):
+    escribir_atomico(MANIFIESTO_PATH, json.dumps(manifiesto, indent=2).encode('utf-8'))
+
+
+# Ruta del GeoJSON simplificado para un nivel de zoom
+def ruta_nivel(zoom):
+    base, ext = os.path.splitext(OUTPUT_GEOJSON_PATH)
+    return f'{base}_z{zoom}{ext}'
+
+
+# Artefactos cuya clave no coincide con la del manifiesto (o que no existen)
+def artefactos_pendientes(manifiesto, claves, forzar=False):
+    rutas = {'poligonos': OUTPUT_GEOJSON_PATH, 'puntos': OUTPUT_PUNTOS_PATH}
+    pendientes = []
+    for nombre, clave in claves.items():
+        entrada = manifiesto.get(nombre, {})
+        if forzar or entrada.get('clave') != clave or not os.path.exists(rutas[nombre]):
+            pendientes.append(nombre)
+        elif any(not os.path.exists(nivel['ruta']) for nivel in entrada.get('niveles', [])):
+            pendientes.append(nombre)
+    return pendientes
+
+
+# Identificar la columna de departamentos del shapefile
+def detectar_columna_departamento(gdf_colombia):
+    for col in POSIBLES_COLS_DEPTO:
+        if col in gdf_colombia.columns:
+            return col
+
+    # Usar la primera columna que parezca contener nombres
+    for col in gdf_colombia.columns:
+        if gdf_colombia[col].dtype == 'object' and gdf_colombia[col].nunique() > 20:
+            return col
+    return None
+
+
+# Clave normalizada de departamento: sin tildes, mayúsculas, sin puntuación,
+# sin el sufijo "D.C." y sin espacios ("Bogotá D.C." -> "BOGOTA")
+def normalizar_departamento(serie):
+    clave = (
+        serie.astype(str)
+        .str.normalize('NFKD')
+        .str.encode('ascii', 'ignore')
+        .str.decode('ascii')
+        .str.upper()
+        .str.replace(r'[^A-Z0-9]+', ' ', regex=True)
+        .str.replace(r'\bD C\b', '', regex=True)
+        .str.replace(r'\s+', '', regex=True)
+    )
+    return clave.replace(ALIAS_DEPARTAMENTOS)
+
+
+# Totales de un bloque de filas del CSV por clave normalizada de departamento,
+# con el primer nombre original de cada clave para los reportes
+def totales_departamento(df_educacion):
+    claves_csv = normalizar_departamento(df_educacion['Departamento'])
+    return df_educacion.groupby(claves_csv).agg(
+        Estudiantes=('Estudiantes', 'sum'),
+        NumInstituciones=('ID', 'count'),
+        Nombre=('Departamento', 'first'),
+    )
+
+
+# Acumular los totales de un bloque nuevo sobre los ya calculados
+def sumar_totales(acumulado, nuevos):
+    if acumulado is None:
+        return nuevos
+    return pd.concat([acumulado, nuevos]).groupby(level=0).agg(
+        Estudiantes=('Estudiantes', 'sum'),
+        NumInstituciones=('NumInstituciones', 'sum'),
+        Nombre=('Nombre', 'first'),
+    )
+
+
+# Unir los totales por departamento a los polígonos en una sola pasada vectorizada
+def unir_datos_departamentos(gdf_colombia, totales, dept_col):
+    datos_por_depto = totales[['Estudiantes', 'NumInstituciones']]
+
+    claves_poligonos = normalizar_departamento(gdf_colombia[dept_col])
+    gdf_colombia = gdf_colombia.assign(_clave_depto=claves_poligonos)
+    gdf_colombia = gdf_colombia.join(datos_por_depto, on='_clave_depto').drop(columns='_clave_depto')
+    gdf_colombia[['Estudiantes', 'NumInstituciones']] = (
+        gdf_colombia[['Estudiantes', 'NumInstituciones']].fillna(0).astype(int)
+    )
+
+    # Reportar claves sin pareja en ambos sentidos
+    nombres_csv = totales['Nombre']
+    sin_poligono = sorted(nombres_csv[~nombres_csv.index.isin(claves_poligonos)].tolist())
+    sin_datos = sorted(gdf_colombia.loc[~claves_poligonos.isin(datos_por_depto.index), dept_col].astype(str).tolist())
+    if sin_poligono:
+        print(f"Departamentos del CSV sin polígono: {', '.join(sin_poligono)}")
+    if sin_datos:
+        print(f"Polígonos sin datos en el CSV: {', '.join(sin_datos)}")
+
+    return gdf_colombia, sin_poligono
+
+
+# Simplificación y cuantización de coordenadas a una rejilla de 10^-decimales
+# grados. Si los polígonos forman una cobertura válida (sin solapes, fronteras
+# comunes con los mismos vértices) y shapely >= 2.1 está disponible, cada frontera
+# compartida se simplifica una sola vez y los departamentos vecinos siguen
+# encajando. Si no, cada polígono se simplifica por separado (preserve_topology
+# solo actúa dentro de una geometría) y entre vecinos pueden aparecer huecos o
+# solapes del orden de la tolerancia; el TopoJSON sí conserva las fronteras comunes.
+def simplificar_geometrias(geometrias, tolerancia, decimales=DECIMALES_COORDENADAS):
+    import shapely
+
+    geometrias = shapely.make_valid(geometrias)
+    if tolerancia > 0:
+        if hasattr(shapely, 'coverage_simplify') and shapely.coverage_is_valid(geometrias):
+            geometrias = shapely.coverage_simplify(geometrias, tolerancia)
+        else:
+            geometrias = shapely.simplify(geometrias, tolerancia, preserve_topology=True)
+    try:
+        geometrias = shapely.set_precision(geometrias, 10.0 ** -decimales)
+    except shapely.errors.GEOSException as e:
+        # Geometrías que GEOS no puede ajustar a la rejilla: solo se redondean
+        print(f"No se pudo ajustar la precisión de las geometrías: {e}")
+    # Redondear también la representación en texto de las coordenadas
+    return shapely.transform(geometrias, lambda coords: np.round(coords, decimales))
+
+
+# Generar un GeoJSON por nivel de zoom e informar los bytes ahorrados en cada uno
+def construir_niveles(gdf_colombia, bytes_original, exportar_topojson=EXPORTAR_TOPOJSON):
+    niveles = []
+    for zoom, tolerancia in NIVELES_ZOOM:
+        gdf_nivel = gdf_colombia.copy()
+        gdf_nivel['geometry'] = simplificar_geometrias(gdf_colombia.geometry.values, tolerancia)
+        contenido = gdf_nivel.to_json().encode('utf-8')
+        ruta = ruta_nivel(zoom)
+        escribir_atomico(ruta, contenido)
+
+        ahorro = 1 - len(contenido) / bytes_original if bytes_original else 0
+        print(f"Nivel z{zoom} (tolerancia {tolerancia}): {len(contenido):,} bytes, "
+              f"{ahorro:.1%} menos que el original ({bytes_original:,} bytes)")
+        nivel = {'zoom': zoom, 'tolerancia': tolerancia, 'ruta': ruta, 'bytes': len(contenido)}
+
+        if exportar_topojson:
+            nivel.update(construir_topojson(gdf_colombia, zoom, tolerancia))
+        niveles.append(nivel)
+    return niveles
+
+
+# TopoJSON con arcos compartidos: las fronteras comunes se simplifican una sola vez
+def construir_topojson(gdf_colombia, zoom, tolerancia):
+    try:
+        import topojson
+    except ImportError:
+        print("Paquete `topojson` no instalado; se omite la exportación TopoJSON")
+        return {}
+
+    # prequantize es el número de pasos de la rejilla sobre la extensión de los
+    # datos: para una resolución de 10^-decimales grados depende del bbox
+    minx, miny, maxx, maxy = gdf_colombia.total_bounds
+    pasos = math.ceil(max(maxx - minx, maxy - miny) * 10 ** DECIMALES_COORDENADAS) + 1
+    topologia = topojson.Topology(
+        gdf_colombia,
+        prequantize=pasos,
+        toposimplify=tolerancia if tolerancia > 0 else False,
+    )
+    contenido = topologia.to_json().encode('utf-8')
+    ruta = os.path.splitext(ruta_nivel(zoom))[0] + '.topojson'
+    escribir_atomico(ruta, contenido)
+    print(f"Nivel z{zoom} TopoJSON: {len(contenido):,} bytes")
+    return {'ruta_topojson': ruta, 'bytes_topojson': len(contenido)}
+
+
+# Asignar cada punto a un polígono con consultas masivas sobre STRtree. El árbol
+# se construye sobre los puntos y se consulta con cada polígono ('contains'): con
+# pocos polígonos y muchos puntos es varias veces más rápido que consultar punto
+# a punto. Devuelve el índice del polígono por punto (-1 = sin asignar) y los
+# índices de los puntos que no caen en ningún polígono: a esos se les asigna el
+# más cercano a menos de `distancia_maxima` grados; los que no tienen coordenadas
+# o están más lejos quedan sin asignar.
+def asignar_poligonos(lon, lat, geometrias, distancia_maxima=DISTANCIA_MAXIMA_POLIGONO):
+    import shapely
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    asignacion = np.full(len(lon), -1, dtype=np.int64)
+    validos = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+    puntos = shapely.points(lon[validos], lat[validos])
+
+    if len(puntos):
+        shapely.prepare(geometrias)
+        idx_poligonos, idx_puntos = shapely.STRtree(puntos).query(geometrias, predicate='contains')
+        # Un punto contenido en dos polígonos se queda con el primero
+        asignacion[validos[idx_puntos[::-1]]] = idx_poligonos[::-1]
+
+    fuera = np.flatnonzero(asignacion < 0)
+    cercanos = validos[asignacion[validos] < 0]
+    if cercanos.size:
+        # Fuera de todo polígono la distancia al más cercano es la distancia a su
+        # borde: se busca el segmento de borde más cercano, mucho más barato que
+        # medir la distancia a polígonos de miles de vértices
+        segmentos, poligono_segmento = segmentos_bordes(geometrias)
+        idx_fuera, idx_segmentos = shapely.STRtree(segmentos).query_nearest(
+            shapely.points(lon[cercanos], lat[cercanos]), max_distance=distancia_maxima, all_matches=False
+        )
+        asignacion[cercanos[idx_fuera]] = poligono_segmento[idx_segmentos]
+    return asignacion, fuera
+
+
+# Segmentos de los bordes de los polígonos (anillos exteriores e interiores) y
+# el índice del polígono de cada segmento
+def segmentos_bordes(geometrias):
+    import shapely
+
+    partes, poligono_parte = shapely.get_parts(geometrias, return_index=True)
+    anillos, parte_anillo = shapely.get_rings(partes, return_index=True)
+    coordenadas, anillo_coordenada = shapely.get_coordinates(anillos, return_index=True)
+    consecutivas = anillo_coordenada[1:] == anillo_coordenada[:-1]
+    segmentos = shapely.linestrings(np.stack([coordenadas[:-1][consecutivas], coordenadas[1:][consecutivas]], axis=1))
+    return segmentos, poligono_parte[parte_anillo[anillo_coordenada[:-1][consecutivas]]]
+
+
+# Geometrías del shapefile en las mismas coordenadas que los puntos (EPSG:4326)
+def geometrias_wgs84(gdf_colombia):
+    if gdf_colombia.crs is not None and not gdf_colombia.crs.equals("EPSG:4326"):
+        return gdf_colombia.to_crs("EPSG:4326").geometry.values
+    return gdf_colombia.geometry.values
+
+
+# Totales por polígono de un bloque a partir de su asignación espacial
+# (los puntos sin asignar no cuentan)
+def totales_por_asignacion(n_poligonos, df_educacion, asignacion):
+    asignados = asignacion >= 0
+    estudiantes = np.bincount(asignacion[asignados], minlength=n_poligonos,
+                              weights=df_educacion['Estudiantes'].to_numpy(dtype=np.float64)[asignados])
+    instituciones = np.bincount(asignacion[asignados], minlength=n_poligonos,
+                                weights=df_educacion['ID'].notna().to_numpy()[asignados])
+    return np.column_stack([estudiantes, instituciones])
+
+
+# Nombre del polígono asignado a cada punto (None si quedó sin asignar)
+def departamento_asignado(nombres, asignacion):
+    return np.where(asignacion >= 0, np.asarray(nombres, dtype=object)[asignacion], None)
+
+
+# Copiar a los polígonos los totales acumulados de la asignación espacial (ceros
+# si el CSV no tiene filas)
+def agregar_por_asignacion(gdf_colombia, totales):
+    if totales is None:
+        totales = np.zeros((len(gdf_colombia), 2))
+    gdf_colombia = gdf_colombia.copy()
+    gdf_colombia['Estudiantes'] = totales[:, 0].astype(int)
+    gdf_colombia['NumInstituciones'] = totales[:, 1].astype(int)
+    return gdf_colombia
+
+
+# Leer el CSV por bloques de `filas_por_bloque` filas (el índice sigue la
+# numeración de todo el archivo)
+def leer_csv_por_bloques(csv_path, filas_por_bloque=FILAS_POR_BLOQUE):
+    with pd.read_csv(csv_path, chunksize=filas_por_bloque) as lector:
+        yield from lector
+
+
+# Features GeoJSON de un bloque de puntos, separadas por comas, en el mismo
+# formato que GeoDataFrame.to_json() pero sin crear una geometría por fila
+def features_puntos(bloque):
+    propiedades = bloque.astype(object).where(bloque.notna(), None).to_dict('records')
+    partes = []
+    for indice, props in zip(bloque.index, propiedades):
+        lon, lat = props.get('Longitud'), props.get('Latitud')
+        geometria = None if lon is None or lat is None else {'type': 'Point', 'coordinates': [lon, lat]}
+        partes.append(json.dumps({'id': str(indice), 'type': 'Feature', 'properties': props, 'geometry': geometria}))
+    return ', '.join(partes)
+
+
+# Features del GeoJSON de puntos, una a una, leyendo el archivo por partes: nunca
+# se tiene el texto completo ni la lista completa de features en memoria
+def leer_features(f, caracteres=1 << 20):
+    decodificador = json.JSONDecoder()
+    separadores = re.compile(r'[\s,]*')
+    texto = f.read(caracteres)
+    posicion = texto.index('[', texto.index('"features"')) + 1
+    while True:
+        posicion = separadores.match(texto, posicion).end()
+        if texto.startswith(']', posicion):
+            return
+        try:
+            feature, posicion = decodificador.raw_decode(texto, posicion)
+        except json.JSONDecodeError:
+            # Feature cortada al final de lo leído: continuar con la parte siguiente
+            leido = f.read(caracteres)
+            if not leido:
+                raise
+            texto = texto[posicion:] + leido
+            posicion = 0
+            continue
+        yield feature
+
+
+# Columna de propiedades con el tipo más compacto: coordenadas en float32,
+# enteros en int32, textos como códigos de categoría
+def compactar_columna(serie):
+    if serie.name in COLUMNAS_COORDENADAS:
+        return serie.to_numpy(dtype=np.float32, na_value=np.nan)
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_float_dtype(serie):
+        return serie.to_numpy()
+    if pd.api.types.is_integer_dtype(serie):
+        valores = serie.to_numpy()
+        if valores.size == 0 or np.iinfo(np.int32).min <= valores.min() <= valores.max() <= np.iinfo(np.int32).max:
+            return valores.astype(np.int32)
+        return valores
+    return pd.Categorical(serie)
+
+
+# Capa de puntos en memoria como columnas (struct-of-arrays) en vez de un dict por
+# feature: coordenadas float32, estudiantes int32 y nombres/niveles como códigos de
+# categoría. La geometría no se guarda porque repite Latitud/Longitud. El GeoJSON
+# se vuelve a escribir desde las columnas solo cuando se pide (exportación).
+class CapaPuntos:
+    def __init__(self, ids, columnas):
+        self.ids = ids
+        self.columnas = columnas
+
+    # Leer el GeoJSON de puntos por bloques de features: los dicts de un bloque se
+    # descartan en cuanto sus columnas se compactan
+    @classmethod
+    def desde_geojson(cls, ruta, filas_por_bloque=FEATURES_POR_BLOQUE):
+        bloques_ids = []
+        bloques = []
+        pendientes = []
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for feature in itertools.chain(leer_features(f), [None]):
+                if feature is not None:
+                    pendientes.append(feature)
+                    if len(pendientes) < filas_por_bloque:
+                        continue
+                if pendientes:
+                    bloques_ids.append(np.array([int(p['id']) for p in pendientes], dtype=np.int64))
+                    bloque = pd.DataFrame.from_records([p['properties'] for p in pendientes])
+                    bloques.append({nombre: compactar_columna(bloque[nombre]) for nombre in bloque.columns})
+                    pendientes = []
+
+        columnas = {}
+        for nombre in dict.fromkeys(nombre for bloque in bloques for nombre in bloque):
+            partes = [bloque.get(nombre) for bloque in bloques]
+            if any(isinstance(parte, pd.Categorical) for parte in partes):
+                partes = [pd.Categorical([None] * len(ids)) if parte is None else pd.Categorical(parte)
+                          for parte, ids in zip(partes, bloques_ids)]
+                columnas[nombre] = union_categoricals(partes)
+            else:
+                partes = [np.full(len(ids), np.nan) if parte is None else parte
+                          for parte, ids in zip(partes, bloques_ids)]
+                columnas[nombre] = np.concatenate(partes)
+        ids = np.concatenate(bloques_ids) if bloques_ids else np.empty(0, dtype=np.int64)
+        return cls(ids, columnas)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Bytes que ocupan las columnas (sin contar el texto de las categorías)
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + sum(
+            columna.codes.nbytes if isinstance(columna, pd.Categorical) else columna.nbytes
+            for columna in self.columnas.values()
+        )
+
+    # Posiciones de las filas cuyas columnas categóricas tienen los valores dados
+    def filtrar(self, **filtros):
+        mascara = np.ones(len(self), dtype=bool)
+        for nombre, valor in filtros.items():
+            columna = self.columnas[nombre]
+            codigo = columna.categories.get_loc(valor) if valor in columna.categories else -2
+            mascara &= columna.codes == codigo
+        return np.flatnonzero(mascara)
+
+    # DataFrame de las filas `posiciones` con los tipos que tenía el CSV (las
+    # coordenadas vuelven a float64 con sus dígitos cortos de float32)
+    def bloque(self, posiciones):
+        datos = {}
+        for nombre, columna in self.columnas.items():
+            valores = columna[posiciones]
+            if nombre in COLUMNAS_COORDENADAS:
+                valores = valores.astype(str).astype(np.float64)
+            datos[nombre] = valores
+        return pd.DataFrame(datos, index=self.ids[posiciones])
+
+    # GeoJSON de las filas `posiciones` (todas por omisión) en trozos de bytes
+    def a_geojson(self, posiciones=None, filas_por_bloque=FILAS_POR_BLOQUE):
+        posiciones = np.arange(len(self)) if posiciones is None else posiciones
+        yield b'{"type": "FeatureCollection", "features": ['
+        for inicio in range(0, len(posiciones), filas_por_bloque):
+            bloque = self.bloque(posiciones[inicio:inicio + filas_por_bloque])
+            yield (', ' if inicio else '').encode() + features_puntos(bloque).encode('utf-8')
+        yield b']}'
+
+
+# Construir solo los artefactos pendientes y registrar sus claves en el manifiesto.
+# El CSV se recorre una sola vez por bloques: cada bloque suma sus totales por
+# departamento (o por polígono asignado) y escribe sus puntos en el GeoJSON, así
+# que nunca se tiene el archivo completo en memoria.
+def construir_artefactos(pendientes, claves, manifiesto, csv_path, shapefile_path, espacial=False,
+                         exportar_topojson=False, filas_por_bloque=FILAS_POR_BLOQUE):
+    with medir_fase('Importar geopandas'):
+        import geopandas as gpd
+
+    gdf_colombia = None
+    dept_col = None
+    if 'poligonos' in pendientes or espacial:
+        with medir_fase('Lectura shapefile'):
+            gdf_colombia = gpd.read_file(shapefile_path)
+        dept_col = detectar_columna_departamento(gdf_colombia)
+
+    geometrias = geometrias_wgs84(gdf_colombia) if espacial else None
+    totales = None
+    ids_fuera = []
+    n_fuera = 0
+    n_sin_asignar = 0
+    filas = 0
+
+    with contextlib.ExitStack() as pila:
+        salida_puntos = None
+        if 'puntos' in pendientes:
+            print("Procesando puntos de instituciones...")
+            salida_puntos = pila.enter_context(archivo_atomico(OUTPUT_PUNTOS_PATH))
+            salida_puntos.write(b'{"type": "FeatureCollection", "features": [')
+        if espacial:
+            print("Asignando instituciones a polígonos por coordenadas...")
+
+        for bloque in leer_csv_por_bloques(csv_path, filas_por_bloque):
+            if espacial:
+                with medir_fase('Asignación espacial'):
+                    asignacion, fuera = asignar_poligonos(
+                        bloque['Longitud'].to_numpy(),
+                        bloque['Latitud'].to_numpy(),
+                        geometrias,
+                    )
+                    parcial = totales_por_asignacion(len(gdf_colombia), bloque, asignacion)
+                    totales = parcial if totales is None else totales + parcial
+                n_fuera += fuera.size
+                n_sin_asignar += int((asignacion < 0).sum())
+                ids_fuera.extend(bloque['ID'].iloc[fuera[:20 - len(ids_fuera)]].tolist())
+                if salida_puntos is not None and dept_col is not None:
+                    bloque = bloque.assign(DepartamentoGeo=departamento_asignado(gdf_colombia[dept_col], asignacion))
+                    fuera_de_poligono = np.zeros(len(bloque), dtype=bool)
+                    fuera_de_poligono[fuera] = True
+                    bloque['FueraDePoligono'] = fuera_de_poligono
+            elif 'poligonos' in pendientes and 'Departamento' in bloque.columns:
+                with medir_fase('Totales por departamento'):
+                    totales = sumar_totales(totales, totales_departamento(bloque))
+
+            if salida_puntos is not None:
+                with medir_fase('Escritura GeoJSON puntos'):
+                    salida_puntos.write((', ' if filas else '').encode() + features_puntos(bloque).encode('utf-8'))
+            filas += len(bloque)
+
+        if salida_puntos is not None:
+            salida_puntos.write(b']}')
+
+    if n_fuera:
+        print(f"{n_fuera} instituciones fuera de todo polígono, asignadas al más cercano: "
+              f"{', '.join(str(i) for i in ids_fuera)}{' ...' if n_fuera > 20 else ''}")
+        if n_sin_asignar:
+            print(f"  salvo {n_sin_asignar} sin coordenadas o a más de {DISTANCIA_MAXIMA_POLIGONO}° "
+                  f"de todo polígono, que quedan sin asignar")
+
+    if 'poligonos' in pendientes:
+        print("Procesando polígonos de departamentos...")
+
+        # Agregar datos por departamento con un único merge por clave normalizada
+        sin_poligono = []
+        with medir_fase('Unión por departamento'):
+            if espacial:
+                gdf_colombia = agregar_por_asignacion(gdf_colombia, totales)
+            elif totales is not None and dept_col is not None:
+                gdf_colombia, sin_poligono = unir_datos_departamentos(gdf_colombia, totales, dept_col)
+
+        # Convertir a GeoJSON
+        with medir_fase('Escritura GeoJSON polígonos'):
+            gdf_colombia['id'] = gdf_colombia.index
+            contenido = gdf_colombia.to_json().encode('utf-8')
+            escribir_atomico(OUTPUT_GEOJSON_PATH, contenido)
+
+        # Versiones simplificadas por nivel de zoom
+        with medir_fase('Niveles de zoom'):
+            niveles = construir_niveles(gdf_colombia, len(contenido), exportar_topojson)
+
+        manifiesto['poligonos'] = {
+            'clave': claves['poligonos'],
+            'ruta': OUTPUT_GEOJSON_PATH,
+            'dept_col': dept_col,
+            'sin_poligono': sin_poligono,
+            'fuera_de_poligono': int(n_fuera),
+            'sin_asignar': n_sin_asignar,
+            'bytes': len(contenido),
+            'niveles': niveles,
+        }
+        escribir_manifiesto(manifiesto)
+
+    if 'puntos' in pendientes:
+        manifiesto['puntos'] = {'clave': claves['puntos'], 'ruta': OUTPUT_PUNTOS_PATH, 'filas': filas}
+        escribir_manifiesto(manifiesto)
+
+
+# Sumar los totales de un anexo a las propiedades de los polígonos afectados.
+# `totales` es {índice de feature: (estudiantes, instituciones)}; devuelve si cambió algo.
+def sumar_a_poligonos(features, totales):
+    cambio = False
+    for indice, (estudiantes, instituciones) in totales.items():
+        propiedades = features[indice]['properties']
+        propiedades['Estudiantes'] = int(propiedades.get('Estudiantes', 0) + estudiantes)
+        propiedades['NumInstituciones'] = int(propiedades.get('NumInstituciones', 0) + instituciones)
+        cambio = True
+    return cambio
+
+
+# Aplicar los totales de un anexo a un GeoJSON (o TopoJSON) de polígonos y
+# reescribirlo solo si alguno de sus polígonos cambió
+def actualizar_poligonos(ruta, totales):
+    with open(ruta, 'r') as f:
+        contenido = json.load(f)
+    if contenido.get('type') == 'Topology':
+        features = [g for objeto in contenido['objects'].values() for g in objeto.get('geometries', [])]
+    else:
+        features = contenido['features']
+    if sumar_a_poligonos(features, totales):
+        escribir_atomico(ruta, json.dumps(contenido).encode('utf-8'))
+
+
+# Añadir features al final del GeoJSON de puntos sin reescribirlo: se sobrescribe
+# el cierre `]}` con las features nuevas y se vuelve a cerrar
+def anexar_puntos(ruta, features, hay_previas):
+    with open(ruta, 'r+b') as f:
+        f.seek(-2, os.SEEK_END)
+        if f.read(2) != b']}':
+            raise ValueError(f'{ruta} no termina como un GeoJSON escrito por construir_artefactos')
+        f.seek(-2, os.SEEK_END)
+        f.write((', ' if hay_previas else '').encode() + features.encode('utf-8') + b']}')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Añadir las filas de `delta_path` al final del CSV sin reescribirlo y devolver
+# el registro del CSV nuevo con un hash encadenado (hash anterior + hash del anexo)
+def anexar_al_csv(csv_path, delta_path, delta, registro):
+    columnas = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    with open(delta_path, 'rb') as f:
+        crudo = f.read()
+    if pd.read_csv(delta_path, nrows=0).columns.tolist() == columnas:
+        # Mismo orden de columnas: se copian las filas tal cual, sin reformatear números
+        filas = crudo.split(b'\n', 1)[1] if b'\n' in crudo else b''
+    else:
+        filas = delta[columnas].to_csv(index=False, header=False).encode('utf-8')
+
+    with open(csv_path, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() and filas:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write(filas)
+        f.flush()
+        os.fsync(f.fileno())
+
+    estado = os.stat(csv_path)
+    encadenado = hashlib.sha256(f"{registro['hash']}+{hashlib.sha256(filas).hexdigest()}".encode()).hexdigest()
+    return {'bytes': estado.st_size, 'mtime_ns': estado.st_mtime_ns, 'hash': encadenado}
+
+
+# Totales de un anexo por índice de polígono, {índice: (estudiantes, instituciones)}.
+# En modo espacial también devuelve el anexo con las columnas de la asignación.
+def totales_anexo(delta, features, poligonos, shapefile_path, espacial):
+    if espacial:
+        import geopandas as gpd
+        gdf_colombia = gpd.read_file(shapefile_path)
+        asignacion, fuera = asignar_poligonos(
+            delta['Longitud'].to_numpy(), delta['Latitud'].to_numpy(), geometrias_wgs84(gdf_colombia)
+        )
+        parcial = totales_por_asignacion(len(features), delta, asignacion)
+        dept_col = poligonos.get('dept_col')
+        if dept_col is not None:
+            fuera_de_poligono = np.zeros(len(delta), dtype=bool)
+            fuera_de_poligono[fuera] = True
+            delta = delta.assign(DepartamentoGeo=departamento_asignado(gdf_colombia[dept_col], asignacion),
+                                 FueraDePoligono=fuera_de_poligono)
+        poligonos['fuera_de_poligono'] = poligonos.get('fuera_de_poligono', 0) + int(fuera.size)
+        poligonos['sin_asignar'] = poligonos.get('sin_asignar', 0) + int((asignacion < 0).sum())
+        return {i: tuple(parcial[i]) for i in np.flatnonzero(parcial.any(axis=1))}, delta
+
+    dept_col = poligonos['dept_col']
+    claves_poligonos = normalizar_departamento(pd.Series([f['properties'].get(dept_col) for f in features]))
+    indice_por_clave = {clave: i for i, clave in enumerate(claves_poligonos)}
+    totales = {}
+    for clave, fila in totales_departamento(delta).iterrows():
+        if clave in indice_por_clave:
+            totales[indice_por_clave[clave]] = (fila['Estudiantes'], fila['NumInstituciones'])
+        elif fila['Nombre'] not in poligonos['sin_poligono']:
+            poligonos['sin_poligono'] = sorted(poligonos['sin_poligono'] + [fila['Nombre']])
+            print(f"Departamento del anexo sin polígono: {fila['Nombre']}")
+    return totales, delta
+
+
+# Incorporar filas nuevas (un CSV con las mismas columnas) sin reconstruir los
+# artefactos: se suman solo los totales de los departamentos afectados, se añaden
+# los puntos al final del GeoJSON de puntos y las filas al final del CSV. El costo
+# depende del tamaño del anexo y de la geometría, no del número de filas del CSV.
+# Si la caché no está vigente se anexan las filas y se reconstruye todo.
+def anexar_filas(delta_path, csv_path=CSV_PATH, shapefile_path=SHAPEFILE_PATH,
+                 espacial=ASIGNACION_ESPACIAL, exportar_topojson=EXPORTAR_TOPOJSON):
+    columnas = pd.read_csv(csv_path, nrows=0).columns.tolist()
+    delta = pd.read_csv(delta_path)
+    faltantes = set(columnas) - set(delta.columns)
+    if faltantes:
+        raise ValueError(f"Al anexo le faltan columnas del CSV: {', '.join(sorted(faltantes))}")
+
+    with bloqueo(MANIFIESTO_PATH):
+        manifiesto = leer_manifiesto()
+        registro = registro_csv(csv_path, manifiesto)
+        claves = claves_artefactos(csv_path, shapefile_path, espacial, exportar_topojson, registro['hash'])
+        filas_previas = manifiesto.get('puntos', {}).get('filas')
+        vigente = not artefactos_pendientes(manifiesto, claves) and filas_previas is not None
+
+        if vigente:
+            with medir_fase('Totales del anexo'):
+                delta = delta[columnas]
+                delta.index = pd.RangeIndex(filas_previas, filas_previas + len(delta))
+                poligonos = manifiesto['poligonos']
+                with open(OUTPUT_GEOJSON_PATH, 'r') as f:
+                    features = json.load(f)['features']
+                totales, delta_puntos = totales_anexo(delta, features, poligonos, shapefile_path, espacial)
+
+            # Invalidar las claves antes de tocar los archivos: si el proceso se
+            # interrumpe a medias, la próxima carga reconstruye todo
+            for nombre in ('poligonos', 'puntos'):
+                manifiesto[nombre]['clave'] = None
+            escribir_manifiesto(manifiesto)
+
+            with medir_fase('Anexo a los artefactos'):
+                if totales:
+                    actualizar_poligonos(OUTPUT_GEOJSON_PATH, totales)
+                    for nivel in poligonos.get('niveles', []):
+                        actualizar_poligonos(nivel['ruta'], totales)
+                        if 'ruta_topojson' in nivel:
+                            actualizar_poligonos(nivel['ruta_topojson'], totales)
+                if len(delta):
+                    anexar_puntos(OUTPUT_PUNTOS_PATH, features_puntos(delta_puntos), filas_previas > 0)
+                manifiesto['csv'] = anexar_al_csv(csv_path, delta_path, delta, registro)
+
+            claves = claves_artefactos(csv_path, shapefile_path, espacial, exportar_topojson, manifiesto['csv']['hash'])
+            manifiesto['poligonos']['clave'] = claves['poligonos']
+            manifiesto['puntos'].update(clave=claves['puntos'], filas=filas_previas + len(delta))
+            escribir_manifiesto(manifiesto)
+        else:
+            anexar_al_csv(csv_path, delta_path, delta, registro)
+
+    if not vigente:
+        # Fuera del bloqueo: procesar_datos_geograficos lo vuelve a tomar
+        print("Caché geográfica no vigente: filas anexadas al CSV, se reconstruye todo")
+        procesar_datos_geograficos(csv_path, shapefile_path, espacial=espacial, exportar_topojson=exportar_topojson)
+    else:
+        print(f"Anexadas {len(delta):,} filas: {len(totales)} polígonos actualizados")
+    return len(delta)
+
+
+# Cargar los artefactos ya construidos
+def cargar_artefactos(manifiesto):
+    with open(OUTPUT_GEOJSON_PATH, 'r') as f:
+        geojson_data = json.load(f)
+    capa_puntos = CapaPuntos.desde_geojson(OUTPUT_PUNTOS_PATH)
+
+    dept_col = manifiesto.get('poligonos', {}).get('dept_col')
+    if dept_col is None:
+        # Intentar identificar la columna de departamentos
+        for col in POSIBLES_COLS_DEPTO:
+            if geojson_data['features'] and col in geojson_data['features'][0]['properties']:
+                dept_col = col
+                break
+
+    # GeoJSON simplificados por nivel de zoom
+    niveles = {}
+    for nivel in manifiesto.get('poligonos', {}).get('niveles', []):
+        with open(nivel['ruta'], 'r') as f:
+            niveles[nivel['zoom']] = json.load(f)
+
+    # Versión de los datos cargados: cambia cuando cambia cualquiera de los artefactos
+    version = hashlib.sha256(
+        '|'.join(manifiesto.get(n, {}).get('clave', '') for n in ('poligonos', 'puntos')).encode()
+    ).hexdigest()[:16]
+
+    return {
+        'poligonos': geojson_data,
+        'puntos': capa_puntos,
+        'dept_col': dept_col,
+        'niveles': niveles,
+        'version': version
+    }
+
+
+#Función para procesar los datos geográficos
+def procesar_datos_geograficos(csv_path=CSV_PATH, shapefile_path=SHAPEFILE_PATH, forzar=False,
+                                espacial=ASIGNACION_ESPACIAL, exportar_topojson=EXPORTAR_TOPOJSON):
+    try:
+        manifiesto = leer_manifiesto()
+        with medir_fase('Huella de la caché geográfica'):
+            csv = registro_csv(csv_path, manifiesto)
+            claves = claves_artefactos(csv_path, shapefile_path, espacial, exportar_topojson, csv['hash'])
+        pendientes = artefactos_pendientes(manifiesto, claves, forzar)
+
+        if pendientes:
+            with bloqueo(MANIFIESTO_PATH):
+                # Otro worker pudo haber construido los artefactos mientras esperábamos
+                manifiesto = leer_manifiesto()
+                pendientes = artefactos_pendientes(manifiesto, claves, forzar)
+                if pendientes:
+                    manifiesto['csv'] = csv
+                    construir_artefactos(pendientes, claves, manifiesto, csv_path, shapefile_path, espacial, exportar_topojson)
+        else:
+            print("Archivos GeoJSON vigentes en caché. Cargando directamente...")
+
+        with medir_fase('Carga GeoJSON'):
+            return cargar_artefactos(manifiesto)
+
+    except Exception as e:
+        print(f"Error al procesar datos geográficos: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+# Punto de entrada para construir la caché (p. ej. durante `docker build`)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Construye la caché de artefactos geográficos.')
+    parser.add_argument('--csv', default=CSV_PATH, help='Ruta del CSV de educación superior')
+    parser.add_argument('--shapefile', default=SHAPEFILE_PATH, help='Ruta del shapefile de departamentos')
+    parser.add_argument('--forzar', action='store_true', help='Reconstruir aunque la caché esté vigente')
+    parser.add_argument('--topojson', action='store_true', default=EXPORTAR_TOPOJSON,
+                        help='Emitir también TopoJSON con arcos compartidos por nivel de zoom')
+    parser.add_argument('--espacial', action='store_true', default=ASIGNACION_ESPACIAL,
+                        help='Asignar instituciones a polígonos por coordenadas (STRtree)')
+    parser.add_argument('--anexar', metavar='CSV_NUEVO',
+                        help='Añadir las filas de CSV_NUEVO al CSV y a la caché sin reconstruirla')
+    args = parser.parse_args(argv)
+
+    if args.anexar:
+        anexar_filas(args.anexar, args.csv, args.shapefile, espacial=args.espacial, exportar_topojson=args.topojson)
+        return 0
+
+    resultado = procesar_datos_geograficos(args.csv, args.shapefile, forzar=args.forzar, espacial=args.espacial,
+                                           exportar_topojson=args.topojson)
+    if resultado is None:
+        return 1
+    print(f"Caché geográfica lista: {len(resultado['poligonos']['features'])} polígonos, "
+          f"{len(resultado['puntos'])} puntos")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import gc
+import os
+import sys
+
+
+# Configuración de gunicorn para servir el dashboard con varios workers.
+#
+# Con `preload_app` el maestro importa app.py una sola vez (lectura del CSV,
+# geoprocesamiento, agregados y figuras precalculadas) y los workers lo heredan
+# por fork con copia-en-escritura, en vez de repetir todo N veces.
+#
+# Variables de entorno:
+#   PORT              puerto de escucha (8050)
+#   WEB_CONCURRENCY   número de procesos worker (2)
+#   GUNICORN_THREADS  hilos por worker (4); los callbacks son en su mayoría
+#                     consultas a cachés y agregados, así que los hilos reparten
+#                     bien la carga sin multiplicar la memoria como los procesos
+#   GUNICORN_PRELOAD  1 para cargar la app en el maestro (por defecto), 0 para
+#                     que cada worker la importe por su cuenta
+#   CARGA_DIFERIDA    1 para cargar los datos en segundo plano (app.py). Sin
+#                     preload cada worker responde en cuanto importa la app y
+#                     carga los datos tabulares y geográficos en un hilo. Con
+#                     preload el maestro construye solo los datos tabulares (que
+#                     los workers comparten) y cada worker carga los geográficos
+#                     tras el fork: el mapa aparece antes, pero esos datos ocupan
+#                     memoria privada en cada worker
+#   RECARGA_VIGILAR   segundos entre comprobaciones del CSV y del shapefile para
+#                     recargar los datos sin reiniciar (recarga.py). Cada worker
+#                     vigila y recarga por su cuenta; tras una recarga sus datos ya
+#                     no se comparten con el maestro y la memoria privada crece
+#   TOKEN_RECARGA     habilita POST /admin/recargar. El worker que lo atiende
+#                     recarga en el acto y toca RUTA_SENAL_RECARGA para que la
+#                     vigilancia de los demás workers también recargue
+#   COMPRIMIR_RESPUESTAS  0 si un proxy delante ya comprime; por defecto la app
+#                     comprime con gzip las respuestas de los callbacks
+#   CACHE_RESPUESTAS_MB  límite de cada caché de respuestas codificadas y
+#                     comprimidas (64); es memoria privada de cada worker
+#   EXPORTAR_HILOS    hilos de cada worker para las exportaciones de /exportar (2);
+#                     los resultados van a DIRECTORIO_EXPORTACIONES, compartido por
+#                     todos los workers, hasta EXPORTACIONES_MB (256)
+#
+# Memoria medida con 4 workers, CSV sintético de 200.000 filas y shapefile de
+# 1,9 MB, tras 40 peticiones de layout y mapa (/proc/<pid>/smaps_rollup):
+#   sin preload: ~525 MB privados por worker (PSS ~545 MB), ~2,2 GB en total
+#   con preload:  ~35 MB privados por worker (PSS ~137 MB), ~0,7 GB en total
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8050)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Los hilos no sobreviven al fork: con preload app.py no inicia la carga diferida
+# al importarse en el maestro, se inicia en cada worker (post_fork)
+if preload_app:
+    os.environ['CARGA_EN_WORKERS'] = '1'
+
+# El primer arranque sin caché puede tardar en construir los artefactos
+timeout = 120
+
+
+# En el maestro, después de cargar la app y antes de crear los workers
+def when_ready(server):
+    if not preload_app:
+        return
+    app = sys.modules.get('app')
+    if app is not None:
+        if app.CARGA_DIFERIDA:
+            # Solo los datos tabulares: los geográficos se cargan en cada worker
+            app.cargar_tabulares()
+        else:
+            # Construir aquí las figuras más pedidas para que todos los workers las hereden
+            app.precalentar()
+    # Mover los objetos ya creados a la generación permanente: el recolector de
+    # basura de los workers no los recorre y no ensucia sus páginas compartidas
+    gc.freeze()
+
+
+# En cada worker, después del fork: con preload y CARGA_DIFERIDA, cargar aquí los
+# datos geográficos en un hilo propio del worker
+def post_fork(server, worker):
+    app = sys.modules.get('app')
+    if app is not None and app.CARGA_DIFERIDA:
+        app.iniciar_carga_diferida()
@@ -0,0 +1,237 @@
+import functools
+import os
+import threading
+import time
+
+from dash.exceptions import PreventUpdate
+
+
+# Métricas en el formato de texto de Prometheus, sin dependencias externas.
+# Con gunicorn cada worker lleva sus propios contadores: cada respuesta de
+# /metrics corresponde al proceso que la atendió (etiqueta `pid` en proceso_info).
+
+# Cubetas por defecto (segundos) para latencias
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Cubetas (bytes) para tamaños de respuesta
+CUBETAS_BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def formatear_etiquetas(nombres, valores):
+    if not nombres:
+        return ''
+    pares = []
+    for nombre, valor in zip(nombres, valores):
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pares.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(pares) + '}'
+
+
+def formatear_valor(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer() and abs(valor) < 1e15:
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = tuple(etiquetas[e] for e in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def muestras(self):
+        with self._lock:
+            valores = dict(self._valores)
+        for clave, valor in valores.items():
+            yield self.nombre, formatear_etiquetas(self.etiquetas, clave), valor
+
+
+# Histograma acumulativo por combinación de etiquetas
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), cubetas=CUBETAS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(sorted(cubetas)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(etiquetas[e] for e in self.etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.cubetas), 0.0, 0]
+            for i, limite in enumerate(self.cubetas):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    def muestras(self):
+        with self._lock:
+            series = {clave: (list(conteos), suma, n) for clave, (conteos, suma, n) in self._series.items()}
+        nombres_le = self.etiquetas + ('le',)
+        for clave, (conteos, suma, n) in series.items():
+            acumulado = 0
+            for limite, conteo in zip(self.cubetas, conteos):
+                acumulado += conteo
+                yield (self.nombre + '_bucket',
+                       formatear_etiquetas(nombres_le, clave + (formatear_valor(float(limite)),)), acumulado)
+            etiquetas = formatear_etiquetas(self.etiquetas, clave)
+            yield self.nombre + '_sum', etiquetas, suma
+            yield self.nombre + '_count', etiquetas, n
+
+
+# Valor calculado en el momento de la consulta: `leer` devuelve un número o un
+# dict {tupla de valores de etiquetas: número}. Con tipo='counter' sirve para
+# exponer contadores que ya lleva otro objeto (p. ej. aciertos de una caché).
+class Indicador:
+    def __init__(self, nombre, ayuda, leer, etiquetas=(), tipo='gauge'):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.leer = leer
+        self.tipo = tipo
+
+    def muestras(self):
+        valor = self.leer()
+        if not isinstance(valor, dict):
+            valor = {(): valor}
+        for clave, v in valor.items():
+            if v is not None:
+                yield self.nombre, formatear_etiquetas(self.etiquetas, clave), v
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+        self._lock = threading.Lock()
+
+    def agregar(self, metrica):
+        with self._lock:
+            self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, *args, **kwargs):
+        return self.agregar(Contador(*args, **kwargs))
+
+    def histograma(self, *args, **kwargs):
+        return self.agregar(Histograma(*args, **kwargs))
+
+    def indicador(self, *args, **kwargs):
+        return self.agregar(Indicador(*args, **kwargs))
+
+    # Texto de exposición (text/plain; version=0.0.4)
+    def exposicion(self):
+        with self._lock:
+            metricas = list(self._metricas)
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f'# HELP {metrica.nombre} {metrica.ayuda}')
+            lineas.append(f'# TYPE {metrica.nombre} {metrica.tipo}')
+            for nombre, etiquetas, valor in metrica.muestras():
+                lineas.append(f'{nombre}{etiquetas} {formatear_valor(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+callback_duracion = registro.histograma(
+    'dash_callback_duracion_segundos', 'Duración total del callback, serialización incluida', ['callback'])
+callback_funcion = registro.histograma(
+    'dash_callback_funcion_segundos', 'Tiempo dentro de la función del callback', ['callback'])
+callback_serializacion = registro.histograma(
+    'dash_callback_serializacion_segundos', 'Tiempo de validación y serialización JSON de la respuesta', ['callback'])
+callback_bytes = registro.histograma(
+    'dash_callback_respuesta_bytes', 'Tamaño de la respuesta JSON del callback', ['callback'], CUBETAS_BYTES)
+callback_llamadas = registro.contador(
+    'dash_callback_llamadas_total', 'Llamadas a cada callback por resultado (ok, sin_cambios, error)',
+    ['callback', 'resultado'])
+
+registro.indicador('proceso_info', 'Proceso que atiende esta consulta', lambda: {(os.getpid(),): 1}, ['pid'])
+
+# Tiempo de la función del callback en curso (por hilo), para separar la serialización
+_en_curso = threading.local()
+
+
+# Envolver la función de un callback para medir solo su ejecución
+def cronometrar_funcion(func):
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _en_curso.funcion = time.perf_counter() - t0
+    return envoltura
+
+
+# Envolver la entrada de callback_map (función + validación + to_json de Dash).
+# Lo medido se llama a través de `envoltura.medido`, que otras envolturas (p. ej.
+# la memoria de respuestas) pueden sustituir quedando dentro de la medición.
+def cronometrar_respuesta(callback, nombre):
+    @functools.wraps(callback)
+    def envoltura(*args, **kwargs):
+        _en_curso.funcion = None
+        t0 = time.perf_counter()
+        resultado = 'ok'
+        try:
+            respuesta = envoltura.medido(*args, **kwargs)
+        except PreventUpdate:
+            resultado = 'sin_cambios'
+            raise
+        except Exception:
+            resultado = 'error'
+            raise
+        finally:
+            total = time.perf_counter() - t0
+            callback_duracion.observar(total, callback=nombre)
+            callback_llamadas.incrementar(callback=nombre, resultado=resultado)
+            funcion = _en_curso.funcion
+            if funcion is not None:
+                callback_funcion.observar(funcion, callback=nombre)
+                if resultado == 'ok':
+                    callback_serializacion.observar(max(total - funcion, 0.0), callback=nombre)
+        tamano = len(respuesta) if respuesta.isascii() else len(respuesta.encode('utf-8'))
+        callback_bytes.observar(tamano, callback=nombre)
+        return respuesta
+    envoltura.medido = callback
+    return envoltura
+
+
+# Instrumentar todos los callbacks que se registren en `app` a partir de ahora:
+# se sustituye `app.callback` para envolver tanto la función del usuario como la
+# entrada que Dash guarda en callback_map (que serializa la respuesta)
+def instrumentar_callbacks(app):
+    registrar = app.callback
+
+    @functools.wraps(registrar)
+    def callback(*args, **kwargs):
+        decorador = registrar(*args, **kwargs)
+
+        def envolver(func):
+            cronometrada = cronometrar_funcion(func)
+            decorador(cronometrada)
+            for entrada in app.callback_map.values():
+                if getattr(entrada.get('callback'), '__wrapped__', None) is cronometrada:
+                    entrada['callback'] = cronometrar_respuesta(entrada['callback'], func.__name__)
+            return func
+        return envolver
+
+    app.callback = callback
+    return app
@@ -0,0 +1,98 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import flask
+
+
+# Perfilado por muestreo activable por petición con la cabecera CABECERA_PERFIL.
+# Solo responde a la cabecera si PERFILADOR=1: expone nombres internos del código.
+PERFILADOR = os.environ.get('PERFILADOR', '0') == '1'
+CABECERA_PERFIL = 'X-Perfilar'
+
+# Segundos entre muestras y número de perfiles que se conservan en memoria
+INTERVALO_MUESTREO = float(os.environ.get('PERFILADOR_INTERVALO', 0.005))
+MAX_PERFILES = 20
+
+
+# Un hilo auxiliar toma la pila del hilo observado cada `intervalo` segundos y
+# cuenta las pilas repetidas. El resultado está en formato "collapsed"
+# (una línea `func1;func2;func3 conteo`), el que leen flamegraph.pl y speedscope.
+class PerfiladorMuestreo:
+    def __init__(self, hilo_id, intervalo=INTERVALO_MUESTREO):
+        self.hilo_id = hilo_id
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilador', daemon=True)
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append(f'{os.path.basename(codigo.co_filename)}:{codigo.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.pilas[';'.join(reversed(pila))] += 1
+            self.muestras += 1
+
+    def iniciar(self):
+        self.inicio = time.perf_counter()
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+        self.duracion = time.perf_counter() - self.inicio
+        return self
+
+    def texto(self):
+        return ''.join(f'{pila} {conteo}\n' for pila, conteo in self.pilas.most_common())
+
+
+# Registrar en el servidor Flask los ganchos del perfilador y la ruta para descargar
+# los perfiles: /perfiles/<id> (el id llega en la cabecera X-Perfil-Id de la respuesta)
+def instalar_perfilador(server, ruta='/perfiles'):
+    perfiles = OrderedDict()
+    secuencia = itertools.count(1)
+    lock = threading.Lock()
+
+    @server.before_request
+    def iniciar_perfil():
+        if PERFILADOR and flask.request.headers.get(CABECERA_PERFIL):
+            flask.g.perfilador = PerfiladorMuestreo(threading.get_ident()).iniciar()
+
+    @server.after_request
+    def guardar_perfil(respuesta):
+        perfilador = flask.g.pop('perfilador', None)
+        if perfilador is None:
+            return respuesta
+        perfilador.detener()
+        with lock:
+            perfil_id = str(next(secuencia))
+            perfiles[perfil_id] = perfilador.texto()
+            while len(perfiles) > MAX_PERFILES:
+                perfiles.popitem(last=False)
+        respuesta.headers['X-Perfil-Id'] = perfil_id
+        respuesta.headers['X-Perfil-Muestras'] = str(perfilador.muestras)
+        print(f"Perfil {perfil_id} de {flask.request.path}: {perfilador.muestras} muestras "
+              f"en {perfilador.duracion * 1000:.1f} ms")
+        return respuesta
+
+    @server.route(f'{ruta}/<perfil_id>')
+    def descargar_perfil(perfil_id):
+        if not PERFILADOR:
+            flask.abort(404)
+        with lock:
+            texto = perfiles.get(perfil_id)
+        if texto is None:
+            flask.abort(404)
+        return flask.Response(texto, mimetype='text/plain')
@@ -0,0 +1,147 @@
+import hmac
+import os
+import threading
+import time
+import traceback
+
+import flask
+
+
+# Recarga de los datos sin reiniciar el proceso. La instantánea nueva se construye
+# en un hilo en segundo plano mientras los callbacks siguen usando la anterior, y
+# se publica con una sola asignación. Se dispara por cambio en los archivos de
+# entrada (RECARGA_VIGILAR) o por el endpoint de administración (TOKEN_RECARGA).
+# Con gunicorn cada worker vigila y recarga su propia copia de los datos.
+
+# Segundos entre comprobaciones de los archivos de entrada (0 = sin vigilancia)
+RECARGA_VIGILAR = float(os.environ.get('RECARGA_VIGILAR', 0))
+
+# Token del endpoint de administración; sin él el endpoint responde 404
+TOKEN_RECARGA = os.environ.get('TOKEN_RECARGA')
+CABECERA_TOKEN = 'X-Token-Recarga'
+
+# Archivo que toca el endpoint para que la vigilancia de los demás workers también recargue
+RUTA_SENAL = os.environ.get('RUTA_SENAL_RECARGA', '.recarga')
+
+
+# Tamaño y fecha de modificación de cada archivo (None si no existe)
+def huella_archivos(rutas):
+    huella = []
+    for ruta in rutas:
+        try:
+            estado = os.stat(ruta)
+            huella.append((ruta, estado.st_size, estado.st_mtime_ns))
+        except OSError:
+            huella.append((ruta, None, None))
+    return tuple(huella)
+
+
+def tocar_senal(ruta=RUTA_SENAL):
+    with open(ruta, 'a'):
+        os.utime(ruta)
+
+
+# Ejecuta `construir()` en segundo plano y entrega el resultado a `publicar(nueva)`.
+# Las solicitudes que llegan durante una recarga se agrupan en una sola recarga
+# posterior; si `construir` falla se conserva la instantánea publicada.
+class Recargador:
+    def __init__(self, construir, publicar, rutas, intervalo=RECARGA_VIGILAR):
+        self.construir = construir
+        self.publicar = publicar
+        self.rutas = list(rutas) + [RUTA_SENAL]
+        self.intervalo = intervalo
+        self.huella = huella_archivos(self.rutas)
+        self.recargas = {'ok': 0, 'error': 0}
+        self.ultima = None
+        self._pendiente = None
+        self._hilo = None
+        self._vigilante_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def en_curso(self):
+        return self._hilo is not None
+
+    # Pedir una recarga; devuelve False si se sumó a una que ya estaba en curso
+    def solicitar(self, motivo):
+        with self._lock:
+            self._pendiente = motivo
+            if self._hilo is not None:
+                return False
+            self._hilo = threading.Thread(target=self._recargar, name='recarga-datos', daemon=True)
+            self._hilo.start()
+            return True
+
+    def _recargar(self):
+        while True:
+            with self._lock:
+                motivo, self._pendiente = self._pendiente, None
+                if motivo is None:
+                    self._hilo = None
+                    return
+                # Huella tomada antes de leer: un cambio durante la recarga dispara otra
+                self.huella = huella_archivos(self.rutas)
+
+            print(f"Recargando datos ({motivo})...")
+            t0 = time.perf_counter()
+            try:
+                self.publicar(self.construir())
+                resultado, error = 'ok', None
+            except Exception as e:
+                traceback.print_exc()
+                resultado, error = 'error', str(e)
+            duracion = time.perf_counter() - t0
+            self.recargas[resultado] += 1
+            self.ultima = {'motivo': motivo, 'resultado': resultado, 'error': error,
+                           'fin': time.time(), 'duracion_s': round(duracion, 3)}
+            if error:
+                print(f"Error al recargar los datos; se conserva la versión anterior: {error}")
+            else:
+                print(f"Datos recargados en {duracion:.2f} s")
+
+    # Vigilar los archivos de entrada desde este proceso. Es idempotente y se llama
+    # en cada petición: con preload de gunicorn el hilo tiene que nacer en el worker,
+    # porque los hilos del maestro no sobreviven al fork.
+    def vigilar(self):
+        if not self.intervalo or self._vigilante_pid == os.getpid():
+            return
+        with self._lock:
+            if self._vigilante_pid == os.getpid():
+                return
+            self._vigilante_pid = os.getpid()
+        threading.Thread(target=self._vigilar, name='vigilancia-datos', daemon=True).start()
+
+    def _vigilar(self):
+        anterior = None
+        while True:
+            time.sleep(self.intervalo)
+            huella = huella_archivos(self.rutas)
+            # Esperar a que la huella se repita entre dos consultas: un archivo que
+            # todavía se está copiando sigue cambiando de tamaño o de fecha
+            if huella != self.huella and huella == anterior:
+                self.solicitar('cambio en los archivos de entrada')
+            anterior = huella
+
+    def estado(self):
+        return {'pid': os.getpid(), 'en_curso': self.en_curso, 'recargas': dict(self.recargas),
+                'ultima': self.ultima, 'vigilancia_s': self.intervalo or None}
+
+
+# Registrar la vigilancia en cada petición y el endpoint de administración:
+# GET consulta el estado de la recarga y POST la solicita (cabecera CABECERA_TOKEN)
+def instalar_recarga(server, recargador, ruta='/admin/recargar'):
+    @server.before_request
+    def iniciar_vigilancia():
+        recargador.vigilar()
+
+    @server.route(ruta, methods=['GET', 'POST'])
+    def recargar():
+        if not TOKEN_RECARGA:
+            flask.abort(404)
+        if not hmac.compare_digest(flask.request.headers.get(CABECERA_TOKEN, ''), TOKEN_RECARGA):
+            flask.abort(403)
+        if flask.request.method == 'GET':
+            return flask.jsonify(recargador.estado())
+        tocar_senal()
+        recargador.solicitar('endpoint de administración')
+        return flask.jsonify(recargador.estado()), 202
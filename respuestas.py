@@ -0,0 +1,133 @@
+import functools
+import gzip
+import hashlib
+
+import flask
+from flask import Response
+from plotly.io.json import to_json_plotly
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se sirve solo gzip
+    brotli = None
+
+
+# Nivel de gzip para respuestas que se comprimen al servirlas (el 9 es demasiado lento)
+NIVEL_GZIP_DINAMICO = 6
+
+
+def codificaciones_aceptadas(accept_encoding):
+    return {parte.split(';')[0].strip() for parte in (accept_encoding or '').split(',')}
+
+
+# Contenido inmutable comprimido una sola vez y servido con ETag / Cache-Control.
+# Con max_age=None el contenido puede cambiar: se sirve con 'no-cache' y el
+# navegador o el CDN lo revalidan con el ETag (304 mientras no cambie).
+class RecursoComprimido:
+    def __init__(self, contenido, mimetype='application/json', etag=None, max_age=31536000):
+        self.mimetype = mimetype
+        self.cache_control = 'no-cache' if max_age is None else f'public, max-age={max_age}'
+        self.etag = etag or hashlib.sha256(contenido).hexdigest()[:16]
+        self.variantes = {
+            'identity': contenido,
+            'gzip': gzip.compress(contenido, compresslevel=9),
+        }
+        if brotli is not None:
+            self.variantes['br'] = brotli.compress(contenido, quality=11)
+
+    # Elegir la codificación aceptada por el cliente (br > gzip > sin comprimir)
+    def codificacion(self, accept_encoding):
+        aceptadas = codificaciones_aceptadas(accept_encoding)
+        for codificacion in ('br', 'gzip'):
+            if codificacion in self.variantes and codificacion in aceptadas:
+                return codificacion
+        return 'identity'
+
+    def respuesta(self, request):
+        cabeceras = {
+            'ETag': f'"{self.etag}"',
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request.headers.get('If-None-Match', '')
+        if f'"{self.etag}"' in if_none_match or if_none_match.strip() == '*':
+            return Response(status=304, headers=cabeceras)
+
+        codificacion = self.codificacion(request.headers.get('Accept-Encoding'))
+        if codificacion != 'identity':
+            cabeceras['Content-Encoding'] = codificacion
+        return Response(self.variantes[codificacion], mimetype=self.mimetype, headers=cabeceras)
+
+
+# Servir GET `ruta` (p. ej. /_dash-layout de Dash) con el JSON ya codificado y
+# comprimido. `clave()` identifica el contenido vigente y `construir()` devuelve
+# el objeto a codificar solo cuando la clave cambia.
+def instalar_recurso_versionado(server, ruta, clave, construir):
+    vigente = {}
+
+    @server.before_request
+    def servir_recurso_versionado():
+        if flask.request.path != ruta or flask.request.method != 'GET':
+            return None
+        clave_actual = clave()
+        recurso = vigente.get(clave_actual)
+        if recurso is None:
+            recurso = RecursoComprimido(to_json_plotly(construir()).encode('utf-8'), max_age=None)
+            vigente.clear()
+            vigente[clave_actual] = recurso
+        return recurso.respuesta(flask.request)
+
+
+# Memorizar la respuesta JSON ya codificada de los callbacks `nombres` (su
+# entrada en callback_map), en `cache` (CacheLRU). La clave es la versión de los
+# datos, leída antes de ejecutar el callback, y el cuerpo de la petición (salidas,
+# entradas, estado y disparadores): solo vale para callbacks que no dependen de
+# nada más. Una petición repetida no vuelve a ejecutar el callback ni a codificar.
+def memorizar_respuestas(app, nombres, version, cache):
+    for entrada in app.callback_map.values():
+        callback = entrada.get('callback')
+        if getattr(callback, '__name__', None) not in nombres:
+            continue
+        if hasattr(callback, 'medido'):
+            # Callback con métricas (metricas.cronometrar_respuesta): la memoria va
+            # por dentro de la medición para que las respuestas memorizadas también
+            # cuenten en las llamadas, la duración y los bytes
+            callback.medido = _respuesta_memorizada(callback.medido, version, cache)
+        else:
+            entrada['callback'] = _respuesta_memorizada(callback, version, cache)
+
+
+def _respuesta_memorizada(callback, version, cache):
+    @functools.wraps(callback)
+    def envoltura(*args, **kwargs):
+        clave = (version(), hashlib.sha1(flask.request.get_data()).hexdigest())
+        respuesta = cache.obtener(clave)
+        if respuesta is None:
+            respuesta = callback(*args, **kwargs)
+            cache.guardar(clave, respuesta, len(respuesta))
+        return respuesta
+    return envoltura
+
+
+# Comprimir con gzip las respuestas de `rutas` mayores que `minimo` bytes. Las
+# respuestas repetidas (figuras memorizadas) se comprimen una sola vez: `cache`
+# guarda el resultado por el hash del contenido.
+def comprimir_respuestas(server, rutas, cache, minimo=1024):
+    @server.after_request
+    def comprimir(respuesta):
+        if (flask.request.path not in rutas or respuesta.status_code != 200 or respuesta.direct_passthrough
+                or 'Content-Encoding' in respuesta.headers
+                or 'gzip' not in codificaciones_aceptadas(flask.request.headers.get('Accept-Encoding'))):
+            return respuesta
+        contenido = respuesta.get_data()
+        if len(contenido) < minimo:
+            return respuesta
+        clave = hashlib.sha1(contenido).digest()
+        comprimido = cache.obtener(clave)
+        if comprimido is None:
+            comprimido = gzip.compress(contenido, compresslevel=NIVEL_GZIP_DINAMICO)
+            cache.guardar(clave, comprimido, len(comprimido))
+        respuesta.set_data(comprimido)
+        respuesta.headers['Content-Encoding'] = 'gzip'
+        respuesta.vary.add('Accept-Encoding')
+        return respuesta
@@ -0,0 +1,38 @@
+import contextlib
+import threading
+import time
+
+
+# Duración acumulada (segundos) de cada fase del arranque, en orden de inicio
+fases = {}
+_lock = threading.Lock()
+_inicio = time.perf_counter()
+
+
+@contextlib.contextmanager
+def medir_fase(nombre):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_fase(nombre, time.perf_counter() - t0)
+
+
+# Registrar una fase medida por fuera de `medir_fase`
+def registrar_fase(nombre, segundos):
+    with _lock:
+        fases[nombre] = fases.get(nombre, 0.0) + segundos
+
+
+# Segundos transcurridos desde que se importó este módulo
+def desde_inicio():
+    return time.perf_counter() - _inicio
+
+
+# Tabla con la duración de cada fase, para imprimir en el log
+def resumen_fases(titulo='Tiempos de arranque'):
+    with _lock:
+        copia = dict(fases)
+    lineas = [f"{titulo} ({desde_inicio():.2f} s desde el inicio):"]
+    lineas += [f"  {nombre:<32} {segundos * 1000:8.1f} ms" for nombre, segundos in copia.items()]
+    return '\n'.join(lineas)